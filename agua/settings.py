@@ -45,6 +45,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'apps.agua.middleware.QueryInstrumentationMiddleware',
+    'apps.agua.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'agua.urls'
@@ -151,6 +153,23 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = "/media/"  # URL base para acceder a archivos subidos
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Caché en disco de PDFs generados (recibos, tickets, estados de cuenta)
+PDF_CACHE_DIR = os.path.join(BASE_DIR, "pdf_cache")
+PDF_CACHE_MAX_BYTES = 500 * 1024 * 1024
+PDF_CACHE_EVICT_EVERY = 20 * 1024 * 1024  # Bytes escritos por proceso entre recorridos de la caché
+
+# Archivos de los reportes generados en segundo plano (manage.py run_report_workers)
+REPORT_JOBS_DIR = os.path.join(BASE_DIR, "report_jobs")
+
+# Instrumentación de SQL por request (apps.agua.middleware): Server-Timing y aviso de N+1
+SQL_INSTRUMENTATION = False
+SQL_INSTRUMENTATION_SAMPLE_RATE = 1.0  # Fracción de requests medidos (0.05 = 5 %)
+SQL_REPEATED_QUERY_THRESHOLD = 5  # Aviso si una misma consulta se repite más veces en un request
+
+# Perfiles de requests pedidos por un administrador (X-Profile: 1|memory)
+PROFILE_DIR = os.path.join(BASE_DIR, "profiles")
+PROFILE_KEEP = 100  # Perfiles que se conservan; se eliminan los más antiguos
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
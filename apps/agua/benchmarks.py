@@ -0,0 +1,218 @@
+"""
+Benchmark de los endpoints principales (manage.py benchmark).
+
+Cada escenario hace un request con el cliente de pruebas de DRF sobre los
+datos existentes (por ejemplo, los de `seed_synthetic`) y mide el tiempo y
+el número de consultas SQL. Los requests se ejecutan dentro de una
+transacción que se revierte, así crear una factura o cerrar una caja no
+cambia los datos entre repeticiones. Los PDFs se generan sin caché.
+
+Los resultados se comparan con los presupuestos (BUDGETS) y con una línea
+base guardada en JSON: más consultas que el presupuesto o que la línea base,
+o más tiempo que el presupuesto o que la línea base más la tolerancia, es
+una regresión.
+"""
+import json
+import statistics
+import tempfile
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from . import catalogs, pdfcache
+from .models import Calle, Cash, Customer, Reading
+
+# method, path y data del request; los ids salen de los datos existentes
+Scenario = namedtuple('Scenario', ['name', 'method', 'path', 'data'])
+
+Result = namedtuple('Result', ['name', 'status', 'ms', 'queries'])
+
+# Escenario -> (máximo de consultas, máximo de milisegundos). Las consultas no
+# deben crecer con el tamaño de los datos; los tiempos son para ~10.000 clientes.
+BUDGETS = {
+    'customer_list': (2, 300),
+    'reading_list': (1, 300),
+    # Incluye los SAVEPOINT de las transacciones anidadas; no depende del número de lecturas pagadas
+    'invoice_create': (19, 500),
+    'receipt_pdf': (10, 2000),
+    'calle_receipts': (10, 20000),
+    'debt_report': (1, 3000),
+    # Un UPDATE sobre Cash.income (libro de caja): no depende del número de pagos
+    'cash_close': (2, 500),
+    'financial_summary': (1, 100),
+    'financial_series': (3, 100),
+    'dashboard': (1, 50),
+    # La versión de los catálogos; se recargan solo cuando cambian
+    'bootstrap': (1, 100),
+}
+
+
+class BenchmarkError(Exception):
+    """No hay datos suficientes para armar los escenarios."""
+
+
+def scenarios():
+    """Escenarios sobre los datos actuales: el cliente, la calle y la caja con más movimiento reciente."""
+    reading = Reading.objects.order_by('-reading_date', '-id').select_related('customer').first()
+    unpaid = Reading.objects.filter(is_paid=False).order_by('-reading_date', '-id').first()
+    cash = Cash.objects.filter(date_closed=None).order_by('-id').first()
+
+    if reading is None or unpaid is None:
+        raise BenchmarkError("No hay lecturas: ejecute primero seed_synthetic")
+
+    if cash is None:
+        raise BenchmarkError("No hay una caja abierta: ejecute primero seed_synthetic")
+
+    calle = Calle.objects.get(pk=reading.customer.calle_id)
+    period = reading.issue_date.strftime('%Y-%m')
+    payment_method = cash.invoicepayment_set.values_list('payment_method_id', flat=True).first()
+
+    invoice = {
+        'customer': unpaid.customer_id,
+        'invoice_type': 'receipt',
+        'readings': [{'reading': unpaid.id, 'amount_paid': str(unpaid.total_amount)}],
+    }
+    if payment_method:
+        invoice['invoice_payment'] = {
+            'payment_method': payment_method,
+            'cash': cash.id,
+            'total': str(unpaid.total_amount),
+        }
+
+    return [
+        Scenario('customer_list', 'get', '/api/customer/', {'page_size': 50}),
+        Scenario('reading_list', 'get', '/api/reading/', {'cursor': '', 'page_size': 50}),
+        Scenario('invoice_create', 'post', '/api/invoice/', invoice),
+        Scenario('receipt_pdf', 'get', f'/api/recibo/pdf/{reading.id}', None),
+        Scenario('calle_receipts', 'get', f'/api/receipts/by-address/{calle.id}/{period}', None),
+        Scenario('debt_report', 'get', '/api/debt-reports/', {'output': 'json'}),
+        Scenario('cash_close', 'get', f'/api/cash/{cash.id}/close/', None),
+        Scenario('financial_summary', 'get', '/api/financial-summary/', {'year': reading.reading_date.year}),
+        Scenario('financial_series', 'get', '/api/financial-series/', {
+            'start_year': reading.reading_date.year - 2, 'end_year': reading.reading_date.year,
+        }),
+        Scenario('dashboard', 'get', '/api/invoices/summary/', None),
+        Scenario('bootstrap', 'get', '/api/bootstrap/', None),
+    ]
+
+
+def _request(client, scenario):
+    if scenario.method == 'post':
+        return client.post(scenario.path, scenario.data, format='json')
+    return client.get(scenario.path, scenario.data)
+
+
+def measure(client, scenario, repeat=5):
+    """Mediana del tiempo y máximo de consultas de `repeat` requests, cada uno revertido al terminar."""
+    times = []
+    queries = 0
+    status = None
+
+    with override_settings(PDF_CACHE_DIR=tempfile.mkdtemp(prefix='benchmark-')):
+
+        for _ in range(repeat):
+
+            pdfcache.invalidate_all()
+
+            with transaction.atomic(), CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = _request(client, scenario)
+                # Las respuestas en streaming (archivos) se consumen dentro de la medición
+                if getattr(response, 'streaming', False):
+                    b''.join(response.streaming_content)
+                times.append((time.perf_counter() - start) * 1000)
+                transaction.set_rollback(True)
+
+            status = response.status_code
+            queries = max(queries, len(captured))
+
+        pdfcache.invalidate_all()
+
+    return Result(scenario.name, status, round(statistics.median(times), 1), queries)
+
+
+def run(user, repeat=5, only=None):
+    """Mide todos los escenarios (o los de `only`) autenticado como `user`."""
+    client = APIClient()
+    client.force_authenticate(user)
+
+    # Se mide el estado normal, con los catálogos ya en la caché del proceso
+    catalogs.snapshot()
+
+    return [
+        measure(client, scenario, repeat)
+        for scenario in scenarios()
+        if not only or scenario.name in only
+    ]
+
+
+def check(results, budgets=None, baseline=None, tolerance=0.5):
+    """Lista de regresiones de `results` frente a los presupuestos y la línea base."""
+    budgets = BUDGETS if budgets is None else budgets
+    baseline = (baseline or {}).get('results', {})
+    failures = []
+
+    for result in results:
+
+        if not 200 <= result.status < 300:
+            failures.append(f"{result.name}: respondió {result.status}")
+            continue
+
+        max_queries, max_ms = budgets.get(result.name, (None, None))
+
+        if max_queries is not None and result.queries > max_queries:
+            failures.append(f"{result.name}: {result.queries} consultas (presupuesto {max_queries})")
+
+        if max_ms is not None and result.ms > max_ms:
+            failures.append(f"{result.name}: {result.ms} ms (presupuesto {max_ms} ms)")
+
+        base = baseline.get(result.name)
+        if base is None:
+            continue
+
+        if result.queries > base['queries']:
+            failures.append(f"{result.name}: {result.queries} consultas (línea base {base['queries']})")
+
+        if result.ms > base['ms'] * (1 + tolerance):
+            failures.append(
+                f"{result.name}: {result.ms} ms (línea base {base['ms']} ms + {tolerance:.0%})"
+            )
+
+    return failures
+
+
+def load_budgets(path):
+    """Presupuestos desde un JSON {"escenario": {"queries": n, "ms": n}} sobre los de BUDGETS."""
+    with open(path, encoding='utf-8') as file:
+        overrides = json.load(file)
+
+    budgets = dict(BUDGETS)
+    for name, budget in overrides.items():
+        max_queries, max_ms = budgets.get(name, (None, None))
+        budgets[name] = (budget.get('queries', max_queries), budget.get('ms', max_ms))
+    return budgets
+
+
+def load_baseline(path):
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, results):
+    data = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'customers': Customer.objects.count(),
+        'readings': Reading.objects.count(),
+        'results': {result.name: {'ms': result.ms, 'queries': result.queries} for result in results},
+    }
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, indent=2)
+    return data
@@ -0,0 +1,125 @@
+from dateutil.relativedelta import relativedelta
+from django.db import transaction
+
+from .debts import refresh_customer_debts
+from .models import BillingCheckpoint, Customer, Reading, Sequence
+from .readings import last_readings
+from . import tariffs
+
+UPDATED_FIELDS = ['total_water', 'total_sewer', 'fixed_charge', 'total_amount', 'is_paid', 'due_date', 'cut_off_date']
+
+
+def bill_calle(calle_id, period):
+    """
+    Factura una calle para el mes que empieza en `period`.
+
+    - Las lecturas del mes aún impagas se recalculan con la tarifa vigente.
+    - Los clientes sin medidor reciben la lectura del mes con consumo 0
+      (cargo fijo y alcantarillado), si su última lectura es del mes anterior.
+    - Los clientes con medidor sin lectura del mes se cuentan como faltantes.
+
+    Todo se escribe en bloque y junto con el punto de control de la calle, en
+    una sola transacción: si la corrida se interrumpe, la calle queda completa
+    o sin tocar. Devuelve un dict con las cantidades procesadas.
+    """
+    period_end = period + relativedelta(months=1)
+
+    with transaction.atomic():
+
+        if BillingCheckpoint.objects.filter(period=period, calle_id=calle_id).exists():
+            return None
+
+        customers = list(
+            Customer.objects
+            .filter(calle_id=calle_id, state='activo', tariff__isnull=False)
+            .only('id', 'tariff_id', 'has_meter')
+        )
+        customer_ids = [customer.id for customer in customers]
+
+        # Bloqueadas hasta el final (en orden de id, como los pagos): un pago que llegue mientras tanto
+        # espera, así is_paid se deriva del amount_paid vigente y el bulk_update no lo pisa
+        period_readings = {
+            reading.customer_id: reading
+            for reading in Reading.objects.select_for_update(of=('self',)).filter(
+                customer_id__in=customer_ids,
+                reading_date__gte=period,
+                reading_date__lt=period_end
+            ).order_by('pk')
+        }
+        previous_readings = last_readings(customer_ids, before=period)
+        previous_month = period - relativedelta(months=1)
+
+        to_create = []
+        to_update = []
+        missing = 0
+
+        for customer in customers:
+
+            reading = period_readings.get(customer.id)
+
+            if reading:
+
+                if not reading.is_paid:
+                    reading.customer = customer
+                    to_update.append(reading)
+
+                continue
+
+            if customer.has_meter:
+                missing += 1
+                continue
+
+            previous = previous_readings.get(customer.id)
+
+            if previous and previous.reading_date < previous_month:
+                # Hay meses sin registrar: no se puede emitir este mes sin saltarlos
+                missing += 1
+                continue
+
+            previous_value = previous.current_reading if previous else 0
+
+            to_create.append(Reading(
+                customer=customer,
+                reading_date=period,
+                current_reading=previous_value,
+                previous_reading=previous_value,
+                consumption=0,
+            ))
+
+        readings = to_create + to_update
+        charges = tariffs.price_batch([(reading.customer.tariff_id, reading.consumption or 0) for reading in readings])
+
+        for reading, charge in zip(readings, charges):
+            reading.total_water, reading.total_sewer, reading.fixed_charge, reading.total_amount = charge
+            # Como Reading.save: un pago parcial puede cubrir el nuevo total
+            reading.is_paid = reading.amount_paid >= reading.total_amount
+            due_date, cut_off_date = Reading.billing_dates(reading.reading_date)
+            reading.due_date = reading.due_date or due_date
+            reading.cut_off_date = reading.cut_off_date or cut_off_date
+
+        if to_create:
+            for reading, correlative in zip(to_create, Sequence.correlatives(Sequence.READING, len(to_create), 6)):
+                reading.correlative = correlative
+
+            Reading.objects.bulk_create(to_create)
+
+        if to_update:
+            Reading.objects.bulk_update(to_update, UPDATED_FIELDS)
+
+        # bulk_create/bulk_update no emiten señales: el resumen de deuda se actualiza aquí
+        refresh_customer_debts(reading.customer_id for reading in readings)
+
+        BillingCheckpoint.objects.create(
+            period=period,
+            calle_id=calle_id,
+            readings_created=len(to_create),
+            readings_updated=len(to_update),
+            readings_missing=missing,
+        )
+
+    return {
+        'customers': len(customers),
+        'created': len(to_create),
+        'updated': len(to_update),
+        'missing': missing,
+    }
@@ -0,0 +1,106 @@
+"""
+Caché en memoria de los catálogos (zonas, calles, categorías, servicios,
+tarifas, métodos de pago, años y la empresa).
+
+Estas tablas cambian pocas veces al año, pero el frontend las pide en cada
+pantalla y cada PDF busca la empresa. Cada proceso guarda los catálogos ya
+serializados (el JSON de /api/bootstrap/ con su ETag) junto con la versión
+con la que se cargaron. La versión es la serie CATALOGS de Sequence, común a
+todos los procesos: al guardar o eliminar un catálogo (ver signals.py) se
+incrementa con un UPSERT y cada proceso recarga sus catálogos la próxima vez
+que los pide, así que leerlos cuesta una consulta por clave primaria.
+
+La empresa se guarda también aparte con la misma versión: los procesos que
+imprimen recibos solo la necesitan a ella y no cargan ni serializan el
+resto de los catálogos.
+"""
+import hashlib
+import json
+import threading
+from collections import namedtuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Calle, Category, Company, PaymentMethod, Sequence, Service, Tariff, Year, Zona
+from .serializers import (
+    CalleSerializer, CategorySerializer, CompanySerializer, PaymentMethodSerializer, ServiceSerializer,
+    TariffSerializer, YearSerializer, ZonaSerializer,
+)
+
+CATALOGS = 'catalogs'
+
+# payload: JSON de /api/bootstrap/; company: instancia de Company (o None) para los PDFs
+Snapshot = namedtuple('Snapshot', ['version', 'payload', 'etag', 'company'])
+
+_snapshot = None
+_lock = threading.Lock()
+
+# (versión, Company o None)
+_company = None
+
+
+def current_version():
+    return Sequence.objects.filter(name=CATALOGS).values_list('last_value', flat=True).first() or 0
+
+
+def _load(version):
+    company = Company.objects.first()
+
+    data = {
+        'version': version,
+        'company': CompanySerializer(company).data if company else None,
+        'zonas': ZonaSerializer(Zona.objects.order_by('id'), many=True).data,
+        'calles': CalleSerializer(Calle.objects.select_related('zona').order_by('id'), many=True).data,
+        'categories': CategorySerializer(Category.objects.order_by('id'), many=True).data,
+        'services': ServiceSerializer(Service.objects.order_by('id'), many=True).data,
+        'tariffs': TariffSerializer(Tariff.objects.select_related('service', 'category').order_by('id'), many=True).data,
+        'payment_methods': PaymentMethodSerializer(PaymentMethod.objects.order_by('id'), many=True).data,
+        'years': YearSerializer(Year.objects.order_by('year'), many=True).data,
+    }
+
+    payload = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False).encode('utf-8')
+    return Snapshot(version, payload, f'"{hashlib.sha256(payload).hexdigest()[:32]}"', company)
+
+
+def snapshot():
+    """Catálogos de la versión actual; se recargan solo si otro proceso (o este) los cambió."""
+    global _snapshot
+
+    version = current_version()
+    cached = _snapshot
+
+    if cached is not None and cached.version == version:
+        return cached
+
+    with _lock:
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = _load(version)
+        return _snapshot
+
+
+def company():
+    """La empresa (datos de cabecera de los PDFs) de la versión actual, sin cargar los demás catálogos."""
+    global _company
+
+    version = current_version()
+    cached = _snapshot
+
+    if cached is not None and cached.version == version:
+        return cached.company
+
+    cached = _company
+
+    if cached is None or cached[0] != version:
+        cached = (version, Company.objects.first())
+        _company = cached
+
+    return cached[1]
+
+
+def invalidate():
+    """Nueva versión de los catálogos para todos los procesos; este descarta la suya de inmediato."""
+    global _snapshot, _company
+
+    Sequence.reserve(CATALOGS)
+    _snapshot = None
+    _company = None
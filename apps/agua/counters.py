@@ -0,0 +1,131 @@
+"""
+Contadores del tablero (TotalDashboard) guardados en DashboardCounter.
+
+Triggers de PostgreSQL por sentencia (migración 0023) suman las filas
+insertadas y restan las eliminadas de facturas, clientes y lecturas, y el
+total de las facturas, también con bulk_create, borrados en cascada y
+UPDATE masivos. Cada sentencia actualiza una sola fila de contador, así una
+carga masiva no la bloquea más de una vez.
+
+Cada contador se reparte en SHARDS filas y cada sesión de la base de datos
+suma en la suya (pg_backend_pid() % SHARDS, migración 0026): dos cajeros que
+registran facturas a la vez no esperan el bloqueo de la misma fila hasta el
+final de la transacción del otro. Leer el tablero suma esas filas en una
+consulta, sin importar el tamaño de las tablas.
+
+Si falta un contador (tabla vaciada o recién restaurada) se calcula con
+COUNT/SUM o, si quien llama acepta valores aproximados, con la estimación
+de filas de las estadísticas de PostgreSQL (pg_class.reltuples).
+`manage.py refresh_dashboard_counters` los vuelve a calcular y guardar.
+"""
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+
+from .models import Customer, DashboardCounter, Invoice, Reading
+
+# Filas por contador; debe coincidir con la migración 0026, que crea los triggers
+SHARDS = 16
+
+# value: el número; exact: False si es una estimación
+Figure = namedtuple('Figure', ['value', 'exact'])
+
+# Contador -> (modelo, campo sumado o None para contar filas). Los nombres coinciden con los triggers.
+COUNTERS = {
+    'invoices': (Invoice, None),
+    'invoice_total': (Invoice, 'total_amount'),
+    'customers': (Customer, None),
+    'readings': (Reading, None),
+}
+
+
+def _exact(name):
+    model, field = COUNTERS[name]
+
+    if field is None:
+        return model.objects.count()
+    return model.objects.aggregate(total=Sum(field))['total'] or 0
+
+
+def _estimate(name):
+    """Filas según las estadísticas de la tabla, o None (sumas o tabla nunca analizada)."""
+    model, field = COUNTERS[name]
+
+    if field is not None:
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table])
+        row = cursor.fetchone()
+
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def _value(name, value):
+    return value if COUNTERS[name][1] else int(value)
+
+
+def read(names=None, approximate=False):
+    """
+    {contador: Figure} de los contadores pedidos (todos por defecto). Los que
+    no están guardados se estiman si `approximate` y, si no, se calculan.
+    """
+    names = list(names or COUNTERS)
+    # Un contador al que le falta alguna fila perdió los cambios que los triggers sumaban en ella
+    stored = dict(
+        DashboardCounter.objects.filter(name__in=names)
+        .values('name')
+        .annotate(total=Sum('value'), shards=Count('id'))
+        .filter(shards=SHARDS)
+        .values_list('name', 'total')
+    )
+
+    figures = {}
+    for name in names:
+
+        if name in stored:
+            figures[name] = Figure(_value(name, stored[name]), True)
+            continue
+
+        estimate = _estimate(name) if approximate else None
+
+        if estimate is not None:
+            figures[name] = Figure(estimate, False)
+        else:
+            figures[name] = Figure(_exact(name), True)
+
+    return figures
+
+
+def refresh(names=None):
+    """
+    Calcula y guarda los contadores. Las tablas se bloquean contra escrituras
+    mientras se cuentan, así ningún cambio queda fuera del valor guardado ni
+    se suma dos veces.
+    """
+    names = list(names or COUNTERS)
+    tables = sorted({COUNTERS[name][0]._meta.db_table for name in names})
+
+    with transaction.atomic():
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {', '.join(connection.ops.quote_name(table) for table in tables)} IN SHARE MODE")
+
+        values = {name: _exact(name) for name in names}
+
+        # El valor queda en la fila 0 y las demás vuelven a cero
+        DashboardCounter.objects.bulk_create(
+            [
+                DashboardCounter(name=name, shard=shard, value=value if shard == 0 else 0)
+                for name, value in values.items()
+                for shard in range(SHARDS)
+            ],
+            update_conflicts=True,
+            unique_fields=['name', 'shard'],
+            update_fields=['value'],
+        )
+
+    return values
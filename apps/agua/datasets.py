@@ -0,0 +1,296 @@
+"""
+Datos de los reportes (lecturas, saldos, deudas y caja).
+
+Cada función recibe los parámetros del query string, valida los filtros y
+devuelve un Dataset cuyas filas se generan de a poco desde un `.iterator()`:
+el mismo Dataset se exporta como CSV en streaming o XLSX (exports.py) o se
+usa para el PDF (reports.py), sin tener todo el resultado en memoria salvo
+cuando el formato lo exige.
+"""
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+from dateutil.relativedelta import relativedelta
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db.models import DateField, Sum, Q
+from django.db.models.functions import Cast, TruncMonth
+from django.utils.timezone import localtime, make_aware, now
+from django_filters import filterset
+
+from .filters import DebtReportFilter
+from .models import Cash, Customer, CustomerDebt, InvoicePayment, Reading
+
+CHUNK_SIZE = 2000
+
+# columns: lista de (clave, encabezado); rows: iterable perezoso de dicts;
+# queryset: consulta base (para totales); meta: datos del encabezado del reporte
+Dataset = namedtuple('Dataset', ['name', 'columns', 'rows', 'queryset', 'meta'])
+
+
+class ReportError(Exception):
+    """Parámetros inválidos para un reporte."""
+
+
+def _rows(queryset, fields, build):
+    for values in queryset.values(*fields).iterator(chunk_size=CHUNK_SIZE):
+        yield build(values)
+
+
+# Mismos filtros que ReadingViewSet.filterset_fields
+ReadingFilterSet = filterset.filterset_factory(Reading, fields=['customer', 'is_paid', 'customer__meter_code'])
+
+PAYMENT_STATUS = {'paid': 'Pagado', 'pending': 'Pendiente', 'overdue': 'Vencida'}
+
+
+def readings(params):
+    """Lecturas filtradas por cliente, medidor, año y estado de pago."""
+    filters = ReadingFilterSet(params, queryset=Reading.objects.all())
+
+    if not filters.is_valid():
+        raise ReportError(filters.errors)
+
+    queryset = filters.qs
+    today = now().date()
+
+    # Aplicar filtro por año si existe
+    year = params.get('year')
+    if year:
+        if not str(year).isdigit():
+            raise ReportError("year debe ser un número")
+        queryset = queryset.filter(reading_date__year=year)
+
+    # Manejar el filtro por estado de pago
+    payment_status = params.get('payment_status')
+
+    if payment_status == 'paid':
+        queryset = queryset.filter(is_paid=True)
+    elif payment_status == 'pending':
+        queryset = queryset.filter(is_paid=False, due_date__gte=today)
+    elif payment_status == 'overdue':
+        queryset = queryset.filter(is_paid=False, due_date__lt=today)
+
+    queryset = queryset.order_by('reading_date', 'id')
+
+    def build(values):
+        # Mismo cálculo que ReadingReadSerializer
+        if values['is_paid']:
+            status, days_overdue = 'paid', 0
+        elif values['due_date'] and today > values['due_date']:
+            status, days_overdue = 'overdue', (today - values['due_date']).days
+        else:
+            status, days_overdue = 'pending', 0
+
+        return {
+            'correlative': values['correlative'],
+            'customer_name': values['customer__full_name'],
+            'meter_code': values['customer__meter_code'],
+            'reading_date': values['reading_date'],
+            'current_reading': values['current_reading'],
+            'consumption': values['consumption'],
+            'payment_status': status,
+            'days_overdue': days_overdue,
+            'total_amount': values['total_amount'],
+        }
+
+    fields = [
+        'correlative', 'customer__full_name', 'customer__meter_code', 'reading_date',
+        'current_reading', 'consumption', 'is_paid', 'due_date', 'total_amount',
+    ]
+
+    return Dataset(
+        name=f"reporte_lecturas_{payment_status or 'todos'}",
+        columns=[
+            ('correlative', 'Correlativo'),
+            ('customer_name', 'Cliente'),
+            ('meter_code', 'Medidor'),
+            ('reading_date', 'Fecha de lectura'),
+            ('current_reading', 'Lectura'),
+            ('consumption', 'Consumo (m3)'),
+            ('payment_status', 'Estado'),
+            ('days_overdue', 'Días de mora'),
+            ('total_amount', 'Total'),
+        ],
+        rows=_rows(queryset, fields, build),
+        queryset=queryset,
+        meta={'payment_status': PAYMENT_STATUS.get(payment_status, 'Todos'), 'payment_status_code': payment_status},
+    )
+
+
+def balances(params):
+    """Saldos (pagado/adeudado) de los clientes con lecturas, desde el resumen de deuda."""
+    queryset = CustomerDebt.objects.filter(
+        Q(paid_total__gt=0) | Q(unpaid_months__gt=0)
+    ).order_by('customer__full_name', 'customer_id')
+
+    def build(values):
+        return {
+            'id': values['customer_id'],
+            'full_name': values['customer__full_name'],
+            'number': values['customer__number'],
+            'meter_code': values['customer__meter_code'],
+            'address': values['customer__address'],
+            'paid': values['paid_total'],
+            'pending': values['pending_total'],
+            'overdue': values['overdue_total'],
+            'total_debt': values['pending_total'] + values['overdue_total'],
+        }
+
+    fields = [
+        'customer_id', 'customer__full_name', 'customer__number', 'customer__meter_code',
+        'customer__address', 'paid_total', 'pending_total', 'overdue_total',
+    ]
+
+    return Dataset(
+        name="reporte_saldos_clientes",
+        columns=[
+            ('id', 'ID'),
+            ('full_name', 'Cliente'),
+            ('number', 'Número'),
+            ('meter_code', 'Medidor'),
+            ('address', 'Dirección'),
+            ('paid', 'Pagado'),
+            ('pending', 'Pendiente'),
+            ('overdue', 'Vencido'),
+            ('total_debt', 'Deuda total'),
+        ],
+        rows=_rows(queryset, fields, build),
+        queryset=queryset,
+        meta={},
+    )
+
+
+def debts(params):
+    """
+    Clientes con deuda en los últimos `months` meses (default 6), filtrados por
+    zona o calle (DebtReportFilter), en una sola consulta agrupada: total
+    adeudado y la lista de meses impagos como arreglo por cliente.
+    """
+    try:
+        months = int(params.get('months', 6))  # Default: últimos 6 meses
+    except ValueError:
+        raise ReportError("months debe ser un número")
+
+    if months < 1:
+        raise ReportError("months debe ser mayor que cero")
+
+    # Calculamos fecha de corte
+    cutoff_date = now().date() - relativedelta(months=months)
+    unpaid = Q(readings__is_paid=False) & Q(readings__reading_date__gte=cutoff_date)
+
+    # Solo clientes que el resumen de deuda marca con meses impagos (índice de estado)
+    customers = DebtReportFilter(
+        params,
+        queryset=Customer.objects.filter(debt__status__in=[CustomerDebt.PENDING, CustomerDebt.OVERDUE]),
+    )
+
+    if not customers.is_valid():
+        raise ReportError(customers.errors)
+
+    # DATE_TRUNC devuelve timestamp: se convierte a date dentro del arreglo
+    month = Cast(TruncMonth('readings__reading_date'), DateField())
+
+    queryset = customers.qs.annotate(
+        total_debt=Sum('readings__total_amount', filter=unpaid),
+        months_list=ArrayAgg(month, distinct=True, filter=unpaid, ordering=month),
+    ).filter(total_debt__gt=0).order_by('full_name', 'id')
+
+    def build(values):
+        return {
+            'id': values['id'],
+            'name': values['full_name'],
+            'address': values['address'],
+            'zone': values['calle__zona__name'] or '',
+            'total_debt': values['total_debt'],
+            'debt_months': len(values['months_list']),
+            'months_list': values['months_list'],
+        }
+
+    fields = ['id', 'full_name', 'address', 'calle__zona__name', 'total_debt', 'months_list']
+
+    return Dataset(
+        name="deudas_clientes",
+        columns=[
+            ('id', 'ID'),
+            ('name', 'Cliente'),
+            ('address', 'Dirección'),
+            ('zone', 'Zona'),
+            ('debt_months', 'Meses adeudados'),
+            ('months_list', 'Meses'),
+            ('total_debt', 'Deuda'),
+        ],
+        rows=_rows(queryset, fields, build),
+        queryset=queryset,
+        meta={'cutoff_date': cutoff_date, 'months': months},
+    )
+
+
+def _parse_date(value, name):
+    if not value:
+        raise ReportError(f"Debe proporcionar {name}")
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ReportError(f"{name} debe tener el formato YYYY-MM-DD")
+
+
+def cash(params):
+    """Pagos de una caja en un día (`type=daily`) o en un rango de fechas (`type=range`)."""
+    try:
+        cash = Cash.objects.get(pk=params.get('cash'))
+    except (Cash.DoesNotExist, ValueError, TypeError):
+        raise ReportError("La caja no existe")
+
+    report_type = params.get('type', 'daily')  # daily, range
+
+    if report_type == 'daily':
+        start_date = end_date = _parse_date(params.get('date'), 'date')
+    elif report_type == 'range':
+        # Validar que ambas fechas existan
+        start_date = _parse_date(params.get('start_date'), 'start_date')
+        end_date = _parse_date(params.get('end_date'), 'end_date')
+    else:
+        raise ReportError("type debe ser daily o range")
+
+    # Por el momento en que se registró cada pago (índice cash, created_at), en días de la zona horaria local
+    queryset = InvoicePayment.objects.filter(
+        cash=cash,
+        created_at__gte=make_aware(datetime.combine(start_date, time.min)),
+        created_at__lt=make_aware(datetime.combine(end_date + timedelta(days=1), time.min)),
+    ).order_by('created_at', 'id')
+
+    def build(values):
+        return {
+            'customer_name': values['invoice__customer__full_name'],
+            'correlative': values['invoice__correlative'],
+            'date': localtime(values['created_at']).date(),
+            'payment_method': values['payment_method__description'],
+            'total': values['total'],
+        }
+
+    fields = [
+        'invoice__customer__full_name', 'invoice__correlative', 'created_at',
+        'payment_method__description', 'total',
+    ]
+
+    return Dataset(
+        name="reporte_caja",
+        columns=[
+            ('customer_name', 'Cliente'),
+            ('correlative', 'Comprobante'),
+            ('date', 'Fecha'),
+            ('payment_method', 'Método de pago'),
+            ('total', 'Monto'),
+        ],
+        rows=_rows(queryset, fields, build),
+        queryset=queryset,
+        meta={'cash': cash, 'type': report_type, 'start_date': start_date, 'end_date': end_date},
+    )
+
+
+# Reportes que se pueden exportar a CSV/XLSX: kind de ReportJob -> Dataset
+DATASETS = {
+    'readings': readings,
+    'balance': balances,
+    'debts': debts,
+    'cash': cash,
+}
@@ -0,0 +1,91 @@
+from django.db import transaction
+from django.db.models import Count, Min, Q, Sum
+from django.utils.timezone import localdate
+
+from .models import Customer, CustomerDebt, Reading
+
+SUMMARY_FIELDS = [
+    'paid_total', 'pending_total', 'overdue_total', 'unpaid_months',
+    'oldest_unpaid_due_date', 'next_due_date', 'status', 'updated_at',
+]
+
+BATCH_SIZE = 1000
+
+
+def _summaries(customer_ids, today):
+    """Totales por cliente en una sola consulta agregada sobre sus lecturas."""
+    unpaid = Q(is_paid=False)
+
+    rows = Reading.objects.filter(customer_id__in=customer_ids).values('customer_id').annotate(
+        paid=Sum('total_amount', filter=Q(is_paid=True)),
+        pending=Sum('total_amount', filter=unpaid & ~Q(due_date__lt=today)),
+        overdue=Sum('total_amount', filter=unpaid & Q(due_date__lt=today)),
+        unpaid_months=Count('id', filter=unpaid),
+        oldest_unpaid_due_date=Min('due_date', filter=unpaid),
+        next_due_date=Min('due_date', filter=unpaid & Q(due_date__gte=today)),
+    ).order_by()
+
+    return {row['customer_id']: row for row in rows}
+
+
+def refresh_customer_debts(customer_ids):
+    """
+    Recalcula el resumen de deuda de los clientes indicados: una consulta
+    agregada y un UPSERT para todo el conjunto. Se ejecuta dentro de la
+    transacción del llamador, junto con el cambio que lo originó.
+    """
+    customer_ids = set(customer_ids)
+
+    if not customer_ids:
+        return
+
+    today = localdate()
+
+    with transaction.atomic():
+
+        # Solo clientes que aún existen (p. ej. no durante el borrado en cascada de uno)
+        existing = Customer.objects.filter(id__in=customer_ids).values_list('id', flat=True)
+        summaries = _summaries(customer_ids, today)
+
+        debts = []
+
+        for customer_id in existing:
+
+            row = summaries.get(customer_id, {})
+            debt = CustomerDebt(
+                customer_id=customer_id,
+                paid_total=row.get('paid') or 0,
+                pending_total=row.get('pending') or 0,
+                overdue_total=row.get('overdue') or 0,
+                unpaid_months=row.get('unpaid_months') or 0,
+                oldest_unpaid_due_date=row.get('oldest_unpaid_due_date'),
+                next_due_date=row.get('next_due_date'),
+            )
+            debt.status = debt.current_status(today)
+            debts.append(debt)
+
+        CustomerDebt.objects.bulk_create(
+            debts,
+            update_conflicts=True,
+            unique_fields=['customer'],
+            update_fields=SUMMARY_FIELDS,
+        )
+
+
+def refresh_in_batches(customer_ids):
+    """Recalcula los resúmenes por bloques para no cargar toda la tabla de una vez."""
+    customer_ids = list(customer_ids)
+    for start in range(0, len(customer_ids), BATCH_SIZE):
+        refresh_customer_debts(customer_ids[start:start + BATCH_SIZE])
+
+
+def rollover():
+    """
+    Recalcula los clientes cuyo próximo vencimiento ya pasó, para que sus
+    montos pasen de pendiente a vencido. Devuelve cuántos se actualizaron.
+    """
+    customer_ids = list(
+        CustomerDebt.objects.filter(next_due_date__lt=localdate()).values_list('customer_id', flat=True)
+    )
+    refresh_in_batches(customer_ids)
+    return len(customer_ids)
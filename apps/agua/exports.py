@@ -0,0 +1,88 @@
+"""
+Exportación de un Dataset (datasets.py) a CSV o XLSX.
+
+El CSV se genera línea por línea para StreamingHttpResponse: la descarga
+empieza con la primera fila. El XLSX usa el modo constant_memory de
+XlsxWriter, que escribe cada fila a disco apenas se completa.
+"""
+import csv
+from datetime import date
+from decimal import Decimal
+
+import xlsxwriter
+
+FORMATS = ('csv', 'xlsx')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return ', '.join(_csv_value(item) for item in value)
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+class _Echo:
+    """Archivo que devuelve lo que se le escribe (para csv.writer en streaming)."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(dataset):
+    """Líneas del CSV (con BOM para que Excel reconozca UTF-8)."""
+    writer = csv.writer(_Echo())
+    yield '\ufeff' + writer.writerow([header for _, header in dataset.columns])
+
+    keys = [key for key, _ in dataset.columns]
+    for row in dataset.rows:
+        yield writer.writerow([_csv_value(row[key]) for key in keys])
+
+
+def write_csv(dataset, target):
+    with open(target, 'w', encoding='utf-8', newline='') as file:
+        file.writelines(csv_lines(dataset))
+
+
+def write_xlsx(dataset, target):
+    """Escribe el XLSX en `target` (ruta o archivo) fila por fila."""
+    workbook = xlsxwriter.Workbook(target, {
+        'constant_memory': True,
+        'default_date_format': 'dd/mm/yyyy',
+    })
+    sheet = workbook.add_worksheet()
+    bold = workbook.add_format({'bold': True})
+
+    sheet.write_row(0, 0, [header for _, header in dataset.columns], bold)
+
+    keys = [key for key, _ in dataset.columns]
+    for index, row in enumerate(dataset.rows, start=1):
+        for column, key in enumerate(keys):
+            value = row[key]
+            if isinstance(value, list):
+                value = _csv_value(value)
+            elif isinstance(value, Decimal):
+                value = float(value)
+            sheet.write(index, column, value)
+
+    workbook.close()
+
+
+def write(dataset, output, target):
+    """Exporta el dataset en el formato `output` (csv o xlsx) y devuelve el nombre de descarga."""
+    if output == 'csv':
+        write_csv(dataset, target)
+    else:
+        write_xlsx(dataset, target)
+    return filename(dataset, output)
+
+
+def filename(dataset, output):
+    return f"{dataset.name}_{date.today().strftime('%Y%m%d')}.{output}"
@@ -0,0 +1,15 @@
+import django_filters
+
+from .models import Customer
+
+
+class DebtReportFilter(django_filters.FilterSet):
+
+    """Filtros del reporte de deudas: zona o calle del cliente (ambos por llave foránea indexada)."""
+
+    zona = django_filters.NumberFilter(field_name='calle__zona_id')
+    calle = django_filters.NumberFilter(field_name='calle_id')
+
+    class Meta:
+        model = Customer
+        fields = ['zona', 'calle']
@@ -0,0 +1,179 @@
+"""
+Cola de reportes en la base de datos (sin broker externo).
+
+Los endpoints de reportes encolan un ReportJob con `enqueue`; los procesos de
+`manage.py run_report_workers` toman trabajos con SELECT ... FOR UPDATE SKIP
+LOCKED, así dos procesos nunca ejecutan el mismo. Un pedido con los mismos
+parámetros que un trabajo en cola o en proceso devuelve ese trabajo.
+
+Mientras genera el archivo, el proceso renueva `updated_at` cada
+HEARTBEAT_EVERY desde un hilo aparte, aunque el progreso no cambie. Un
+trabajo sin latido por STALE_AFTER se vuelve a tomar con un `claim_token`
+nuevo; el proceso anterior, si seguía vivo, ya no es dueño del trabajo y
+descarta su resultado en lugar de pisar el del nuevo.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils.timezone import now
+
+from .models import ReportJob
+from .reports import REPORTS, build
+
+logger = logging.getLogger(__name__)
+
+# Un trabajo en proceso sin latido por este tiempo se considera abandonado (proceso caído)
+STALE_AFTER = timedelta(minutes=30)
+HEARTBEAT_EVERY = timedelta(minutes=1)
+
+
+def params_hash(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def enqueue(kind, params):
+    """Encola el reporte `kind` o devuelve el trabajo activo con los mismos parámetros. Devuelve (job, creado)."""
+    if kind not in REPORTS:
+        raise ValueError(f"Reporte desconocido: {kind}")
+
+    digest = params_hash(params)
+    active = ReportJob.objects.filter(kind=kind, params_hash=digest, status__in=ReportJob.ACTIVE)
+
+    job = active.first()
+    if job:
+        return job, False
+
+    try:
+        with transaction.atomic():
+            return ReportJob.objects.create(kind=kind, params=params, params_hash=digest), True
+    except IntegrityError:
+        # Otro request lo encoló al mismo tiempo (unique_active_report_job)
+        return active.get(), False
+
+
+def claim():
+    """Toma el trabajo más antiguo en cola (o abandonado) y lo marca en proceso."""
+    with transaction.atomic():
+        job = ReportJob.objects.select_for_update(skip_locked=True).filter(
+            Q(status=ReportJob.QUEUED) |
+            Q(status=ReportJob.RUNNING, updated_at__lt=now() - STALE_AFTER)
+        ).order_by('id').first()
+
+        if job is None:
+            return None
+
+        job.status = ReportJob.RUNNING
+        job.progress = 0
+        job.started_at = now()
+        job.claim_token = uuid.uuid4()
+        job.save(update_fields=['status', 'progress', 'started_at', 'claim_token', 'updated_at'])
+
+    return job
+
+
+def _owned(job):
+    """El trabajo, solo si este proceso sigue siendo quien lo tomó."""
+    return ReportJob.objects.filter(pk=job.pk, status=ReportJob.RUNNING, claim_token=job.claim_token)
+
+
+def _heartbeat(job, stopped):
+    try:
+        while not stopped.wait(HEARTBEAT_EVERY.total_seconds()):
+            if not _owned(job).update(updated_at=now()):
+                return  # Otro proceso lo tomó
+    finally:
+        connection.close()  # La conexión es de este hilo
+
+
+def _set_progress(job, percent):
+    percent = max(0, min(int(percent), 99))
+    if percent != job.progress:
+        job.progress = percent
+        _owned(job).update(progress=percent, updated_at=now())
+
+
+def run(job):
+    """Genera el archivo del trabajo en REPORT_JOBS_DIR y guarda el resultado si aún es dueño del trabajo."""
+    os.makedirs(settings.REPORT_JOBS_DIR, exist_ok=True)
+    descriptor, path = tempfile.mkstemp(dir=settings.REPORT_JOBS_DIR, prefix=f"{job.kind}-{job.id}-")
+    os.close(descriptor)
+
+    stopped = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(job, stopped), daemon=True)
+    heartbeat.start()
+
+    try:
+        filename = build(job.kind, job.params, path, progress=lambda percent: _set_progress(job, percent))
+    except Exception as exc:
+        os.remove(path)
+        logger.exception("Falló el trabajo de reporte %s", job.id)
+        job.status = ReportJob.FAILED
+        job.error = str(exc) or traceback.format_exc(limit=1)
+        job.finished_at = now()
+        result = {'status': job.status, 'error': job.error, 'finished_at': job.finished_at}
+    else:
+        job.status = ReportJob.DONE
+        job.progress = 100
+        job.file_path = path
+        job.filename = filename
+        job.finished_at = now()
+        result = {
+            'status': job.status, 'progress': job.progress, 'file_path': path,
+            'filename': filename, 'finished_at': job.finished_at,
+        }
+    finally:
+        stopped.set()
+        heartbeat.join()
+
+    if not _owned(job).update(updated_at=now(), **result):
+        # Se consideró abandonado y otro proceso lo tomó: su resultado es el que vale
+        logger.warning("El trabajo de reporte %s fue tomado por otro proceso", job.id)
+        if job.file_path == path:
+            os.remove(path)
+        job.refresh_from_db()
+
+    return job
+
+
+def work(poll_interval=2, once=False):
+    """Bucle de un proceso de run_report_workers. Con `once` termina cuando la cola queda vacía."""
+    processed = 0
+
+    while True:
+        job = claim()
+
+        if job is None:
+            if once:
+                return processed
+            time.sleep(poll_interval)
+            continue
+
+        run(job)
+        processed += 1
+
+
+def purge(days):
+    """Elimina los trabajos terminados hace más de `days` días y sus archivos."""
+    old = ReportJob.objects.filter(
+        status__in=[ReportJob.DONE, ReportJob.FAILED],
+        finished_at__lt=now() - timedelta(days=days),
+    )
+
+    for path in old.exclude(file_path=None).values_list('file_path', flat=True):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    return old.delete()[0]
@@ -0,0 +1,69 @@
+import os
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.agua import benchmarks
+
+
+class Command(BaseCommand):
+
+    help = (
+        "Mide tiempo y número de consultas SQL de los endpoints principales y falla si "
+        "superan los presupuestos o la línea base guardada (ver seed_synthetic)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help="Requests por escenario (se usa la mediana)")
+        parser.add_argument('--only', nargs='+', choices=sorted(benchmarks.BUDGETS), help="Escenarios a medir")
+        parser.add_argument(
+            '--baseline', default=os.path.join(settings.BASE_DIR, 'benchmark_baseline.json'),
+            help="Archivo JSON de la línea base"
+        )
+        parser.add_argument('--save', action='store_true', help="Guardar los resultados como nueva línea base")
+        parser.add_argument('--budgets', help="JSON con presupuestos que reemplazan a los de benchmarks.BUDGETS")
+        parser.add_argument(
+            '--tolerance', type=float, default=0.5,
+            help="Aumento de tiempo admitido sobre la línea base (0.5 = 50%%)"
+        )
+        parser.add_argument('--user', help="Email del usuario para autenticar (por defecto el primer superusuario)")
+
+    def handle(self, *args, **options):
+
+        users = get_user_model().objects.order_by('-is_superuser', 'id')
+        user = users.filter(email=options['user']).first() if options['user'] else users.first()
+
+        if user is None:
+            raise CommandError("No hay un usuario para autenticar los requests")
+
+        budgets = benchmarks.load_budgets(options['budgets']) if options['budgets'] else benchmarks.BUDGETS
+        baseline = None if options['save'] else benchmarks.load_baseline(options['baseline'])
+
+        try:
+            results = benchmarks.run(user, repeat=options['repeat'], only=options['only'])
+        except benchmarks.BenchmarkError as exc:
+            raise CommandError(str(exc))
+
+        base = (baseline or {}).get('results', {})
+
+        self.stdout.write(f"{'escenario':<20}{'estado':>8}{'ms':>12}{'consultas':>11}{'base ms':>12}{'base c.':>9}")
+        for result in results:
+            previous = base.get(result.name, {})
+            self.stdout.write(
+                f"{result.name:<20}{result.status:>8}{result.ms:>12.1f}{result.queries:>11}"
+                f"{previous.get('ms', '-'):>12}{previous.get('queries', '-'):>9}"
+            )
+
+        failures = benchmarks.check(results, budgets, baseline, options['tolerance'])
+
+        if failures:
+            for failure in failures:
+                self.stderr.write(failure)
+            raise CommandError(f"{len(failures)} regresiones de rendimiento")
+
+        if options['save']:
+            benchmarks.save_baseline(options['baseline'], results)
+            self.stdout.write(self.style.SUCCESS(f"Línea base guardada en {options['baseline']}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Sin regresiones"))
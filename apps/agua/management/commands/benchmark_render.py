@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template import engines
+from django.template.loader import get_template
+from weasyprint import HTML, CSS
+from weasyprint.text.fonts import FontConfiguration
+
+from apps.agua import rendering
+from apps.agua.models import Company, Reading
+from apps.agua.receipts import receipt_context
+
+
+class Command(BaseCommand):
+
+    help = (
+        "Mide el tiempo de renderizado por recibo: parseando CSS, fuentes y template "
+        "en cada recibo (como antes) y con el servicio de renderizado (rendering.py)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=20, help="Recibos a renderizar en cada modo")
+        parser.add_argument('--reading', type=int, help="Lectura a usar (por defecto la última)")
+
+    def handle(self, *args, **options):
+
+        readings = Reading.objects.select_related('customer__tariff').order_by('-id')
+        reading = readings.filter(pk=options['reading']).first() if options['reading'] else readings.first()
+
+        if reading is None:
+            raise CommandError("No hay lecturas para renderizar")
+
+        company = Company.objects.first()
+        company_logo = company.logo.url if company and company.logo else None
+        context = receipt_context(reading, company, company_logo)
+        count = options['count']
+
+        def uncached():
+            # Como antes: template, fuentes y CSS se vuelven a procesar en cada recibo
+            font_config = FontConfiguration()
+            source = get_template("agua/invoice_template.html").template.source
+            html_string = engines['django'].from_string(source).render(context)
+            HTML(string=html_string, base_url=rendering.BASE_URL, url_fetcher=rendering.url_fetcher).write_pdf(
+                stylesheets=[CSS(filename=rendering.INVOICE_CSS, font_config=font_config)],
+                font_config=font_config,
+            )
+
+        def cached():
+            html_string = rendering.render_template("agua/invoice_template.html", context)
+            rendering.render_pdf(html_string, stylesheets=[rendering.INVOICE_CSS])
+
+        rendering.clear()
+        cached()  # Primer recibo: llena la caché del proceso
+
+        results = {}
+        for label, render in (('sin caché', uncached), ('con caché', cached)):
+            start = time.perf_counter()
+            for _ in range(count):
+                render()
+            results[label] = (time.perf_counter() - start) / count * 1000
+            self.stdout.write(f"{label}: {results[label]:.1f} ms por recibo ({count} recibos)")
+
+        if results['con caché']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Mejora: {results['sin caché'] / results['con caché']:.2f}x"
+            ))
@@ -0,0 +1,93 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from apps.agua.billing import bill_calle
+from apps.agua.models import BillingCheckpoint, Calle
+from apps.agua.utils import init_worker
+
+
+class Command(BaseCommand):
+
+    help = (
+        "Facturación mensual: recalcula y emite las lecturas del periodo por calle, "
+        "en paralelo y con puntos de control para reanudar una corrida interrumpida."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', required=True, help="Periodo a facturar (YYYY-MM)")
+        parser.add_argument('--zona', type=int, help="Facturar solo las calles de esta zona")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Procesos en paralelo")
+        parser.add_argument('--restart', action='store_true', help="Ignorar los puntos de control del periodo")
+
+    def handle(self, *args, **options):
+
+        try:
+            period = datetime.strptime(options['period'], '%Y-%m').date()
+        except ValueError:
+            raise CommandError("El periodo debe tener el formato YYYY-MM")
+
+        calles = Calle.objects.order_by('id')
+
+        if options['zona']:
+            calles = calles.filter(zona_id=options['zona'])
+
+        calle_ids = list(calles.values_list('id', flat=True))
+        checkpoints = BillingCheckpoint.objects.filter(period=period, calle_id__in=calle_ids)
+
+        if options['restart']:
+            checkpoints.delete()
+
+        done = set(checkpoints.values_list('calle_id', flat=True))
+        pending = [calle_id for calle_id in calle_ids if calle_id not in done]
+
+        self.stdout.write(
+            f"Periodo {period:%Y-%m}: {len(pending)} calles por facturar "
+            f"({len(done)} ya completadas en una corrida anterior)"
+        )
+
+        totals = {'customers': 0, 'created': 0, 'updated': 0, 'missing': 0}
+        start = time.monotonic()
+
+        for calle_id, result in self._run(pending, period, options['workers']):
+
+            if result is None:
+                continue
+
+            for key in totals:
+                totals[key] += result[key]
+
+            self.stdout.write(
+                f"  calle {calle_id}: {result['customers']} clientes, {result['created']} emitidas, "
+                f"{result['updated']} recalculadas, {result['missing']} sin lectura"
+            )
+
+        elapsed = time.monotonic() - start
+        rate = totals['customers'] / elapsed if elapsed else 0
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Listo en {elapsed:.1f}s ({rate:.0f} clientes/s): {totals['customers']} clientes, "
+            f"{totals['created']} lecturas emitidas, {totals['updated']} recalculadas, "
+            f"{totals['missing']} clientes con medidor sin lectura del mes"
+        ))
+
+    def _run(self, calle_ids, period, workers):
+
+        if workers <= 1 or len(calle_ids) <= 1:
+            for calle_id in calle_ids:
+                yield calle_id, bill_calle(calle_id, period)
+            return
+
+        # Las conexiones abiertas no deben heredarse en los procesos hijos
+        connections.close_all()
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+
+            futures = {pool.submit(bill_calle, calle_id, period): calle_id for calle_id in calle_ids}
+
+            for future in as_completed(futures):
+                yield futures[future], future.result()
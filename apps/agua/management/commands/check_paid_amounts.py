@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Case, DecimalField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from apps.agua import pdfcache
+from apps.agua.debts import refresh_in_batches
+from apps.agua.models import InvoiceReading, Reading
+
+
+class Command(BaseCommand):
+
+    help = (
+        "Compara Reading.amount_paid con la suma de sus pagos (InvoiceReading) e is_paid con "
+        "amount_paid >= total_amount. Con --fix corrige las diferencias."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Corregir las lecturas con diferencias")
+        parser.add_argument('--limit', type=int, default=20, help="Diferencias a mostrar")
+
+    def handle(self, *args, **options):
+
+        payments = InvoiceReading.objects.filter(reading=OuterRef('pk')).values('reading').annotate(
+            total=Sum('amount_paid')
+        ).values('total')
+
+        expected = Coalesce(Subquery(payments), Value(0), output_field=DecimalField(max_digits=10, decimal_places=2))
+
+        mismatched = Reading.objects.annotate(expected=expected).filter(
+            ~Q(amount_paid=expected) |
+            Q(is_paid=True, total_amount__gt=expected) |
+            Q(is_paid=False, total_amount__lte=expected)
+        )
+
+        rows = list(mismatched.order_by('id').values_list('id', 'customer_id', 'amount_paid', 'expected', 'is_paid'))
+
+        if not rows:
+            self.stdout.write(self.style.SUCCESS("Los totales pagados coinciden con los pagos"))
+            return
+
+        for reading_id, _, amount_paid, total, is_paid in rows[:options['limit']]:
+            self.stdout.write(
+                f"Lectura {reading_id}: amount_paid={amount_paid}, pagos={total}, is_paid={is_paid}"
+            )
+
+        if not options['fix']:
+            raise CommandError(f"{len(rows)} lecturas no coinciden con sus pagos (use --fix para corregirlas)")
+
+        with transaction.atomic():
+            ids = [row[0] for row in rows]
+            # Un UPDATE: total desde los pagos e is_paid derivado del mismo valor
+            Reading.objects.filter(id__in=ids).update(
+                amount_paid=expected,
+                is_paid=Case(When(total_amount__lte=expected, then=Value(True)), default=Value(False)),
+            )
+
+            customer_ids = {row[1] for row in rows}
+            for customer_id in customer_ids:
+                pdfcache.invalidate_customer(customer_id)
+            refresh_in_batches(customer_ids)
+
+        self.stdout.write(self.style.SUCCESS(f"{len(rows)} lecturas corregidas"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from apps.agua.debts import rollover
+
+
+class Command(BaseCommand):
+
+    help = (
+        "Proceso nocturno: recalcula el resumen de deuda de los clientes con lecturas "
+        "que vencieron desde la última actualización."
+    )
+
+    def handle(self, *args, **options):
+
+        updated = rollover()
+
+        self.stdout.write(self.style.SUCCESS(f"{updated} clientes pasaron por el rollover de deuda"))
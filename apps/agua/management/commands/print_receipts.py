@@ -0,0 +1,59 @@
+import os
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.agua.printing import CHUNK_SIZE, MAX_MERGED_RECEIPTS, mass_print
+
+
+class Command(BaseCommand):
+
+    help = (
+        "Impresión masiva de los recibos del mes por calle, por zona o de todas las zonas, "
+        "renderizados en paralelo en un solo PDF o en un ZIP con un PDF por calle."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', required=True, help="Periodo (YYYY-MM)")
+        scope = parser.add_mutually_exclusive_group()
+        scope.add_argument('--calle', type=int, help="Solo los recibos de esta calle")
+        scope.add_argument('--zona', type=int, help="Solo los recibos de esta zona")
+        parser.add_argument('--format', choices=['pdf', 'zip'], default='pdf', help="PDF único o ZIP por calle")
+        parser.add_argument('--output', required=True, help="Archivo de salida")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Procesos en paralelo")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Recibos por bloque")
+
+    def handle(self, *args, **options):
+
+        try:
+            period = datetime.strptime(options['period'], '%Y-%m').date()
+        except ValueError:
+            raise CommandError("El periodo debe tener el formato YYYY-MM")
+
+        def progress(done, total):
+            self.stdout.write(f"  bloque {done}/{total}")
+
+        start = time.monotonic()
+
+        printed = mass_print(
+            period,
+            options['output'],
+            calle_id=options['calle'],
+            zona_id=options['zona'],
+            output=options['format'],
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+            progress=progress,
+        )
+
+        elapsed = time.monotonic() - start
+
+        if printed.output != options['format']:
+            self.stdout.write(self.style.WARNING(
+                f"Más de {MAX_MERGED_RECEIPTS} recibos: se generó un ZIP con un PDF por calle"
+            ))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{printed.receipts} recibos impresos en {options['output']} ({elapsed:.1f}s)"
+        ))
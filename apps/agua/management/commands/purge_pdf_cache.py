@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.agua import pdfcache
+
+
+class Command(BaseCommand):
+
+    help = "Elimina los PDFs en caché menos usados hasta que la caché ocupe menos de PDF_CACHE_MAX_BYTES."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-bytes', type=int, default=settings.PDF_CACHE_MAX_BYTES, help="Tamaño máximo")
+
+    def handle(self, *args, **options):
+
+        pdfcache.evict(options['max_bytes'])
+
+        self.stdout.write(self.style.SUCCESS("Caché de PDFs depurada"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from apps.agua.models import CashLedger
+
+
+class Command(BaseCommand):
+
+    help = "Reconstruye desde los pagos el libro de caja (CashLedger) y los ingresos (Cash.income) de las cajas."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cash', type=int, action='append', help="Solo esta caja (se puede repetir)")
+
+    def handle(self, *args, **options):
+
+        updated = CashLedger.rebuild(options['cash'])
+
+        self.stdout.write(self.style.SUCCESS(f"Libro de caja reconstruido para {updated} cajas"))
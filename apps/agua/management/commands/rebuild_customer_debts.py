@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from apps.agua.debts import refresh_in_batches
+from apps.agua.models import Customer
+
+
+class Command(BaseCommand):
+
+    help = "Reconstruye desde cero el resumen de deuda (CustomerDebt) de todos los clientes."
+
+    def handle(self, *args, **options):
+
+        customer_ids = list(Customer.objects.order_by('id').values_list('id', flat=True))
+        refresh_in_batches(customer_ids)
+
+        self.stdout.write(self.style.SUCCESS(f"Resumen de deuda reconstruido para {len(customer_ids)} clientes"))
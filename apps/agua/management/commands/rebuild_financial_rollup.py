@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from apps.agua.models import FinancialRollup
+
+
+class Command(BaseCommand):
+
+    help = (
+        "Reconstruye desde los pagos y egresos el resumen financiero mensual (FinancialRollup). "
+        "Los años congelados (cerrados) no se recalculan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, action='append', help="Solo este año (se puede repetir)")
+
+    def handle(self, *args, **options):
+
+        years = FinancialRollup.rebuild(options['year'])
+
+        if not years:
+            self.stdout.write("No hay años para recalcular")
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Resumen financiero reconstruido para {', '.join(str(year) for year in years)}"
+        ))
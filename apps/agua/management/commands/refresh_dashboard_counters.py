@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from apps.agua import counters
+
+
+class Command(BaseCommand):
+
+    help = (
+        "Recalcula los contadores del tablero (DashboardCounter) con COUNT/SUM. Bloquea las "
+        "escrituras en facturas, clientes y lecturas mientras cuenta."
+    )
+
+    def handle(self, *args, **options):
+
+        for name, value in counters.refresh().items():
+            self.stdout.write(f"{name}: {value}")
+
+        self.stdout.write(self.style.SUCCESS("Contadores del tablero actualizados"))
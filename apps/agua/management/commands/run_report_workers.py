@@ -0,0 +1,44 @@
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from apps.agua.jobs import purge, work
+from apps.agua.utils import init_worker
+
+
+class Command(BaseCommand):
+
+    help = (
+        "Procesos que generan en segundo plano los reportes encolados "
+        "(saldos, deudas, lecturas, caja e impresión masiva de recibos)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Procesos en paralelo")
+        parser.add_argument('--poll-interval', type=float, default=2, help="Segundos entre consultas a la cola vacía")
+        parser.add_argument('--once', action='store_true', help="Terminar cuando la cola quede vacía")
+        parser.add_argument('--keep-days', type=int, default=7, help="Días que se conservan los reportes generados")
+
+    def handle(self, *args, **options):
+
+        purged = purge(options['keep_days'])
+        if purged:
+            self.stdout.write(f"{purged} trabajos antiguos eliminados")
+
+        workers = options['workers']
+        self.stdout.write(f"Procesando la cola de reportes con {workers} procesos")
+
+        if workers <= 1:
+            processed = work(options['poll_interval'], options['once'])
+        else:
+            # Las conexiones abiertas no deben heredarse en los procesos hijos
+            connections.close_all()
+
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+                futures = [pool.submit(work, options['poll_interval'], options['once']) for _ in range(workers)]
+                processed = sum(future.result() for future in futures)
+
+        self.stdout.write(self.style.SUCCESS(f"{processed} reportes generados"))
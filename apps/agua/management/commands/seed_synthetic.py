@@ -0,0 +1,47 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.agua.synthetic import generate
+
+
+class Command(BaseCommand):
+
+    help = (
+        "Genera datos sintéticos (zonas, calles, tarifas, clientes, lecturas, recibos y pagos) "
+        "para medir el rendimiento con `manage.py benchmark`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, required=True, help="Clientes a crear")
+        parser.add_argument('--months', type=int, required=True, help="Meses de lecturas por cliente")
+        parser.add_argument('--zonas', type=int, help="Zonas (por defecto según el número de calles)")
+        parser.add_argument('--seed', type=int, default=0, help="Semilla aleatoria (mismos datos con la misma semilla)")
+        parser.add_argument('--end', help="Último mes con lecturas (YYYY-MM, por defecto el actual)")
+
+    def handle(self, *args, **options):
+
+        end = None
+        if options['end']:
+            try:
+                end = datetime.strptime(options['end'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError("--end debe tener el formato YYYY-MM")
+
+        start = time.monotonic()
+
+        try:
+            created = generate(
+                options['customers'],
+                options['months'],
+                zonas=options['zonas'],
+                seed=options['seed'],
+                end=end,
+                log=self.stdout.write,
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        summary = ", ".join(f"{count} {name}" for name, count in created.items())
+        self.stdout.write(self.style.SUCCESS(f"Creados: {summary} en {time.monotonic() - start:.1f}s"))
@@ -0,0 +1,218 @@
+"""
+Middlewares de diagnóstico de rendimiento.
+
+QueryInstrumentationMiddleware (opcional, ver SQL_INSTRUMENTATION) cuenta
+las consultas y su tiempo total con un execute_wrapper en cada conexión,
+agrupándolas por "huella" (el SQL con los valores de IN (...) colapsados,
+ya que los parámetros van aparte). Si una misma huella se repite más de
+SQL_REPEATED_QUERY_THRESHOLD veces en un request, es un N+1: se registra
+un aviso con la línea del proyecto que la ejecutó. La línea se busca solo
+en ese momento, así medir un request cuesta poco más que un contador por
+consulta y se puede muestrear una parte del tráfico con
+SQL_INSTRUMENTATION_SAMPLE_RATE. Las consultas que se ejecutan al recorrer
+una respuesta en streaming (CSV) ocurren después y no se cuentan.
+
+ProfilingMiddleware guarda un perfil de cProfile (y de memoria) de los
+requests que pide un administrador (ver profiling.py).
+"""
+import cProfile
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import ExitStack
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from . import profiling
+
+logger = logging.getLogger(__name__)
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_SPACES = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """SQL normalizado: mismo texto para la misma consulta con distintos parámetros."""
+    return _SPACES.sub(' ', _IN_LIST.sub('IN (...)', sql)).strip()
+
+
+def call_site():
+    """Primera línea del proyecto en la pila actual (archivo:línea en función)."""
+    frame = sys._getframe(1)
+    base_dir = str(settings.BASE_DIR)
+
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        # Un virtualenv dentro del proyecto no cuenta como código propio
+        if filename.startswith(base_dir) and 'site-packages' not in filename and filename != __file__:
+            return f"{os.path.relpath(filename, base_dir)}:{frame.f_lineno} en {frame.f_code.co_name}"
+        frame = frame.f_back
+
+    return "desconocido"
+
+
+class QueryRecorder:
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.repeated = {}  # huella -> línea que la repitió
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+            key = fingerprint(sql)
+            self.fingerprints[key] += 1
+
+            if self.fingerprints[key] == self.threshold + 1:
+                self.repeated[key] = call_site()
+
+
+class QueryInstrumentationMiddleware:
+
+    """
+    Agrega a la respuesta `Server-Timing: db;dur=...;desc="N consultas", app;dur=...`
+    y avisa en el log de las consultas repetidas (N+1) de cada request medido.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SQL_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'SQL_INSTRUMENTATION_SAMPLE_RATE', 1.0)
+        self.threshold = getattr(settings, 'SQL_REPEATED_QUERY_THRESHOLD', 5)
+
+    def __call__(self, request):
+
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        recorder = QueryRecorder(self.threshold)
+        start = time.perf_counter()
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        total = time.perf_counter() - start
+
+        timing = (
+            f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} consultas", '
+            f'app;dur={(total - recorder.duration) * 1000:.1f}'
+        )
+        if response.has_header('Server-Timing'):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response['Server-Timing'] = timing
+
+        for key, site in recorder.repeated.items():
+            logger.warning(
+                "Consulta repetida %d veces en %s %s (%s): %s",
+                recorder.fingerprints[key], request.method, request.path, site, key[:300],
+            )
+
+        return response
+
+
+class ProfilingMiddleware:
+
+    """
+    Perfil de un request pedido por un administrador con `X-Profile: 1|memory`
+    o `?_profile=1|memory` (ver profiling.py). El resto de los requests pasa
+    sin costo adicional. La respuesta lleva el id del perfil en `X-Profile-Id`.
+    """
+
+    # tracemalloc es global al proceso: un solo request a la vez mide memoria
+    _memory_lock = threading.Lock()
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def _admin(self, request):
+        """Administrador que pide el perfil, o None. Los endpoints usan el token de DRF; el admin, la sesión."""
+        user = getattr(request, 'user', None)
+
+        if user is None or not user.is_authenticated:
+            try:
+                user = (TokenAuthentication().authenticate(request) or (None, None))[0]
+            except AuthenticationFailed:
+                return None
+
+        if user and user.is_active and user.is_staff:
+            return user
+        return None
+
+    def __call__(self, request):
+
+        mode = request.headers.get('X-Profile') or request.GET.get('_profile')
+        if not mode:
+            return self.get_response(request)
+
+        user = self._admin(request)
+        if user is None:
+            return self.get_response(request)
+
+        memory = mode == 'memory' and not tracemalloc.is_tracing() and self._memory_lock.acquire(blocking=False)
+        profiler = cProfile.Profile()
+        snapshot = None
+
+        try:
+            if memory:
+                tracemalloc.start()
+
+            start = time.perf_counter()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Otro perfilador ya activo en el proceso: se atiende sin perfil
+                return self.get_response(request)
+
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+
+            duration = time.perf_counter() - start
+
+            if memory:
+                snapshot = tracemalloc.take_snapshot()
+        finally:
+            if memory:
+                tracemalloc.stop()
+                self._memory_lock.release()
+
+        match = request.resolver_match
+        label = match.view_name.rsplit('.', 1)[-1] if match else 'sin-vista'
+        profile_id = profiling.new_id(label)
+
+        profiling.save(profile_id, profiler, snapshot, {
+            'view': label,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'user': user.get_username(),
+            'duration_ms': round(duration * 1000, 1),
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+        })
+
+        response['X-Profile-Id'] = profile_id
+        return response
@@ -0,0 +1,61 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:11
+
+from django.db import migrations, models
+from django.db.models import BigIntegerField, Max
+from django.db.models.functions import Cast
+
+
+def _max_number(queryset, field):
+    return queryset.filter(**{f'{field}__regex': r'^[0-9]+$'}).aggregate(
+        value=Max(Cast(field, BigIntegerField()))
+    )['value'] or 0
+
+
+def seed_sequences(apps, schema_editor):
+    """Inicializa los contadores con el último correlativo usado en cada serie."""
+    Sequence = apps.get_model('agua', 'Sequence')
+    Reading = apps.get_model('agua', 'Reading')
+    Invoice = apps.get_model('agua', 'Invoice')
+    Calle = apps.get_model('agua', 'Calle')
+
+    Sequence.objects.create(name='reading', last_value=_max_number(Reading.objects.all(), 'correlative'))
+    Sequence.objects.create(name='calle', last_value=_max_number(Calle.objects.all(), 'codigo'))
+
+    # Hasta ahora las facturas compartían una sola serie: cada tipo continúa desde el máximo global
+    last_invoice = _max_number(Invoice.objects.all(), 'correlative')
+    # NULL y '' comparten la serie "invoice:"
+    invoice_types = Invoice.objects.values_list('invoice_type', flat=True).distinct()
+    series = {f"invoice:{invoice_type or ''}" for invoice_type in invoice_types}
+    Sequence.objects.bulk_create([Sequence(name=name, last_value=last_invoice) for name in sorted(series)])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agua', '0014_expense'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Secuencia',
+                'verbose_name_plural': 'Secuencias',
+            },
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='correlative',
+            field=models.CharField(blank=True, max_length=10, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.UniqueConstraint(fields=('invoice_type', 'correlative'), name='unique_invoice_correlative_per_type'),
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agua', '0015_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillingCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('readings_created', models.PositiveIntegerField(default=0)),
+                ('readings_updated', models.PositiveIntegerField(default=0)),
+                ('readings_missing', models.PositiveIntegerField(default=0)),
+                ('completed_at', models.DateTimeField(auto_now_add=True)),
+                ('calle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='billing_checkpoints', to='agua.calle')),
+            ],
+            options={
+                'verbose_name': 'Punto de control de facturación',
+                'verbose_name_plural': 'Puntos de control de facturación',
+                'constraints': [models.UniqueConstraint(fields=('period', 'calle'), name='unique_billing_checkpoint')],
+            },
+        ),
+    ]
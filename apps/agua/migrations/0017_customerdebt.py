@@ -0,0 +1,75 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Min, Q, Sum
+from django.utils.timezone import localdate
+
+
+def populate_customer_debts(apps, schema_editor):
+    """Carga inicial del resumen de deuda a partir de las lecturas existentes."""
+    Reading = apps.get_model('agua', 'Reading')
+    CustomerDebt = apps.get_model('agua', 'CustomerDebt')
+
+    today = localdate()
+    unpaid = Q(is_paid=False)
+
+    rows = Reading.objects.values('customer_id').annotate(
+        paid=Sum('total_amount', filter=Q(is_paid=True)),
+        pending=Sum('total_amount', filter=unpaid & ~Q(due_date__lt=today)),
+        overdue=Sum('total_amount', filter=unpaid & Q(due_date__lt=today)),
+        unpaid_months=Count('id', filter=unpaid),
+        oldest=Min('due_date', filter=unpaid),
+        next_due=Min('due_date', filter=unpaid & Q(due_date__gte=today)),
+    ).order_by()
+
+    debts = []
+    for row in rows.iterator():
+        if row['oldest'] and row['oldest'] < today:
+            status = 'overdue'
+        elif row['unpaid_months']:
+            status = 'pending'
+        else:
+            status = 'clear'
+
+        debts.append(CustomerDebt(
+            customer_id=row['customer_id'],
+            paid_total=row['paid'] or 0,
+            pending_total=row['pending'] or 0,
+            overdue_total=row['overdue'] or 0,
+            unpaid_months=row['unpaid_months'],
+            oldest_unpaid_due_date=row['oldest'],
+            next_due_date=row['next_due'],
+            status=status,
+        ))
+
+    CustomerDebt.objects.bulk_create(debts, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agua', '0016_billingcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerDebt',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='debt', serialize=False, to='agua.customer')),
+                ('paid_total', models.DecimalField(decimal_places=2, default=0, max_digits=13)),
+                ('pending_total', models.DecimalField(decimal_places=2, default=0, max_digits=13)),
+                ('overdue_total', models.DecimalField(decimal_places=2, default=0, max_digits=13)),
+                ('unpaid_months', models.PositiveIntegerField(default=0)),
+                ('oldest_unpaid_due_date', models.DateField(blank=True, null=True)),
+                ('next_due_date', models.DateField(blank=True, db_index=True, null=True)),
+                ('status', models.CharField(choices=[('clear', 'Sin deuda'), ('pending', 'Deuda pendiente'), ('overdue', 'Deuda vencida')], db_index=True, default='clear', max_length=10)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Deuda de cliente',
+                'verbose_name_plural': 'Deudas de clientes',
+            },
+        ),
+        migrations.RunPython(populate_customer_debts, migrations.RunPython.noop),
+    ]
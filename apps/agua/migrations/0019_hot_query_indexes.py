@@ -0,0 +1,53 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:29
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Los índices se crean sin bloquear escrituras en tablas grandes
+    atomic = False
+
+    dependencies = [
+        ('agua', '0018_reportjob'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='expense',
+            index=models.Index(fields=['date_of_issue'], name='expense_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='invoice',
+            index=models.Index(fields=['date_of_issue'], name='invoice_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='invoice',
+            index=models.Index(fields=['customer', 'date_of_issue'], name='invoice_customer_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='invoicepayment',
+            index=models.Index(fields=['cash', 'invoice'], name='invoicepayment_cash_inv_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='reading',
+            index=models.Index(fields=['customer', 'reading_date'], name='reading_customer_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='reading',
+            index=models.Index(fields=['reading_date', 'id'], name='reading_date_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='reading',
+            index=models.Index(fields=['issue_date'], name='reading_issue_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='reading',
+            index=models.Index(condition=models.Q(('is_paid', False)), fields=['customer', 'due_date'], name='reading_unpaid_customer_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='reading',
+            index=models.Index(condition=models.Q(('is_paid', False)), fields=['due_date'], name='reading_unpaid_due_idx'),
+        ),
+    ]
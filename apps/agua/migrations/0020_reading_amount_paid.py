@@ -0,0 +1,36 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:39
+
+from django.db import migrations, models
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_amount_paid(apps, schema_editor):
+    """Total pagado de cada lectura a partir de sus InvoiceReading, en un solo UPDATE."""
+    Reading = apps.get_model('agua', 'Reading')
+    InvoiceReading = apps.get_model('agua', 'InvoiceReading')
+
+    paid = InvoiceReading.objects.filter(reading=OuterRef('pk')).values('reading').annotate(
+        total=Sum('amount_paid')
+    ).values('total')
+
+    # is_paid no se toca: las diferencias las reporta check_paid_amounts
+    Reading.objects.update(amount_paid=Coalesce(
+        Subquery(paid), Value(0), output_field=DecimalField(max_digits=10, decimal_places=2)
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agua', '0019_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reading',
+            name='amount_paid',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.RunPython(populate_amount_paid, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:43
+
+from datetime import datetime, time
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils.timezone import make_aware
+
+
+def populate_ledger(apps, schema_editor):
+    """
+    Fecha de los pagos existentes desde la de su factura (inicio del día
+    local) y libro de caja e ingresos de cada caja desde esos pagos.
+    """
+    Cash = apps.get_model('agua', 'Cash')
+    CashLedger = apps.get_model('agua', 'CashLedger')
+    InvoicePayment = apps.get_model('agua', 'InvoicePayment')
+
+    dates = InvoicePayment.objects.values_list('invoice__date_of_issue', flat=True).distinct().order_by()
+    for issued in dates:
+        InvoicePayment.objects.filter(invoice__date_of_issue=issued).update(
+            created_at=make_aware(datetime.combine(issued, time.min))
+        )
+
+    CashLedger.objects.bulk_create([
+        CashLedger(cash_id=row['cash_id'], payment_method_id=row['payment_method_id'],
+                   total=row['total'], payments=row['count'])
+        for row in InvoicePayment.objects.values('cash_id', 'payment_method_id').annotate(
+            total=Sum('total'), count=Count('id')
+        ).order_by()
+    ])
+
+    income = CashLedger.objects.filter(cash=OuterRef('pk')).values('cash').annotate(total=Sum('total')).values('total')
+    Cash.objects.update(income=Coalesce(
+        Subquery(income), Value(0), output_field=DecimalField(max_digits=13, decimal_places=2)
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agua', '0020_reading_amount_paid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CashLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=13)),
+                ('payments', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Libro de caja',
+                'verbose_name_plural': 'Libros de caja',
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='invoicepayment',
+            name='invoicepayment_cash_inv_idx',
+        ),
+        migrations.AddField(
+            model_name='invoicepayment',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='invoicepayment',
+            index=models.Index(fields=['cash', 'created_at'], name='invoicepayment_cash_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='cashledger',
+            name='cash',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger', to='agua.cash'),
+        ),
+        migrations.AddField(
+            model_name='cashledger',
+            name='payment_method',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='agua.paymentmethod'),
+        ),
+        migrations.AddConstraint(
+            model_name='cashledger',
+            constraint=models.UniqueConstraint(fields=('cash', 'payment_method'), name='unique_cash_ledger_method'),
+        ),
+        migrations.RunPython(populate_ledger, migrations.RunPython.noop),
+    ]
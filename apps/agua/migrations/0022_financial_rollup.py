@@ -0,0 +1,60 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:46
+
+from django.db import migrations, models
+from django.db.models import Count, DateField, Sum
+from django.db.models.functions import TruncMonth
+
+
+def populate_rollup(apps, schema_editor):
+    """Resumen mensual de todos los pagos y egresos; los años cerrados quedan congelados."""
+    Expense = apps.get_model('agua', 'Expense')
+    FinancialRollup = apps.get_model('agua', 'FinancialRollup')
+    InvoicePayment = apps.get_model('agua', 'InvoicePayment')
+    Year = apps.get_model('agua', 'Year')
+
+    closed = set(Year.objects.filter(state=False).values_list('year', flat=True))
+
+    income = InvoicePayment.objects.values(
+        'payment_method_id', period=TruncMonth('created_at', output_field=DateField())
+    ).annotate(total=Sum('total'), count=Count('id')).order_by()
+
+    expenses = Expense.objects.values('category', period=TruncMonth('date_of_issue')).annotate(
+        total=Sum('total'), count=Count('id')
+    ).order_by()
+
+    FinancialRollup.objects.bulk_create([
+        *[FinancialRollup(period=row['period'], kind='income', concept=str(row['payment_method_id']),
+                          total=row['total'], movements=row['count'], frozen=row['period'].year in closed)
+          for row in income],
+        *[FinancialRollup(period=row['period'], kind='expense', concept=row['category'],
+                          total=row['total'], movements=row['count'], frozen=row['period'].year in closed)
+          for row in expenses],
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agua', '0021_cash_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FinancialRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('kind', models.CharField(choices=[('income', 'Ingreso'), ('expense', 'Egreso')], max_length=10)),
+                ('concept', models.CharField(max_length=50)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=13)),
+                ('movements', models.IntegerField(default=0)),
+                ('frozen', models.BooleanField(default=False)),
+            ],
+            options={
+                'verbose_name': 'Resumen financiero mensual',
+                'verbose_name_plural': 'Resúmenes financieros mensuales',
+                'constraints': [models.UniqueConstraint(fields=('period', 'kind', 'concept'), name='unique_financial_rollup')],
+            },
+        ),
+        migrations.RunPython(populate_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,118 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:48
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+# Triggers por sentencia con tablas de transición: una actualización del contador por INSERT/DELETE/UPDATE,
+# sin importar cuántas filas cambie
+COUNTER_TRIGGERS = """
+CREATE FUNCTION agua_count_rows() RETURNS trigger AS $$
+DECLARE
+    delta bigint;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT count(*) INTO delta FROM new_rows;
+    ELSE
+        SELECT -count(*) INTO delta FROM old_rows;
+    END IF;
+
+    IF delta <> 0 THEN
+        UPDATE agua_dashboardcounter SET value = value + delta WHERE name = TG_ARGV[0];
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION agua_sum_invoice_total() RETURNS trigger AS $$
+DECLARE
+    delta numeric := 0;
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT delta + coalesce(sum(total_amount), 0) INTO delta FROM new_rows;
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        SELECT delta - coalesce(sum(total_amount), 0) INTO delta FROM old_rows;
+    END IF;
+
+    IF delta <> 0 THEN
+        UPDATE agua_dashboardcounter SET value = value + delta WHERE name = 'invoice_total';
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER agua_invoice_count_insert AFTER INSERT ON agua_invoice
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION agua_count_rows('invoices');
+CREATE TRIGGER agua_invoice_count_delete AFTER DELETE ON agua_invoice
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION agua_count_rows('invoices');
+
+CREATE TRIGGER agua_invoice_total_insert AFTER INSERT ON agua_invoice
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION agua_sum_invoice_total();
+CREATE TRIGGER agua_invoice_total_update AFTER UPDATE ON agua_invoice
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION agua_sum_invoice_total();
+CREATE TRIGGER agua_invoice_total_delete AFTER DELETE ON agua_invoice
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION agua_sum_invoice_total();
+
+CREATE TRIGGER agua_customer_count_insert AFTER INSERT ON agua_customer
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION agua_count_rows('customers');
+CREATE TRIGGER agua_customer_count_delete AFTER DELETE ON agua_customer
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION agua_count_rows('customers');
+
+CREATE TRIGGER agua_reading_count_insert AFTER INSERT ON agua_reading
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION agua_count_rows('readings');
+CREATE TRIGGER agua_reading_count_delete AFTER DELETE ON agua_reading
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION agua_count_rows('readings');
+"""
+
+DROP_COUNTER_TRIGGERS = """
+DROP TRIGGER agua_invoice_count_insert ON agua_invoice;
+DROP TRIGGER agua_invoice_count_delete ON agua_invoice;
+DROP TRIGGER agua_invoice_total_insert ON agua_invoice;
+DROP TRIGGER agua_invoice_total_update ON agua_invoice;
+DROP TRIGGER agua_invoice_total_delete ON agua_invoice;
+DROP TRIGGER agua_customer_count_insert ON agua_customer;
+DROP TRIGGER agua_customer_count_delete ON agua_customer;
+DROP TRIGGER agua_reading_count_insert ON agua_reading;
+DROP TRIGGER agua_reading_count_delete ON agua_reading;
+DROP FUNCTION agua_count_rows();
+DROP FUNCTION agua_sum_invoice_total();
+"""
+
+
+def populate_counters(apps, schema_editor):
+    """Valores iniciales. Crear los triggers bloqueó las escrituras en las tablas hasta el final de la migración."""
+    Customer = apps.get_model('agua', 'Customer')
+    DashboardCounter = apps.get_model('agua', 'DashboardCounter')
+    Invoice = apps.get_model('agua', 'Invoice')
+    Reading = apps.get_model('agua', 'Reading')
+
+    DashboardCounter.objects.bulk_create([
+        DashboardCounter(name='invoices', value=Invoice.objects.count()),
+        DashboardCounter(name='invoice_total', value=Invoice.objects.aggregate(total=Sum('total_amount'))['total'] or 0),
+        DashboardCounter(name='customers', value=Customer.objects.count()),
+        DashboardCounter(name='readings', value=Reading.objects.count()),
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agua', '0022_financial_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+            ],
+            options={
+                'verbose_name': 'Contador del tablero',
+                'verbose_name_plural': 'Contadores del tablero',
+            },
+        ),
+        migrations.RunSQL(COUNTER_TRIGGERS, DROP_COUNTER_TRIGGERS),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.3 on 2026-10-18 18:18
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def renumber_untyped_duplicates(apps, schema_editor):
+    """Da un correlativo nuevo de la serie "invoice:" a las facturas sin tipo que repiten uno."""
+    Invoice = apps.get_model('agua', 'Invoice')
+    Sequence = apps.get_model('agua', 'Sequence')
+
+    untyped = Invoice.objects.filter(invoice_type__isnull=True, correlative__isnull=False)
+    repeated = untyped.values('correlative').annotate(total=Count('id')).filter(total__gt=1).values('correlative')
+
+    # La primera factura de cada correlativo lo conserva; las demás se renumeran
+    seen = set()
+    invoices = []
+    for invoice in untyped.filter(correlative__in=repeated).order_by('correlative', 'id'):
+        if invoice.correlative in seen:
+            invoices.append(invoice)
+        seen.add(invoice.correlative)
+
+    if not invoices:
+        return
+
+    sequence, _ = Sequence.objects.select_for_update().get_or_create(name='invoice:')
+    for number, invoice in enumerate(invoices, start=sequence.last_value + 1):
+        invoice.correlative = f"{number:06d}"
+    sequence.last_value += len(invoices)
+    sequence.save(update_fields=['last_value'])
+
+    Invoice.objects.bulk_update(invoices, ['correlative'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agua', '0024_reportjob_claim_token'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='invoice',
+            name='unique_invoice_correlative_per_type',
+        ),
+        migrations.RunPython(renumber_untyped_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.UniqueConstraint(condition=models.Q(('correlative__isnull', False)), fields=('invoice_type', 'correlative'), name='unique_invoice_correlative_per_type', nulls_distinct=False),
+        ),
+    ]
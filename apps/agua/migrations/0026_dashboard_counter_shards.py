@@ -0,0 +1,131 @@
+# Generated by Django 5.1.3 on 2026-10-18 18:24
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+# Filas por contador; counters.SHARDS debe coincidir
+SHARDS = 16
+
+# Como en 0023, pero cada sesión suma en su propia fila (pg_backend_pid() % SHARDS): las transacciones
+# concurrentes que insertan facturas o lecturas ya no esperan todas el bloqueo de una única fila
+SHARDED_FUNCTIONS = f"""
+CREATE OR REPLACE FUNCTION agua_count_rows() RETURNS trigger AS $$
+DECLARE
+    delta bigint;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT count(*) INTO delta FROM new_rows;
+    ELSE
+        SELECT -count(*) INTO delta FROM old_rows;
+    END IF;
+
+    IF delta <> 0 THEN
+        UPDATE agua_dashboardcounter SET value = value + delta
+        WHERE name = TG_ARGV[0] AND shard = pg_backend_pid() % {SHARDS};
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION agua_sum_invoice_total() RETURNS trigger AS $$
+DECLARE
+    delta numeric := 0;
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT delta + coalesce(sum(total_amount), 0) INTO delta FROM new_rows;
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        SELECT delta - coalesce(sum(total_amount), 0) INTO delta FROM old_rows;
+    END IF;
+
+    IF delta <> 0 THEN
+        UPDATE agua_dashboardcounter SET value = value + delta
+        WHERE name = 'invoice_total' AND shard = pg_backend_pid() % {SHARDS};
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+SINGLE_ROW_FUNCTIONS = """
+CREATE OR REPLACE FUNCTION agua_count_rows() RETURNS trigger AS $$
+DECLARE
+    delta bigint;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT count(*) INTO delta FROM new_rows;
+    ELSE
+        SELECT -count(*) INTO delta FROM old_rows;
+    END IF;
+
+    IF delta <> 0 THEN
+        UPDATE agua_dashboardcounter SET value = value + delta WHERE name = TG_ARGV[0];
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION agua_sum_invoice_total() RETURNS trigger AS $$
+DECLARE
+    delta numeric := 0;
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT delta + coalesce(sum(total_amount), 0) INTO delta FROM new_rows;
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        SELECT delta - coalesce(sum(total_amount), 0) INTO delta FROM old_rows;
+    END IF;
+
+    IF delta <> 0 THEN
+        UPDATE agua_dashboardcounter SET value = value + delta WHERE name = 'invoice_total';
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+
+def add_shards(apps, schema_editor):
+    """El valor actual queda en la fila 0; las demás empiezan en cero."""
+    DashboardCounter = apps.get_model('agua', 'DashboardCounter')
+
+    DashboardCounter.objects.bulk_create([
+        DashboardCounter(name=name, shard=shard, value=0)
+        for name in DashboardCounter.objects.values_list('name', flat=True)
+        for shard in range(1, SHARDS)
+    ])
+
+
+def merge_shards(apps, schema_editor):
+    DashboardCounter = apps.get_model('agua', 'DashboardCounter')
+
+    totals = DashboardCounter.objects.values('name').annotate(total=Sum('value')).order_by()
+    for row in totals:
+        DashboardCounter.objects.filter(name=row['name'], shard=0).update(value=row['total'])
+    DashboardCounter.objects.exclude(shard=0).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agua', '0025_invoice_correlative_nulls_not_distinct'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dashboardcounter',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='dashboardcounter',
+            name='name',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AddConstraint(
+            model_name='dashboardcounter',
+            constraint=models.UniqueConstraint(fields=('name', 'shard'), name='unique_dashboard_counter_shard'),
+        ),
+        migrations.RunPython(add_shards, merge_shards),
+        migrations.RunSQL(SHARDED_FUNCTIONS, SINGLE_ROW_FUNCTIONS),
+    ]
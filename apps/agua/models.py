@@ -1,9 +1,13 @@
-from django.db import models
+from django.db import models, connection, transaction
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
 from apps.base.models import BaseModel
 from django.core.exceptions import ValidationError
+from collections import defaultdict
 from decimal import Decimal
-from datetime import timedelta, date
+from datetime import timedelta, date, datetime, time
 from dateutil.relativedelta import relativedelta
+from . import tariffs
 
 class Company(models.Model):
 
@@ -17,6 +21,57 @@ class Company(models.Model):
     def __str__(self):
         return self.name
 
+class Sequence(models.Model):
+
+    """
+    Contador de correlativos por serie (lecturas, facturas por tipo, calles).
+    Cada reserva es un único UPSERT atómico: no recorre la tabla de origen y
+    dos cajeros concurrentes nunca reciben el mismo número.
+    """
+
+    READING = 'reading'
+    CALLE = 'calle'
+
+    name = models.CharField(max_length=50, unique=True)
+    last_value = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Secuencia"
+        verbose_name_plural = "Secuencias"
+
+    def __str__(self):
+        return f"{self.name}: {self.last_value}"
+
+    @staticmethod
+    def invoice_series(invoice_type):
+        """Serie de correlativos de facturas para un tipo de comprobante."""
+        return f"invoice:{invoice_type or ''}"
+
+    @classmethod
+    def reserve(cls, name, count=1):
+        """Reserva un bloque de `count` números consecutivos de la serie y devuelve su rango."""
+        table = connection.ops.quote_name(cls._meta.db_table)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (name, last_value) VALUES (%s, %s) "
+                f"ON CONFLICT (name) DO UPDATE SET last_value = {table}.last_value + EXCLUDED.last_value "
+                "RETURNING last_value",
+                [name, count]
+            )
+            last_value = cursor.fetchone()[0]
+
+        return range(last_value - count + 1, last_value + 1)
+
+    @classmethod
+    def correlatives(cls, name, count, width):
+        """Reserva `count` correlativos con el formato rellenado con ceros (000001, 000002...)."""
+        return [f"{number:0{width}d}" for number in cls.reserve(name, count)]
+
+    @classmethod
+    def next_correlative(cls, name, width):
+        return cls.correlatives(name, 1, width)[0]
+
 class PaymentMethod(models.Model):
 
     state = models.BooleanField(default=True)
@@ -68,11 +123,7 @@ class Calle(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.codigo:
-            last_calle = Calle.objects.order_by('-codigo').first()
-            if last_calle and last_calle.codigo.isdigit():
-                self.codigo = f"{int(last_calle.codigo) + 1:04d}"
-            else:
-                self.codigo = "0001"
+            self.codigo = Sequence.next_correlative(Sequence.CALLE, 4)  # Formato 0001, 0002...
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -172,6 +223,68 @@ class Customer(models.Model):
         verbose_name = "Cliente"
         verbose_name_plural = "Clientes"
 
+class CustomerDebt(models.Model):
+
+    """
+    Resumen de deuda por cliente. Lo mantiene debts.refresh_customer_debts cada
+    vez que cambian sus lecturas o pagos, y `manage.py debt_rollover` recalcula
+    cada noche las filas cuyo próximo vencimiento ya pasó.
+    """
+
+    CLEAR = 'clear'
+    PENDING = 'pending'
+    OVERDUE = 'overdue'
+
+    STATUS = [
+        (CLEAR, 'Sin deuda'),
+        (PENDING, 'Deuda pendiente'),
+        (OVERDUE, 'Deuda vencida'),
+    ]
+
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='debt')
+    paid_total = models.DecimalField(max_digits=13, decimal_places=2, default=0)
+    pending_total = models.DecimalField(max_digits=13, decimal_places=2, default=0)
+    overdue_total = models.DecimalField(max_digits=13, decimal_places=2, default=0)
+    unpaid_months = models.PositiveIntegerField(default=0)
+    oldest_unpaid_due_date = models.DateField(null=True, blank=True)
+    next_due_date = models.DateField(null=True, blank=True, db_index=True)  # Próximo vencimiento aún no alcanzado
+    status = models.CharField(max_length=10, choices=STATUS, default=CLEAR, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Deuda de cliente"
+        verbose_name_plural = "Deudas de clientes"
+
+    def __str__(self):
+        return f"{self.customer_id} - {self.status}"
+
+    def current_status(self, today):
+        """Estado a la fecha `today`, aunque la fila aún no haya pasado por el rollover."""
+        if self.oldest_unpaid_due_date and self.oldest_unpaid_due_date < today:
+            return self.OVERDUE
+        if self.unpaid_months:
+            return self.PENDING
+        return self.CLEAR
+
+    @classmethod
+    def status_filter(cls, status, today, prefix=''):
+        """
+        Q con el mismo criterio que current_status para filtrar por estado a la
+        fecha `today` (`prefix` es la ruta desde el modelo filtrado, p. ej. 'debt__').
+        Un cliente sin resumen no tiene lecturas: está al día.
+        """
+        overdue = models.Q(**{f'{prefix}oldest_unpaid_due_date__lt': today})
+
+        if status == cls.OVERDUE:
+            return overdue
+        if status == cls.PENDING:
+            return models.Q(**{f'{prefix}unpaid_months__gt': 0}) & ~overdue
+
+        clear = models.Q(**{f'{prefix}unpaid_months': 0})
+        if prefix:
+            clear |= models.Q(**{f'{prefix.removesuffix("__")}__isnull': True})
+        return clear
+
 class Reading(models.Model):
 
     correlative = models.CharField(max_length=10, unique=True, blank=True, null=True)
@@ -191,42 +304,75 @@ class Reading(models.Model):
 
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)  # Se calcula al guardar
 
-    is_paid = models.BooleanField(default=False)
+    # Total de los pagos (InvoiceReading) de la lectura; solo cambia con apply_payments
+    amount_paid = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    is_paid = models.BooleanField(default=False)  # amount_paid >= total_amount
+
+    class Meta:
+        indexes = [
+            # Historial del cliente: lectura anterior, último mes, recibos
+            models.Index(fields=['customer', 'reading_date'], name='reading_customer_date_idx'),
+            # Filtro por año (__year compila a BETWEEN) y orden del listado/keyset
+            models.Index(fields=['reading_date', 'id'], name='reading_date_id_idx'),
+            # Recibos del mes por calle (rango de fechas de emisión)
+            models.Index(fields=['issue_date'], name='reading_issue_date_idx'),
+            # Solo lecturas impagas: deuda por cliente y vencidas/pendientes
+            models.Index(fields=['customer', 'due_date'], condition=models.Q(is_paid=False), name='reading_unpaid_customer_idx'),
+            models.Index(fields=['due_date'], condition=models.Q(is_paid=False), name='reading_unpaid_due_idx'),
+        ]
 
     def calculate_total(self):
         if self.consumption is None:
             self.consumption = max(0, (self.current_reading or 0) - (self.previous_reading or 0))
 
-        tariff = self.customer.tariff
+        # Precios desde la tabla compilada (tariffs.py), sin cargar tarifa, categoría ni servicio
+        charges = tariffs.price(self.customer.tariff_id, self.consumption)
 
-        if tariff.category.name == 'INDUSTRIAL':
-            self.total_water = self._calculate_industrial_tariff(tariff)
-        else:
-            self.total_water = self.consumption * tariff.price_water
-        
-        self.total_sewer = tariff.price_sewer
-        self.fixed_charge = tariff.service.price
-        self.total_amount = self.total_water + self.total_sewer + self.fixed_charge 
+        self.total_water = charges.total_water
+        self.total_sewer = charges.total_sewer
+        self.fixed_charge = charges.fixed_charge
+        self.total_amount = charges.total_amount
        
         return self.total_amount
 
-    def _calculate_industrial_tariff(self, tariff):
-        """Calcula la tarifa para categoría INDUSTRIAL"""
-        consumo_base = min(self.consumption, tariff.max_consumption)
-        exceso = max(0, self.consumption - tariff.max_consumption)
-
-        return (consumo_base * tariff.price_water) + (exceso * tariff.extra_rate)
+    @classmethod
+    def apply_payments(cls, amounts):
+        """
+        Suma pagos a las lecturas ({reading_id: importe}; negativo para revertirlos)
+        en un solo UPDATE con expresiones F, sin leerlas antes. is_paid se
+        recalcula en el mismo UPDATE a partir del nuevo total pagado.
+        """
+        amounts = {pk: amount for pk, amount in amounts.items() if amount}
+
+        if not amounts:
+            return 0
+
+        delta = models.Case(
+            *[models.When(pk=pk, then=models.Value(amount)) for pk, amount in amounts.items()],
+            default=models.Value(0),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        )
+        paid = models.F('amount_paid') + delta
+
+        return cls.objects.filter(pk__in=list(amounts)).update(
+            amount_paid=paid,
+            is_paid=models.Case(
+                models.When(total_amount__lte=paid, then=models.Value(True)),
+                default=models.Value(False),
+            ),
+        )
+
+    @staticmethod
+    def billing_dates(reading_date):
+        """Devuelve (fecha de vencimiento, fecha de corte) para una fecha de lectura, igual que save()."""
+        due_date = reading_date + relativedelta(months=1)
+        return due_date, due_date + timedelta(days=2)
 
     def save(self, *args, **kwargs):
 
         if not self.correlative:
 
-           last_reading = Reading.objects.order_by('-id').first()
-           
-           if last_reading and last_reading.correlative:
-                self.correlative = f"{int(last_reading.correlative) + 1:06d}"  # Formato 000001, 000002...
-           else:
-                self.correlative = "000001"  # Primer registro
+           self.correlative = Sequence.next_correlative(Sequence.READING, 6)  # Formato 000001, 000002...
 
         # Calcular consumo a partir de la lectura anterior
         previous = Reading.objects.filter(
@@ -243,6 +389,14 @@ class Reading(models.Model):
 
         # Calcular el total_amount antes de guardar
         self.calculate_total()
+
+        if self.pk:
+            # Pagos registrados mientras tanto (apply_payments): no se pisan con el valor de esta instancia
+            current = Reading.objects.filter(pk=self.pk).values_list('amount_paid', flat=True).first()
+            if current is not None:
+                self.amount_paid = current
+
+        self.is_paid = self.amount_paid >= self.total_amount
   
         if not self.issue_date:
             
@@ -264,20 +418,31 @@ class Reading(models.Model):
 
 class Invoice(models.Model):
     
-    correlative = models.CharField(max_length=10, unique=True, blank=True, null=True)
+    correlative = models.CharField(max_length=10, blank=True, null=True)
     invoice_type = models.CharField(max_length=20, blank=True, null=True)
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     date_of_issue = models.DateField(auto_now=True)
 
-    def delete(self, *args, **kwargs):
-        """Actualizar is_paid de los readings si se elimina una factura de tipo recibo."""
-        if self.invoice_type == 'receipt':
-            for payment in self.readings.all():  # Accedemos con related_name
-                reading = payment.reading
-                reading.is_paid = False
-                reading.save()
-        super().delete(*args, **kwargs)
+    class Meta:
+        # Cada tipo de comprobante tiene su propia serie de correlativos. Las facturas sin tipo también
+        # comparten una (NULL cuenta como un valor más); las que aún no tienen correlativo no se comparan
+        constraints = [
+            models.UniqueConstraint(
+                fields=['invoice_type', 'correlative'],
+                name='unique_invoice_correlative_per_type',
+                nulls_distinct=False,
+                condition=models.Q(correlative__isnull=False),
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['date_of_issue'], name='invoice_date_idx'),
+            # Estado de cuenta del cliente por rango de fechas
+            models.Index(fields=['customer', 'date_of_issue'], name='invoice_customer_date_idx'),
+        ]
+
+    # Al eliminarla (también en cascada o con QuerySet.delete) los pagos de sus lecturas se revierten en
+    # signals.reverse_invoice_readings y los de su caja en signals.reverse_payment_totals
 
     def __str__(self):
         return f"Invoice {self.id} - {self.customer.full_name} - Total: {self.total_amount}"
@@ -288,14 +453,20 @@ class InvoiceReading(models.Model):
     amount_paid = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Amount Paid")
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.update_reading_status()
+        """Guarda el pago y actualiza el total pagado de la lectura (y de la anterior, si cambió)."""
+        with transaction.atomic():
 
-    def update_reading_status(self):
-        """Actualizar el estado del reading dependiendo de los pagos."""
-        total_paid = sum(payment.amount_paid for payment in self.reading.invoices.all())
-        self.reading.is_paid = total_paid >= self.reading.total_amount
-        self.reading.save()
+            amounts = {self.reading_id: self.amount_paid}
+
+            if self.pk:
+                previous = InvoiceReading.objects.filter(pk=self.pk).values_list('reading_id', 'amount_paid').first()
+                if previous:
+                    amounts[previous[0]] = amounts.get(previous[0], 0) - previous[1]
+
+            super().save(*args, **kwargs)
+            Reading.apply_payments(amounts)
+
+    # Al eliminarlo se resta de la lectura en signals.reverse_invoice_reading
 
     def __str__(self):
         return f"InvoiceReading {self.id} - Invoice {self.invoice.id} - Reading {self.reading.id}"
@@ -316,10 +487,140 @@ class InvoicePayment(models.Model):
     invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='payments')  # Cambio aquí
     cash = models.ForeignKey(Cash, on_delete=models.PROTECT)  # Relación con caja de pago
     total = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(default=timezone.now)  # Momento en que se registró el pago
+
+    class Meta:
+        indexes = [
+            # Reportes de caja: pagos de una caja en un rango de fechas
+            models.Index(fields=['cash', 'created_at'], name='invoicepayment_cash_date_idx'),
+        ]
+
+    @staticmethod
+    def post_totals(entries):
+        """
+        Suma pagos al libro de caja y al resumen mensual: `entries` es un
+        iterable de (caja, método, fecha de registro, importe, cantidad), con
+        importe y cantidad negativos para revertirlos.
+        """
+        entries = list(entries)
+        CashLedger.post((cash_id, method_id, amount, count) for cash_id, method_id, _, amount, count in entries)
+        FinancialRollup.post(
+            (created_at, FinancialRollup.INCOME, method_id, amount, count)
+            for _, method_id, created_at, amount, count in entries
+        )
+
+    def save(self, *args, **kwargs):
+        """Guarda el pago y suma sus totales (revirtiendo los valores anteriores si cambió)."""
+        with transaction.atomic():
+
+            entries = [(self.cash_id, self.payment_method_id, self.created_at, self.total, 1)]
+
+            if self.pk:
+                previous = InvoicePayment.objects.filter(pk=self.pk).values_list(
+                    'cash_id', 'payment_method_id', 'created_at', 'total'
+                ).first()
+                if previous:
+                    entries.append((*previous[:3], -previous[3], -1))
+
+            super().save(*args, **kwargs)
+            InvoicePayment.post_totals(entries)
+
+    # Al eliminarlo (también en cascada o con QuerySet.delete) sus totales se revierten en
+    # signals.reverse_payment_totals
 
     def __str__(self):
         return f"InvoicePayment {self.id} - Invoice {self.invoice.id} - Amount {self.total}"
 
+class CashLedger(models.Model):
+
+    """
+    Total cobrado por cada caja y método de pago, acumulado a medida que se
+    registran o eliminan pagos (CashLedger.post). El total de la caja se
+    acumula igual en Cash.income, así cerrarla no recorre sus pagos.
+    """
+
+    cash = models.ForeignKey(Cash, on_delete=models.CASCADE, related_name='ledger')
+    payment_method = models.ForeignKey(PaymentMethod, on_delete=models.CASCADE)
+    total = models.DecimalField(max_digits=13, decimal_places=2, default=0)
+    payments = models.IntegerField(default=0)  # Cantidad de pagos
+
+    class Meta:
+        verbose_name = "Libro de caja"
+        verbose_name_plural = "Libros de caja"
+        constraints = [
+            models.UniqueConstraint(fields=['cash', 'payment_method'], name='unique_cash_ledger_method'),
+        ]
+
+    def __str__(self):
+        return f"Caja {self.cash_id} - {self.payment_method_id}: {self.total}"
+
+    @classmethod
+    def post(cls, entries):
+        """
+        Suma pagos al libro: `entries` es un iterable de (caja, método, importe,
+        cantidad), con importe y cantidad negativos para revertirlos. Un UPSERT
+        para las filas del libro y un UPDATE con expresiones F para Cash.income.
+        """
+        totals = defaultdict(lambda: [Decimal(0), 0])
+        for cash_id, payment_method_id, amount, count in entries:
+            totals[cash_id, payment_method_id][0] += amount
+            totals[cash_id, payment_method_id][1] += count
+
+        # Orden fijo: dos transacciones que tocan las mismas filas no se bloquean entre sí
+        totals = sorted((key, value) for key, value in totals.items() if any(value))
+
+        if not totals:
+            return
+
+        table = connection.ops.quote_name(cls._meta.db_table)
+        rows = ', '.join(['(%s, %s, %s, %s)'] * len(totals))
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (cash_id, payment_method_id, total, payments) VALUES {rows} "
+                "ON CONFLICT (cash_id, payment_method_id) DO UPDATE SET "
+                f"total = {table}.total + EXCLUDED.total, payments = {table}.payments + EXCLUDED.payments",
+                [value for (cash_id, method_id), (amount, count) in totals for value in (cash_id, method_id, amount, count)]
+            )
+
+        income = defaultdict(Decimal)
+        for (cash_id, _), (amount, _) in totals:
+            income[cash_id] += amount
+        income = {cash_id: amount for cash_id, amount in income.items() if amount}
+
+        if income:
+            delta = models.Case(
+                *[models.When(pk=pk, then=models.Value(amount)) for pk, amount in income.items()],
+                default=models.Value(0),
+                output_field=models.DecimalField(max_digits=13, decimal_places=2),
+            )
+            Cash.objects.filter(pk__in=list(income)).update(income=Coalesce(
+                'income', models.Value(0), output_field=models.DecimalField(max_digits=13, decimal_places=2)
+            ) + delta)
+
+    @classmethod
+    def rebuild(cls, cash_ids=None):
+        """Recalcula desde los pagos el libro y Cash.income de las cajas (todas si `cash_ids` es None)."""
+        cashes = Cash.objects.all() if cash_ids is None else Cash.objects.filter(pk__in=cash_ids)
+        payments = InvoicePayment.objects.filter(cash__in=cashes)
+
+        with transaction.atomic():
+            cls.objects.filter(cash__in=cashes).delete()
+            cls.objects.bulk_create([
+                cls(cash_id=row['cash_id'], payment_method_id=row['payment_method_id'],
+                    total=row['total'], payments=row['count'])
+                for row in payments.values('cash_id', 'payment_method_id').annotate(
+                    total=models.Sum('total'), count=models.Count('id')
+                ).order_by()
+            ])
+
+            income = cls.objects.filter(cash=models.OuterRef('pk')).values('cash').annotate(
+                total=models.Sum('total')
+            ).values('total')
+            return cashes.update(income=Coalesce(
+                models.Subquery(income), models.Value(0), output_field=models.DecimalField(max_digits=13, decimal_places=2)
+            ))
+
 class Expense(models.Model):
 
     CATEGORY_CHOICES = [
@@ -335,5 +636,238 @@ class Expense(models.Model):
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES)
     description = models.TextField(null=True,blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_of_issue'], name='expense_date_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Guarda el egreso y lo suma al resumen mensual (revirtiendo los valores anteriores si cambió)."""
+        with transaction.atomic():
+
+            entries = [(self.date_of_issue, FinancialRollup.EXPENSE, self.category, self.total, 1)]
+
+            if self.pk:
+                previous = Expense.objects.filter(pk=self.pk).values_list('date_of_issue', 'category', 'total').first()
+                if previous:
+                    entries.append((previous[0], FinancialRollup.EXPENSE, previous[1], -previous[2], -1))
+
+            super().save(*args, **kwargs)
+            FinancialRollup.post(entries)
+
+    # Al eliminarlo (también con QuerySet.delete) se resta del resumen en signals.reverse_expense_totals
+
     def __str__(self):
         return f"{self.total} - {self.date_of_issue}"
+
+class FinancialRollup(models.Model):
+
+    """
+    Totales mensuales del resumen financiero: ingresos por método de pago
+    (concept es el id del método, por la fecha de registro del pago) y
+    egresos por categoría (concept es Expense.category). Se acumulan al
+    registrar pagos y egresos (FinancialRollup.post) y se reconstruyen con
+    `manage.py rebuild_financial_rollup`. Las filas de un año cerrado
+    (Year.state False) quedan congeladas: no cambian ni se recalculan.
+    """
+
+    INCOME = 'income'
+    EXPENSE = 'expense'
+
+    KIND_CHOICES = [
+        (INCOME, 'Ingreso'),
+        (EXPENSE, 'Egreso'),
+    ]
+
+    period = models.DateField()  # Primer día del mes
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    concept = models.CharField(max_length=50)
+    total = models.DecimalField(max_digits=13, decimal_places=2, default=0)
+    movements = models.IntegerField(default=0)  # Cantidad de pagos o egresos
+    frozen = models.BooleanField(default=False)
+
+    class Meta:
+        verbose_name = "Resumen financiero mensual"
+        verbose_name_plural = "Resúmenes financieros mensuales"
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'kind', 'concept'], name='unique_financial_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.period:%Y-%m} {self.kind} {self.concept}: {self.total}"
+
+    @staticmethod
+    def month(value):
+        """Primer día del mes de una fecha o de un momento (en la zona horaria local)."""
+        if isinstance(value, datetime):
+            value = timezone.localtime(value).date()
+        return value.replace(day=1)
+
+    @classmethod
+    def post(cls, entries):
+        """
+        Suma movimientos al resumen: `entries` es un iterable de (fecha, tipo,
+        concepto, importe, cantidad), con importe y cantidad negativos para
+        revertirlos. Un solo UPSERT que no toca las filas congeladas ni crea
+        filas en los años cerrados.
+        """
+        totals = defaultdict(lambda: [Decimal(0), 0])
+        for day, kind, concept, amount, count in entries:
+            totals[cls.month(day), kind, str(concept)][0] += amount
+            totals[cls.month(day), kind, str(concept)][1] += count
+
+        # Orden fijo: dos transacciones que tocan las mismas filas no se bloquean entre sí
+        totals = sorted((key, value) for key, value in totals.items() if any(value))
+
+        if not totals:
+            return
+
+        table = connection.ops.quote_name(cls._meta.db_table)
+        years = connection.ops.quote_name(Year._meta.db_table)
+        rows = ', '.join(['(%s::date, %s, %s, %s::numeric, %s::integer)'] * len(totals))
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (period, kind, concept, total, movements, frozen) "
+                f"SELECT period, kind, concept, total, movements, false FROM (VALUES {rows}) "
+                "AS entry (period, kind, concept, total, movements) "
+                f"WHERE NOT EXISTS (SELECT 1 FROM {years} WHERE year = EXTRACT(YEAR FROM period) AND NOT state) "
+                "ON CONFLICT (period, kind, concept) DO UPDATE SET "
+                f"total = {table}.total + EXCLUDED.total, movements = {table}.movements + EXCLUDED.movements "
+                f"WHERE NOT {table}.frozen",
+                [value for key, (amount, count) in totals for value in (*key, amount, count)]
+            )
+
+    @classmethod
+    def rebuild(cls, years=None):
+        """
+        Recalcula desde los pagos y egresos los meses de `years` (todos los años
+        con movimientos si es None) y devuelve los años recalculados. Los años
+        congelados se omiten; un año cerrado sin filas se calcula una vez y
+        queda congelado.
+        """
+        if years is None:
+            years = {moment.year for moment in InvoicePayment.objects.datetimes('created_at', 'year')}
+            years |= {day.year for day in Expense.objects.dates('date_of_issue', 'year')}
+
+        frozen = {day.year for day in cls.objects.filter(frozen=True).dates('period', 'year')}
+        closed = set(Year.objects.filter(state=False).values_list('year', flat=True))
+        years = sorted(set(years) - frozen)
+
+        with transaction.atomic():
+            for year in years:
+
+                start = timezone.make_aware(datetime.combine(date(year, 1, 1), time.min))
+                end = timezone.make_aware(datetime.combine(date(year + 1, 1, 1), time.min))
+
+                income = InvoicePayment.objects.filter(created_at__gte=start, created_at__lt=end).values(
+                    'payment_method_id', period=TruncMonth('created_at', output_field=models.DateField())
+                ).annotate(total=models.Sum('total'), count=models.Count('id')).order_by()
+
+                expenses = Expense.objects.filter(date_of_issue__year=year).values(
+                    'category', period=TruncMonth('date_of_issue')
+                ).annotate(total=models.Sum('total'), count=models.Count('id')).order_by()
+
+                cls.objects.filter(period__year=year).delete()
+                cls.objects.bulk_create([
+                    *[cls(period=row['period'], kind=cls.INCOME, concept=str(row['payment_method_id']),
+                          total=row['total'], movements=row['count'], frozen=year in closed) for row in income],
+                    *[cls(period=row['period'], kind=cls.EXPENSE, concept=row['category'],
+                          total=row['total'], movements=row['count'], frozen=year in closed) for row in expenses],
+                ])
+
+        return years
+
+class DashboardCounter(models.Model):
+
+    """
+    Parte de un contador del tablero (filas o total de una tabla), mantenido
+    por triggers (ver counters.py). Cada contador se reparte en
+    counters.SHARDS filas; su valor es la suma de todas.
+    """
+
+    name = models.CharField(max_length=50)
+    shard = models.PositiveSmallIntegerField(default=0)
+    value = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Contador del tablero"
+        verbose_name_plural = "Contadores del tablero"
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'shard'], name='unique_dashboard_counter_shard'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.shard}: {self.value}"
+
+class BillingCheckpoint(models.Model):
+
+    """Calle ya facturada en una corrida de `manage.py billing_run`; permite reanudarla."""
+
+    period = models.DateField()  # Primer día del mes facturado
+    calle = models.ForeignKey(Calle, on_delete=models.CASCADE, related_name='billing_checkpoints')
+    readings_created = models.PositiveIntegerField(default=0)
+    readings_updated = models.PositiveIntegerField(default=0)
+    readings_missing = models.PositiveIntegerField(default=0)
+    completed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Punto de control de facturación"
+        verbose_name_plural = "Puntos de control de facturación"
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'calle'], name='unique_billing_checkpoint'),
+        ]
+
+    def __str__(self):
+        return f"{self.period:%Y-%m} - {self.calle_id}"
+
+class ReportJob(models.Model):
+
+    """Reporte pesado generado en segundo plano por `manage.py run_report_workers`."""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (QUEUED, 'En cola'),
+        (RUNNING, 'En proceso'),
+        (DONE, 'Terminado'),
+        (FAILED, 'Fallido'),
+    ]
+
+    ACTIVE = (QUEUED, RUNNING)
+
+    kind = models.CharField(max_length=30)
+    params = models.JSONField(default=dict)
+    params_hash = models.CharField(max_length=64)  # Identifica pedidos repetidos
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    progress = models.PositiveSmallIntegerField(default=0)  # 0 - 100
+    error = models.TextField(null=True, blank=True)
+    file_path = models.CharField(max_length=255, null=True, blank=True)
+    filename = models.CharField(max_length=255, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)  # Latido del proceso que lo ejecuta
+    claim_token = models.UUIDField(null=True, blank=True, editable=False)  # Toma vigente (ver jobs.claim)
+
+    class Meta:
+        verbose_name = "Trabajo de reporte"
+        verbose_name_plural = "Trabajos de reporte"
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['status', 'id'], name='reportjob_status_idx'),
+        ]
+        constraints = [
+            # Un solo trabajo activo por reporte y parámetros
+            models.UniqueConstraint(
+                fields=['kind', 'params_hash'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='unique_active_report_job',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.id} ({self.status})"
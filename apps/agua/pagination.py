@@ -0,0 +1,235 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import F, Field, Func, Q, Value
+from django.db.models.lookups import GreaterThan, LessThan
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def estimate_count(queryset):
+    """
+    Número aproximado de filas según el planificador de PostgreSQL (EXPLAIN),
+    sin ejecutar un COUNT(*) sobre toda la tabla.
+    """
+    sql, params = queryset.query.sql_with_params()
+
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+
+    @cached_property
+    def count(self):
+        return estimate_count(self.object_list)
+
+
+class CustomPagination(PageNumberPagination):
+
+    page_size = 5  # Número de registros por página
+    page_size_query_param = 'page_size'  # Permite cambiar el tamaño desde la URL
+    max_page_size = 100  # Tamaño máximo permitido
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # ?count=estimate: total aproximado en lugar de COUNT(*)
+        if request.query_params.get('count') == 'estimate':
+            self.django_paginator_class = EstimatedCountPaginator
+        return super().paginate_queryset(queryset, request, view)
+
+
+class KeysetPagination(BasePagination):
+
+    """
+    Paginación por keyset (cursor), opcional: se activa enviando ?cursor=
+    (vacío para la primera página). Sin ese parámetro se usa `fallback_class`,
+    o no se pagina si no hay ninguna.
+
+    Usa el orden de la vista (`keyset_ordering`); el último campo debe ser
+    único (p. ej. 'id') y ninguno puede ser nulo. Cada página es un
+    WHERE (campos) > (última fila) ... LIMIT n, así que su costo no depende
+    de la posición. Los cursores son opacos.
+
+    ?count=exact o ?count=estimate agrega el total a la respuesta.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size = 5
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    fallback_class = None
+
+    invalid_cursor_message = "Cursor inválido."
+
+    def paginate_queryset(self, queryset, request, view=None):
+
+        self.request = request
+        self.fallback = None
+
+        if self.cursor_query_param not in request.query_params:
+            if self.fallback_class is None:
+                return None
+            self.fallback = self.fallback_class()
+            return self.fallback.paginate_queryset(queryset, request, view)
+
+        self.ordering = tuple(getattr(view, 'keyset_ordering', ('-id',)))
+        self.page_size = self.get_page_size(request)
+        self.count = self.get_count(queryset, request)
+
+        values, reverse = self.decode_cursor(request, queryset.model)
+        ordering = self._reverse(self.ordering) if reverse else self.ordering
+
+        queryset = queryset.order_by(*ordering)
+
+        if values is not None:
+            queryset = queryset.filter(self._after(queryset.model, ordering, values))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = values is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = values is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+
+        payload = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+        }
+
+        if self.count is not None:
+            payload['count'] = self.count
+            payload['count_estimated'] = self.request.query_params.get('count') == 'estimate'
+
+        payload['results'] = data
+        return Response(payload)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_count(self, queryset, request):
+        count = request.query_params.get('count')
+        if count == 'exact':
+            return queryset.count()
+        if count == 'estimate':
+            return estimate_count(queryset)
+        return None
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self._values(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self._values(self.page[0]), reverse=True)
+
+    def encode_cursor(self, values, reverse):
+        token = urlsafe_b64encode(json.dumps({'v': values, 'r': reverse}).encode()).decode()
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request, model):
+        token = request.query_params.get(self.cursor_query_param)
+
+        if not token:
+            return None, False  # Primera página
+
+        try:
+            cursor = json.loads(urlsafe_b64decode(token.encode()))
+            values, reverse = cursor['v'], bool(cursor['r'])
+
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+
+            # Cada valor se convierte con su campo: un cursor alterado responde 404, no un 500 en el WHERE
+            values = [self._to_python(model, field, value) for field, value in zip(self.ordering, values)]
+        except (BinasciiError, ValueError, TypeError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return values, reverse
+
+    @staticmethod
+    def _to_python(model, field, value):
+        if value is None:
+            raise ValueError  # Los campos del orden no pueden ser nulos
+        return model._meta.get_field(field.lstrip('-')).to_python(value)
+
+    def _values(self, instance):
+        values = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip('-'))
+            values.append(value if isinstance(value, (int, float, type(None))) else str(value))
+        return values
+
+    @staticmethod
+    def _reverse(ordering):
+        return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+
+    @staticmethod
+    def _after(model, ordering, values):
+        """
+        (a, b, c) > (x, y, z) respetando la dirección de cada campo. Si todos
+        van en la misma dirección es una comparación de filas, ROW(a, b) > ROW(x, y),
+        que PostgreSQL resuelve como un Index Cond sobre el índice (a, b): la página
+        empieza en el cursor en lugar de recorrer y descartar las filas anteriores.
+        """
+        names = [field.lstrip('-') for field in ordering]
+        descending = {field.startswith('-') for field in ordering}
+
+        if len(ordering) > 1 and len(descending) == 1:
+            row = Func(*[F(name) for name in names], function='ROW', output_field=Field())
+            cursor = Func(
+                *[Value(value, output_field=model._meta.get_field(name)) for name, value in zip(names, values)],
+                function='ROW',
+                output_field=Field(),
+            )
+            return (LessThan if descending == {True} else GreaterThan)(row, cursor)
+
+        # Direcciones mezcladas (o un solo campo): (a > x) OR (a = x AND b > y) ...
+        condition = Q()
+        equal = Q()
+
+        for field, name, value in zip(ordering, names, values):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+
+        return condition
+
+
+class PageOrKeysetPagination(KeysetPagination):
+
+    """Paginación por número de página (CustomPagination) salvo que se pida ?cursor=."""
+
+    fallback_class = CustomPagination
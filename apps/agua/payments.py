@@ -0,0 +1,157 @@
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from . import pdfcache
+from .debts import refresh_customer_debts
+from .models import Cash, Invoice, InvoicePayment, InvoiceReading, InvoiceService, PaymentMethod, Reading, Sequence, Service
+
+
+def _amount(value):
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, TypeError):
+        return None
+
+
+def _id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def post_invoice(data, readings=(), services=(), payment=None):
+    """
+    Registra un comprobante con sus líneas y su pago como una sola unidad.
+
+    `data` son los campos validados de InvoiceSerializer; `readings` es una
+    lista de {reading, amount_paid} (recibos), `services` de {service,
+    quantity, price} (otros cobros) y `payment` un {payment_method, cash,
+    total} opcional. Las lecturas se bloquean y cargan en una consulta y se
+    validan todas antes de escribir: si alguna fila no es válida no se guarda
+    nada. Las líneas se insertan con bulk_create y el total pagado y el estado
+    de las lecturas se actualizan con un solo UPDATE (Reading.apply_payments);
+    el pago se suma al libro de su caja y al resumen mensual
+    (InvoicePayment.post_totals).
+
+    Devuelve (factura, errores) donde errores es una lista de
+    {'index': i, 'errors': [...]}.
+    """
+    invoice_type = data.get('invoice_type')
+    readings = list(readings) if invoice_type == 'receipt' else []
+    services = list(services) if invoice_type == 'other_charges' else []
+
+    errors = defaultdict(list)
+
+    with transaction.atomic():
+
+        # Lecturas bloqueadas hasta el final: dos cajeros no pueden pagar la misma a la vez
+        reading_ids = {_id(row.get('reading')) for row in readings} - {None}
+        locked = Reading.objects.select_for_update().order_by('pk').in_bulk(reading_ids)
+        paid = {pk: reading.amount_paid for pk, reading in locked.items()}
+
+        lines = []
+        for index, row in enumerate(readings):
+
+            reading = locked.get(_id(row.get('reading')))
+            amount = _amount(row.get('amount_paid'))
+
+            if reading is None:
+                errors[index].append(f"La lectura {row.get('reading')} no existe.")
+                continue
+
+            if amount is None or amount <= 0:
+                errors[index].append("El monto pagado debe ser un número mayor que cero.")
+                continue
+
+            # Validar que el pago no exceda el monto total de la lectura (incluye otras filas del mismo pedido)
+            paid[reading.id] += amount
+
+            if paid[reading.id] > reading.total_amount:
+                errors[index].append(f"El total pagado para el Reading {reading.id} excede el monto permitido.")
+                continue
+
+            lines.append(InvoiceReading(reading=reading, amount_paid=amount))
+
+        catalog = Service.objects.in_bulk({_id(row.get('service')) for row in services} - {None})
+
+        items = []
+        for index, row in enumerate(services):
+
+            service = catalog.get(_id(row.get('service')))
+            quantity = _id(row.get('quantity'))
+            price = _amount(row.get('price'))
+
+            if service is None:
+                errors[index].append(f"El servicio {row.get('service')} no existe.")
+                continue
+
+            if quantity is None or price is None:
+                errors[index].append("La cantidad y el precio deben ser números.")
+                continue
+
+            items.append(InvoiceService(service=service, quantity=quantity, amount_paid=price))
+
+        payment_total = _amount(payment.get('total')) if payment else None
+
+        if payment:
+            # El método y la caja se validan aquí: el INSERT del pago no debe fallar por una llave foránea
+            if payment_total is None:
+                errors['invoice_payment'].append("El total del pago debe ser un número.")
+
+            method_id = _id(payment.get('payment_method'))
+            if method_id is None or not PaymentMethod.objects.filter(pk=method_id).exists():
+                errors['invoice_payment'].append(f"El método de pago {payment.get('payment_method')} no existe.")
+
+            cash_id = _id(payment.get('cash'))
+            if cash_id is None or not Cash.objects.filter(pk=cash_id).exists():
+                errors['invoice_payment'].append(f"La caja {payment.get('cash')} no existe.")
+
+        if errors:
+            return None, [{'index': index, 'errors': messages} for index, messages in errors.items()]
+
+        invoice = Invoice(**{
+            **data,
+            'correlative': Sequence.next_correlative(Sequence.invoice_series(invoice_type), 6),
+            'total_amount': sum(line.amount_paid for line in lines) + sum(item.amount_paid for item in items),
+        })
+        # bulk_create en vez de save() para no emitir post_save. El único receptor de Invoice es
+        # signals.update_customer_debt (caché de PDFs y resumen de deuda del cliente), que aquí correría
+        # antes de registrar los pagos; lo mismo se hace una sola vez al final de esta función. Los
+        # contadores del dashboard son triggers de la base de datos y sí ven este INSERT
+        Invoice.objects.bulk_create([invoice])
+
+        for line in lines:
+            line.invoice = invoice
+        for item in items:
+            item.invoice = invoice
+
+        InvoiceReading.objects.bulk_create(lines)
+        InvoiceService.objects.bulk_create(items)
+
+        amounts = defaultdict(int)
+        for line in lines:
+            amounts[line.reading_id] += line.amount_paid
+        Reading.apply_payments(amounts)
+
+        if payment:
+            received = InvoicePayment(
+                invoice=invoice,
+                payment_method_id=method_id,
+                cash_id=cash_id,
+                total=payment_total,
+            )
+            # Como las líneas: sin el SAVEPOINT de InvoicePayment.save, los totales se actualizan aquí
+            InvoicePayment.objects.bulk_create([received])
+            InvoicePayment.post_totals([
+                (received.cash_id, received.payment_method_id, received.created_at, received.total, 1)
+            ])
+
+        customer_ids = {invoice.customer_id} | {reading.customer_id for reading in locked.values()}
+        for customer_id in customer_ids:
+            pdfcache.invalidate_customer(customer_id)
+        refresh_customer_debts(customer_ids)
+
+    return invoice, []
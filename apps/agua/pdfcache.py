@@ -0,0 +1,142 @@
+"""
+Caché en disco de PDFs ya generados (recibos, tickets, estados de cuenta).
+
+Cada archivo se identifica por un hash de todo lo que influye en su
+contenido: el objeto y su versión (los datos del cliente y la fecha de
+actualización de su resumen de deuda), los datos de la empresa, la versión
+de los catálogos (tarifas, calles, zonas; ver catalogs.py) y la fecha de
+modificación de templates y hojas de estilo. Como el ETag es esa misma
+clave, un cliente HTTP nunca recibe un 304 por un documento que cambió.
+Los archivos se guardan por cliente, se borran cuando cambian sus lecturas
+o facturas (ver signals.py) y se sirven con FileResponse y ETag.
+
+Cuando la caché supera PDF_CACHE_MAX_BYTES se eliminan los menos usados:
+cada proceso recorre el directorio solo después de escribir
+PDF_CACHE_EVICT_EVERY bytes, y `manage.py purge_pdf_cache` lo hace a pedido.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponseNotModified
+from django.template.loader import get_template
+
+from . import catalogs
+
+# Bytes escritos por este proceso desde el último recorrido de evict()
+_written = 0
+
+
+def cache_dir():
+    return settings.PDF_CACHE_DIR
+
+
+def company_version(company):
+    if not company:
+        return None
+    return (company.pk, company.name, company.ruc, company.address, company.phone, str(company.logo))
+
+
+def customer_version(customer):
+    """
+    Versión de los datos del cliente: sus campos (nombre, dirección, tarifa...)
+    y CustomerDebt.updated_at, que cambia con cada lectura, pago o factura.
+    """
+    debt = getattr(customer, 'debt', None)
+    fields = tuple(getattr(customer, field.attname) for field in customer._meta.concrete_fields)
+    return fields, debt.updated_at.isoformat() if debt else None
+
+
+def _source_versions(templates, stylesheets):
+    paths = [get_template(name).origin.name for name in templates] + list(stylesheets)
+    return [(path, os.stat(path).st_mtime_ns) for path in paths]
+
+
+def cache_key(*parts):
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+def cached_pdf_response(request, customer_id, name, key_parts, render, filename,
+                        templates=(), stylesheets=()):
+    """
+    Devuelve el PDF desde la caché o lo genera con `render(ruta)` y lo guarda.
+    `key_parts` debe incluir todo lo que cambia el contenido del documento.
+    """
+    key = cache_key(name, *key_parts, catalogs.current_version(), *_source_versions(templates, stylesheets))
+    etag = f'"{key}"'
+
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    directory = os.path.join(cache_dir(), str(customer_id))
+    path = os.path.join(directory, f"{name}-{key}.pdf")
+
+    if os.path.exists(path):
+        os.utime(path)  # Para el desalojo LRU
+    else:
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        os.close(descriptor)
+        try:
+            render(temporary)
+            os.replace(temporary, path)  # Atómico: nunca se sirve un PDF a medio escribir
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        _written_bytes(os.path.getsize(path))
+
+    response = FileResponse(open(path, 'rb'), content_type='application/pdf', filename=filename)
+    response['ETag'] = etag
+    return response
+
+
+def invalidate_customer(customer_id):
+    """Elimina todos los PDFs en caché de un cliente."""
+    shutil.rmtree(os.path.join(cache_dir(), str(customer_id)), ignore_errors=True)
+
+
+def invalidate_all():
+    """Elimina toda la caché (por ejemplo, al cambiar las tarifas)."""
+    shutil.rmtree(cache_dir(), ignore_errors=True)
+
+
+def _written_bytes(size):
+    global _written
+
+    _written += size
+    if _written >= settings.PDF_CACHE_EVICT_EVERY:
+        _written = 0
+        evict()
+
+
+def evict(max_bytes=None):
+    """Elimina los PDFs menos usados hasta que la caché ocupe menos de `max_bytes`."""
+    max_bytes = max_bytes if max_bytes is not None else settings.PDF_CACHE_MAX_BYTES
+    files = []
+    total = 0
+
+    for root, _, names in os.walk(cache_dir()):
+        for file_name in names:
+            path = os.path.join(root, file_name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+    if total <= max_bytes:
+        return
+
+    for _, size, path in sorted(files):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        if total <= max_bytes:
+            break
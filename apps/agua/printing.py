@@ -0,0 +1,165 @@
+"""
+Impresión masiva de recibos del mes por calle, por zona o de todas las zonas.
+
+Los recibos se reparten en bloques de a lo más CHUNK_SIZE lecturas (nunca
+mezclando calles); cada bloque se renderiza a un PDF temporal en un proceso
+del pool y al final los PDF se unen en un solo archivo o en un ZIP con un PDF
+por calle. Así la memoria de WeasyPrint queda acotada al tamaño del bloque,
+sin importar cuántos recibos se impriman.
+
+Unir los PDF (pypdf) también mantiene en memoria todas las páginas del
+archivo resultante, así que ningún PDF unido pasa de MAX_MERGED_RECEIPTS
+recibos: una impresión más grande en un solo PDF sale como ZIP, y una calle
+más grande se divide en varias partes dentro del ZIP.
+"""
+import os
+import tempfile
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import connections
+from pypdf import PdfWriter
+
+from .models import Calle, Reading
+from .receipts import receipt_contexts
+from . import catalogs, rendering
+from .utils import init_worker, next_month_date
+
+CHUNK_SIZE = 200
+MAX_MERGED_RECEIPTS = 2000  # Recibos por PDF unido
+
+# output: 'pdf' o 'zip' (el que realmente se generó)
+Printed = namedtuple('Printed', ['receipts', 'output'])
+PAGE_BREAK = '<p style="page-break-after: always;"></p>'
+
+
+def _readings(period, calle_id=None, zona_id=None):
+    # Mismo criterio de periodo que PDFRecibosPorCalleApiView (mes de emisión), como rango para usar el índice
+    readings = Reading.objects.filter(issue_date__gte=period.replace(day=1), issue_date__lt=next_month_date(period))
+
+    if calle_id:
+        readings = readings.filter(customer__calle_id=calle_id)
+
+    if zona_id:
+        readings = readings.filter(customer__calle__zona_id=zona_id)
+
+    return readings.order_by('customer__calle_id', 'customer__full_name', 'id')
+
+
+def plan_chunks(period, calle_id=None, zona_id=None, chunk_size=CHUNK_SIZE):
+    """Lista de (calle_id, [ids de lecturas]) en bloques de a lo más `chunk_size` recibos."""
+    rows = _readings(period, calle_id, zona_id).values_list('customer__calle_id', 'id')
+    chunks = []
+
+    for calle, group in groupby(rows.iterator(), key=itemgetter(0)):
+        ids = [reading_id for _, reading_id in group]
+        for start in range(0, len(ids), chunk_size):
+            chunks.append((calle, ids[start:start + chunk_size]))
+
+    return chunks
+
+
+def render_chunk(reading_ids, path):
+    """Renderiza los recibos de un bloque de lecturas en el PDF `path` (en un proceso del pool)."""
+    company = catalogs.company()
+    company_logo = company.logo.url if company and company.logo else None
+    template = rendering.template("agua/invoice_template.html")
+
+    readings = Reading.objects.filter(id__in=reading_ids).order_by('customer__full_name', 'id')
+
+    html_string = PAGE_BREAK.join(
+        template.render(context) for context in receipt_contexts(readings, company, company_logo)
+    )
+
+    rendering.render_pdf(html_string, path, stylesheets=[rendering.INVOICE_CSS])
+    return path
+
+
+def _render_all(chunks, directory, workers, progress):
+    paths = [os.path.join(directory, f"{index:05d}.pdf") for index in range(len(chunks))]
+    ids = [reading_ids for _, reading_ids in chunks]
+
+    if workers <= 1 or len(chunks) <= 1:
+        results = map(render_chunk, ids, paths)
+        for done, _ in enumerate(results, start=1):
+            if progress:
+                progress(done, len(chunks))
+        return paths
+
+    # Las conexiones abiertas no deben heredarse en los procesos hijos
+    connections.close_all()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+        for done, _ in enumerate(pool.map(render_chunk, ids, paths), start=1):
+            if progress:
+                progress(done, len(chunks))
+
+    return paths
+
+
+def _parts(items, limit):
+    """Agrupa (bloque, path) consecutivos en partes de a lo más `limit` recibos."""
+    part, size = [], 0
+
+    for chunk, path in items:
+        if part and size + len(chunk[1]) > limit:
+            yield part
+            part, size = [], 0
+        part.append(path)
+        size += len(chunk[1])
+
+    if part:
+        yield part
+
+
+def _merge(paths, destination):
+    writer = PdfWriter()
+    for path in paths:
+        writer.append(path)
+    writer.write(destination)
+    writer.close()
+
+
+def mass_print(period, destination, calle_id=None, zona_id=None, output='pdf',
+               workers=None, chunk_size=CHUNK_SIZE, progress=None, max_merged=MAX_MERGED_RECEIPTS):
+    """
+    Imprime los recibos del mes `period` en `destination`: un PDF único
+    (output='pdf') o un ZIP con un PDF por calle (output='zip'). Con más de
+    `max_merged` recibos se genera un ZIP aunque se haya pedido un PDF.
+    `progress(hechos, total)` se llama al terminar cada bloque.
+    Devuelve un Printed con la cantidad de recibos y el formato generado.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = plan_chunks(period, calle_id, zona_id, chunk_size)
+    receipts = sum(len(reading_ids) for _, reading_ids in chunks)
+
+    if receipts > max_merged:
+        output = 'zip'
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        paths = _render_all(chunks, directory, workers, progress)
+
+        if output == 'zip':
+
+            calles = Calle.objects.in_bulk({calle for calle, _ in chunks})
+
+            with zipfile.ZipFile(destination, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for calle_id, group in groupby(zip(chunks, paths), key=lambda item: item[0][0]):
+                    calle = calles[calle_id]
+                    parts = list(_parts(group, max_merged))
+
+                    for number, part in enumerate(parts, start=1):
+                        suffix = f"_parte{number}" if len(parts) > 1 else ""
+                        calle_path = os.path.join(directory, f"calle_{calle_id}{suffix}.pdf")
+                        _merge(part, calle_path)
+                        archive.write(calle_path, arcname=f"recibos_{calle.codigo}_{calle.name}{suffix}.pdf")
+                        os.remove(calle_path)
+
+        else:
+            _merge(paths, destination)
+
+    return Printed(receipts, output)
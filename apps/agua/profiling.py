@@ -0,0 +1,91 @@
+"""
+Perfiles de requests bajo demanda (ver ProfilingMiddleware).
+
+Un administrador pide el perfil de un request con la cabecera
+`X-Profile: 1` (o `?_profile=1`); con `memory` en lugar de `1` también se
+registran las asignaciones de memoria con tracemalloc. Cada perfil se
+guarda en PROFILE_DIR como `<id>.prof` (pstats, para snakeviz o
+`python -m pstats`), `<id>.mem.txt` (las líneas que más memoria asignaron)
+y `<id>.json` (vista, ruta, usuario y duración). El id lleva la fecha y el
+nombre de la vista. Se conservan los PROFILE_KEEP más recientes.
+"""
+import json
+import os
+import re
+import tracemalloc
+from datetime import datetime
+
+from django.conf import settings
+
+KINDS = {'prof': '.prof', 'memory': '.mem.txt'}
+
+TOP_ALLOCATIONS = 30
+
+_ID = re.compile(r'\d{8}-\d{6}-\d{6}_[\w-]+')
+_UNSAFE = re.compile(r'[^\w-]+')
+
+
+def profile_dir():
+    return settings.PROFILE_DIR
+
+
+def new_id(label):
+    return f"{datetime.now():%Y%m%d-%H%M%S-%f}_{_UNSAFE.sub('-', label)[:80]}"
+
+
+def path(profile_id, kind):
+    """Archivo de un perfil, o None si el id no es válido (evita rutas fuera de PROFILE_DIR)."""
+    if not _ID.fullmatch(profile_id) or kind not in KINDS:
+        return None
+    return os.path.join(profile_dir(), profile_id + KINDS[kind])
+
+
+def save(profile_id, profiler, snapshot, meta):
+    """Guarda el perfil de cProfile, el resumen de memoria (si hay snapshot) y los datos del request."""
+    os.makedirs(profile_dir(), exist_ok=True)
+
+    profiler.dump_stats(path(profile_id, 'prof'))
+
+    if snapshot is not None:
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        ])
+        with open(path(profile_id, 'memory'), 'w', encoding='utf-8') as file:
+            for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+                file.write(f"{stat}\n")
+
+    with open(os.path.join(profile_dir(), f"{profile_id}.json"), 'w', encoding='utf-8') as file:
+        json.dump({**meta, 'id': profile_id, 'memory': snapshot is not None}, file)
+
+    prune()
+
+
+def recent(limit=50):
+    """Datos de los perfiles más recientes, del más nuevo al más antiguo."""
+    try:
+        names = sorted((name for name in os.listdir(profile_dir()) if name.endswith('.json')), reverse=True)
+    except FileNotFoundError:
+        return []
+
+    profiles = []
+    for name in names[:limit]:
+        try:
+            with open(os.path.join(profile_dir(), name), encoding='utf-8') as file:
+                profiles.append(json.load(file))
+        except (FileNotFoundError, ValueError):
+            continue  # Eliminado o a medio escribir
+    return profiles
+
+
+def prune(keep=None):
+    """Elimina los perfiles más antiguos que los `keep` más recientes."""
+    keep = keep if keep is not None else settings.PROFILE_KEEP
+    ids = sorted({name.split('.', 1)[0] for name in os.listdir(profile_dir()) if _ID.fullmatch(name.split('.', 1)[0])})
+
+    for profile_id in ids[:max(len(ids) - keep, 0)]:
+        for suffix in ('.json', *KINDS.values()):
+            try:
+                os.remove(os.path.join(profile_dir(), profile_id + suffix))
+            except FileNotFoundError:
+                pass
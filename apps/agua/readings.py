@@ -0,0 +1,147 @@
+from django.db import transaction
+
+from .debts import refresh_customer_debts
+from .models import Customer, Reading, Sequence
+from . import tariffs
+from .utils import next_month_date
+
+
+def last_readings(customer_ids, before=None):
+    """
+    Última lectura registrada de cada cliente (anterior a `before` si se indica),
+    en una sola consulta (DISTINCT ON).
+    """
+    queryset = Reading.objects.filter(customer_id__in=customer_ids)
+
+    if before:
+        queryset = queryset.filter(reading_date__lt=before)
+
+    last_readings = (
+        queryset
+        .order_by('customer_id', '-reading_date')
+        .distinct('customer_id')
+        .only('customer_id', 'reading_date', 'current_reading')
+    )
+    return {reading.customer_id: reading for reading in last_readings}
+
+
+def _row_error(customer, previous, reading_date, current_reading):
+    """Motivo por el que una fila de la carga masiva no es válida, o None."""
+    if customer is None:
+        return "El cliente no existe."
+
+    if customer.tariff_id is None:
+        return "El cliente no tiene una tarifa asignada."
+
+    if not previous:
+        return None
+
+    previous_date, previous_reading = previous
+
+    if (reading_date.year, reading_date.month) == (previous_date.year, previous_date.month):
+        return "Ya existe una lectura registrada para este cliente en el mismo mes."
+
+    if reading_date < previous_date:
+        return "No se puede registrar una lectura en un mes anterior a una ya existente."
+
+    expected_next_date = next_month_date(previous_date)
+
+    if (reading_date.year, reading_date.month) != (expected_next_date.year, expected_next_date.month):
+        return (
+            "Debes registrar el mes consecutivo. El siguiente mes esperado es: "
+            f"{expected_next_date.strftime('%B %Y')}"
+        )
+
+    if current_reading < previous_reading:
+        return "La lectura actual no puede ser menor que la última lectura registrada."
+
+    return None
+
+
+def bulk_create_readings(rows):
+    """
+    Registra un lote de lecturas (por ejemplo, una calle completa).
+
+    Aplica las mismas reglas que ReadingWriteSerializer.validate (sin meses
+    duplicados, sin saltar meses, sin meses anteriores a uno ya registrado y
+    sin lecturas menores a la anterior), pero con consultas por conjunto en
+    lugar de tres consultas por lectura.
+
+    `rows` es una lista de dicts con customer (id), reading_date y
+    current_reading. Si alguna fila no es válida no se guarda nada; de las
+    filas posteriores de un mismo cliente solo se informa la primera rechazada.
+    Devuelve (lecturas creadas, errores) donde errores es una lista de
+    {'index': i, 'errors': [...]}.
+    """
+    customer_ids = {row['customer'] for row in rows}
+
+    with transaction.atomic():
+
+        customers = Customer.objects.in_bulk(customer_ids)
+        # Estado de la última lectura por cliente: (fecha, lectura)
+        last = {
+            customer_id: (reading.reading_date, reading.current_reading)
+            for customer_id, reading in last_readings(customer_ids).items()
+        }
+
+        errors = {}
+        rejected = set()
+        readings = []
+
+        # Se procesan en orden de fecha para admitir varios meses del mismo cliente en el lote
+        ordered = sorted(enumerate(rows), key=lambda item: (item[1]['customer'], item[1]['reading_date']))
+
+        for index, row in ordered:
+
+            if row['customer'] in rejected:
+                # Las filas siguientes del cliente dependen de la rechazada: solo se informa el error de origen
+                continue
+
+            customer = customers.get(row['customer'])
+            reading_date = row['reading_date']
+            current_reading = row['current_reading']
+            previous = last.get(row['customer'])
+
+            error = _row_error(customer, previous, reading_date, current_reading)
+
+            if error:
+                errors[index] = [error]
+                rejected.add(row['customer'])
+                continue
+
+            previous_reading = previous[1] if previous else 0
+
+            due_date, cut_off_date = Reading.billing_dates(reading_date)
+
+            reading = Reading(
+                customer=customer,
+                reading_date=reading_date,
+                current_reading=current_reading,
+                previous_reading=previous_reading,
+                consumption=current_reading - previous_reading,
+                due_date=due_date,
+                cut_off_date=cut_off_date,
+            )
+            readings.append(reading)
+
+            last[customer.id] = (reading_date, current_reading)
+
+        if errors:
+            return [], [{'index': index, 'errors': errors[index]} for index in sorted(errors)]
+
+        # Importes de todo el lote con la tabla de tarifas en memoria
+        charges = tariffs.price_batch([(reading.customer.tariff_id, reading.consumption) for reading in readings])
+
+        for reading, charge in zip(readings, charges):
+            reading.total_water, reading.total_sewer, reading.fixed_charge, reading.total_amount = charge
+
+        # Un solo bloque de correlativos para todo el lote
+        for reading, correlative in zip(readings, Sequence.correlatives(Sequence.READING, len(readings), 6)):
+            reading.correlative = correlative
+
+        Reading.objects.bulk_create(readings)
+
+        # bulk_create no emite señales: el resumen de deuda se actualiza aquí
+        refresh_customer_debts(customer_ids)
+
+    return readings, []
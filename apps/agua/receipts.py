@@ -0,0 +1,90 @@
+from collections import defaultdict
+
+from django.db.models import F, Window
+from django.db.models.functions import Lag
+
+from .models import Reading
+
+
+def receipt_contexts(readings, company, company_logo):
+    """
+    Contextos de agua/invoice_template.html para un lote de lecturas (por
+    ejemplo, una calle en un periodo), en el orden del queryset `readings`.
+
+    Usa un número fijo de consultas sin importar el tamaño del lote: las
+    lecturas con cliente y tarifa, la lectura anterior de cada una (LAG por
+    cliente), esas lecturas anteriores y las lecturas impagas de los clientes.
+    """
+    readings = list(readings.select_related(
+        'customer__tariff__service', 'customer__tariff__category'
+    ))
+
+    if not readings:
+        return []
+
+    customer_ids = {reading.customer_id for reading in readings}
+    reading_ids = {reading.id for reading in readings}
+    last_date = max(reading.reading_date for reading in readings)
+
+    # Lectura anterior de cada cliente (función de ventana sobre su historial)
+    history = Reading.objects.filter(
+        customer_id__in=customer_ids,
+        reading_date__lte=last_date,
+    ).annotate(
+        previous_id=Window(
+            Lag('id'),
+            partition_by=[F('customer_id')],
+            order_by=[F('reading_date').asc(), F('id').asc()],
+        )
+    ).values_list('id', 'previous_id')
+
+    previous_ids = {reading_id: previous_id for reading_id, previous_id in history if reading_id in reading_ids}
+    previous_readings = Reading.objects.in_bulk([pk for pk in previous_ids.values() if pk])
+
+    # Lecturas impagas anteriores de los clientes del lote
+    unpaid_by_customer = defaultdict(list)
+    unpaid = Reading.objects.filter(
+        customer_id__in=customer_ids,
+        is_paid=False,
+        due_date__lt=last_date,
+    ).order_by('reading_date', 'id').only('id', 'customer_id', 'reading_date', 'due_date', 'total_amount')
+
+    for unpaid_reading in unpaid:
+        unpaid_by_customer[unpaid_reading.customer_id].append(unpaid_reading)
+
+    contexts = []
+
+    for reading in readings:
+
+        tariff = reading.customer.tariff
+
+        # Cálculo del consumo excedente
+        consumption_excess = max(0, reading.consumption - tariff.max_consumption)
+        total_excess_charge = consumption_excess * tariff.extra_rate
+
+        # Deuda vencida antes de esta lectura
+        unpaid_readings = [
+            unpaid_reading for unpaid_reading in unpaid_by_customer[reading.customer_id]
+            if unpaid_reading.due_date < reading.reading_date and unpaid_reading.id != reading.id
+        ]
+        total_due = sum(r.total_amount for r in unpaid_readings)
+
+        contexts.append({
+            "company": company,
+            "customer": reading.customer,
+            "reading": reading,
+            "previous_reading": previous_readings.get(previous_ids.get(reading.id)),
+            "consumption_excess": consumption_excess,
+            "total_excess_charge": total_excess_charge,
+            "unpaid_readings": unpaid_readings,
+            "total_due": total_due,
+            "total": reading.total_amount + total_due,
+            "company_logo": company_logo,
+        })
+
+    return contexts
+
+
+def receipt_context(reading, company, company_logo):
+    """Contexto de agua/invoice_template.html para el recibo de una lectura."""
+    return receipt_contexts(Reading.objects.filter(pk=reading.pk), company, company_logo)[0]
@@ -0,0 +1,162 @@
+"""
+Servicio de renderizado de PDFs con WeasyPrint.
+
+Los templates de PDF referencian imágenes y estilos por /static/... y
+/media/...; `url_fetcher` los lee del disco (STATIC_ROOT o los finders,
+MEDIA_ROOT) y guarda sus bytes en memoria del proceso, así generar un PDF
+nunca hace requests HTTP al propio servidor. Aparte de esos archivos solo se
+aceptan URLs data:; cualquier otra (http, file:, rutas fuera de /static/ y
+/media/) se rechaza, así un template o un dato del usuario no puede incluir
+en el PDF un archivo arbitrario del servidor.
+
+Las hojas de estilo se parsean una vez por proceso con una FontConfiguration
+compartida y los templates se compilan una vez; ambos se vuelven a leer solo
+si cambia la fecha de modificación del archivo.
+"""
+import mimetypes
+import os
+from urllib.parse import unquote, urlparse
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.exceptions import SuspiciousFileOperation
+from django.template import engines
+from django.template.loader import get_template
+from weasyprint import HTML, CSS, default_url_fetcher
+from weasyprint.text.fonts import FontConfiguration
+
+# Las rutas relativas de los templates (/static/..., /media/...) se resuelven contra esta base
+BASE_URL = 'file:///'
+
+INVOICE_CSS = os.path.join(settings.BASE_DIR, "static/css/invoice_style.css")
+TICKET_CSS = os.path.join(settings.BASE_DIR, "static/css/ticket.css")
+READING_CSS = os.path.join(settings.BASE_DIR, "static/css/reports/reading.css")
+
+# ruta -> (mtime, bytes)
+_resources = {}
+
+# ruta -> (mtime, CSS)
+_stylesheets = {}
+
+# nombre -> (ruta, mtime, Template)
+_templates = {}
+
+_font_config = None
+
+
+def _inside(root, name):
+    """Ruta de `name` dentro de `root`, o None si sale de él (../..)."""
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, name))
+    return path if os.path.commonpath([root, path]) == root else None
+
+
+def _static_path(name):
+    if settings.STATIC_ROOT:
+        path = _inside(settings.STATIC_ROOT, name)
+        if path and os.path.isfile(path):
+            return path
+    try:
+        return finders.find(name)
+    except SuspiciousFileOperation:
+        return None
+
+
+def local_path(url):
+    """Archivo local de una URL de /static/ o /media/ (absoluta o relativa), o None."""
+    path = unquote(urlparse(url).path)
+
+    if path.startswith(settings.STATIC_URL):
+        found = _static_path(path[len(settings.STATIC_URL):])
+    elif path.startswith(settings.MEDIA_URL):
+        found = _inside(settings.MEDIA_ROOT, path[len(settings.MEDIA_URL):])
+    else:
+        return None
+
+    if found and os.path.isfile(found):
+        return found
+    return None
+
+
+def _read(path):
+    mtime = os.stat(path).st_mtime_ns
+    cached = _resources.get(path)
+
+    if cached is None or cached[0] != mtime:
+        with open(path, 'rb') as file:
+            cached = (mtime, file.read())
+        _resources[path] = cached
+
+    return cached[1]
+
+
+def url_fetcher(url, *args, **kwargs):
+    """url_fetcher de WeasyPrint que solo lee los archivos de /static/ y /media/ (y URLs data:)."""
+    path = local_path(url)
+
+    if path:
+        return {
+            'string': _read(path),
+            'mime_type': mimetypes.guess_type(path)[0],
+            'redirected_url': url,
+            'filename': os.path.basename(path),
+        }
+
+    if urlparse(url).scheme == 'data':
+        return default_url_fetcher(url, *args, **kwargs)
+
+    # WeasyPrint registra el error y omite el recurso
+    raise ValueError(f"Recurso no permitido en PDFs: {url}")
+
+
+def font_config():
+    """FontConfiguration compartida por todos los PDFs del proceso."""
+    global _font_config
+    if _font_config is None:
+        _font_config = FontConfiguration()
+    return _font_config
+
+
+def stylesheet(path):
+    """Hoja de estilo ya parseada; se vuelve a parsear si el archivo cambió."""
+    mtime = os.stat(path).st_mtime_ns
+    cached = _stylesheets.get(path)
+
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, CSS(filename=path, url_fetcher=url_fetcher, font_config=font_config()))
+        _stylesheets[path] = cached
+
+    return cached[1]
+
+
+def template(name):
+    """Template ya compilado; se vuelve a compilar si el archivo cambió."""
+    cached = _templates.get(name)
+    path = cached[0] if cached else get_template(name).origin.name
+    mtime = os.stat(path).st_mtime_ns
+
+    if cached is None or cached[1] != mtime:
+        with open(path, encoding='utf-8') as file:
+            cached = (path, mtime, engines['django'].from_string(file.read()))
+        _templates[name] = cached
+
+    return cached[2]
+
+
+def render_template(name, context):
+    return template(name).render(context)
+
+
+def render_pdf(html_string, target=None, stylesheets=()):
+    """Escribe el PDF de `html_string` en `target` (ruta o archivo); sin target devuelve los bytes."""
+    return HTML(string=html_string, base_url=BASE_URL, url_fetcher=url_fetcher).write_pdf(
+        target,
+        stylesheets=[stylesheet(path) for path in stylesheets],
+        font_config=font_config(),
+    )
+
+
+def clear():
+    _resources.clear()
+    _stylesheets.clear()
+    _templates.clear()
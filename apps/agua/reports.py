@@ -0,0 +1,203 @@
+"""
+Reportes pesados (saldos, deudas, lecturas, caja e impresión masiva).
+
+Cada reporte PDF es una función `build(params, target, progress)` que escribe
+el PDF en `target` (ruta o archivo) y devuelve el nombre de descarga; `params`
+son los parámetros del query string, así el mismo reporte se genera dentro del
+request o en segundo plano como un ReportJob (ver jobs.py). Los datos salen de
+datasets.py, que también alimenta la exportación a CSV/XLSX (`output=`).
+"""
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+from django.db.models import Sum
+from django.utils.timezone import now
+
+from . import datasets, exports, rendering
+from .datasets import ReportError
+from .printing import mass_print
+
+
+def _noop(percent):
+    pass
+
+
+def balance_report(params, target, progress=_noop):
+    """Reporte de saldos (pagado/adeudado) por cliente."""
+    today = now().date()
+
+    # 1. Resumen de deuda de los clientes con lecturas (una fila por cliente)
+    report_data = list(datasets.balances(params).rows)
+
+    progress(30)
+
+    # 2. Totales generales
+    totals = {
+        'paid': sum(c['paid'] for c in report_data),
+        'pending': sum(c['pending'] for c in report_data),
+        'overdue': sum(c['overdue'] for c in report_data),
+        'total_debt': sum(c['total_debt'] for c in report_data),
+        'customer_count': len(report_data)
+    }
+
+    # 3. Contexto para el template
+    context = {
+        'customers': report_data,
+        'totals': totals,
+        'report_date': today.strftime("%d/%m/%Y"),
+        'title': "Reporte de Saldos de Clientes con Lecturas"
+    }
+
+    # 4. Generar PDF
+    html_string = rendering.render_template('reports/customer_balances.html', context)
+    rendering.render_pdf(html_string, target)
+
+    return f"reporte_saldos_clientes_{today.strftime('%Y%m%d')}.pdf"
+
+
+def debt_report(params, target, progress=_noop):
+    """Clientes con deuda en los últimos `months` meses, opcionalmente de una zona o calle."""
+
+    dataset = datasets.debts(params)
+    report_data = []
+
+    for customer in dataset.rows:
+        customer['months_list'] = [date.strftime("%b-%Y") for date in customer['months_list']]
+        report_data.append(customer)
+
+    progress(50)
+
+    # Generar PDF
+    context = {
+        'customers': report_data,
+        'report_date': datetime.now().strftime("%d/%m/%Y"),
+        'cutoff_date': dataset.meta['cutoff_date'].strftime("%d/%m/%Y"),
+        'title': f"Reporte de Deudas (Últimos {dataset.meta['months']} meses)"
+    }
+
+    rendering.render_pdf(rendering.render_template('reports/debt_report.html', context), target)
+
+    return f"deudas_clientes_{datetime.now().strftime('%Y%m%d')}.pdf"
+
+
+def readings_report(params, target, progress=_noop):
+    """Lecturas filtradas por cliente, año y estado de pago."""
+
+    dataset = datasets.readings(params)
+    payment_status_text = dataset.meta['payment_status']
+
+    # Calcular totales
+    totals = dataset.queryset.aggregate(total_amount=Sum('total_amount'), total_consumption=Sum('consumption'))
+    readings = list(dataset.rows)
+
+    progress(40)
+
+    # Preparar el contexto
+    context = {
+        'readings': readings,
+        'payment_status': payment_status_text,
+        'total_amount': totals['total_amount'] or 0,
+        'total_consumption': totals['total_consumption'] or 0,
+        'report_date': datetime.now().strftime("%d/%m/%Y %H:%M"),
+        'title': f"Reporte de Lecturas - Estado: {payment_status_text}",
+    }
+
+    # Generar el PDF
+    html_string = rendering.render_template('reports/reading.html', context)
+    rendering.render_pdf(html_string, target, stylesheets=[rendering.READING_CSS])
+
+    return f"{dataset.name}_{datetime.now().strftime('%Y%m%d')}.pdf"
+
+
+def cash_report(params, target, progress=_noop):
+    """Ingresos de una caja en un día (`type=daily`) o en un rango de fechas (`type=range`)."""
+
+    dataset = datasets.cash(params)
+    cash = dataset.meta['cash']
+
+    # Una sola consulta: los totales por concepto (tipo de pago) y el total salen de las mismas filas
+    payments = []
+    by_concept = defaultdict(Decimal)
+    for payment in dataset.rows:
+        payments.append(payment)
+        by_concept[payment['payment_method']] += payment['total']
+
+    income_by_concept = [
+        {'payment_method__description': description, 'total': total}
+        for description, total in sorted(by_concept.items())
+    ]
+
+    # Calcular totales
+    total_income = sum(by_concept.values())
+    calculated_balance = cash.beginning_balance + total_income
+
+    context = {
+        'payments': payments,
+        'date': dataset.meta['start_date'],
+        'opening_balance': float(cash.beginning_balance),
+        'income_by_concept': income_by_concept,
+        'total_income': float(total_income),
+        'calculated_balance': float(calculated_balance),
+        'final_balance': float(cash.final_balance) if cash.final_balance else None,
+        'reference_number': cash.reference_number,
+    }
+
+    if dataset.meta['type'] == 'range':
+        context.update({
+            'report_type': 'range',
+            'end_date': dataset.meta['end_date'],
+            'is_closed': cash.date_closed is not None,
+        })
+
+    rendering.render_pdf(rendering.render_template('reports/daily_balance.html', context), target)
+
+    if dataset.meta['type'] == 'daily':
+        return f"deudas_clientes_{datetime.now().strftime('%Y%m%d')}.pdf"
+    return f"reporte_caja_{datetime.now().strftime('%Y%m%d')}.pdf"
+
+
+def receipts_report(params, target, progress=_noop):
+    """Impresión masiva de los recibos del mes (ver printing.py)."""
+
+    try:
+        period = datetime.strptime(params.get('period') or '', '%Y-%m').date()
+    except ValueError:
+        raise ReportError("El periodo debe tener el formato YYYY-MM")
+
+    output = params.get('output', 'pdf')
+    if output not in ('pdf', 'zip'):
+        raise ReportError("output debe ser pdf o zip")
+
+    printed = mass_print(
+        period,
+        target,
+        calle_id=params.get('calle') or None,
+        zona_id=params.get('zona') or None,
+        output=output,
+        workers=1,  # El paralelismo lo dan los procesos de run_report_workers
+        progress=lambda done, total: progress(done * 100 // total),
+    )
+
+    # Una impresión demasiado grande para un solo PDF sale como ZIP
+    return f"recibos_{period:%Y%m}.{printed.output}"
+
+
+# Reportes que se pueden encolar como ReportJob
+REPORTS = {
+    'balance': balance_report,
+    'debts': debt_report,
+    'readings': readings_report,
+    'cash': cash_report,
+    'receipts': receipts_report,
+}
+
+
+def build(kind, params, target, progress=_noop):
+    """Genera el reporte `kind` en `target` en el formato `output` (pdf por defecto, csv o xlsx)."""
+    output = params.get('output', 'pdf')
+
+    if kind in datasets.DATASETS and output in exports.FORMATS:
+        return exports.write(datasets.DATASETS[kind](params), output, target)
+
+    return REPORTS[kind](params, target, progress)
@@ -2,9 +2,11 @@ from rest_framework import serializers
 from django.core.exceptions import ObjectDoesNotExist
 from django.utils.timezone import now
 from django.conf import settings
-from .models import Year, Category, Zona, Calle, Cash, Reading,  Invoice, Customer, Company, PaymentMethod, Service, Tariff
+from .models import Year, Category, Zona, Calle, Cash, Reading,  Invoice, Customer, CustomerDebt, Company, PaymentMethod, Service, Tariff, ReportJob
 from .utils import next_month_date
+from .reports import REPORTS
 from django.db import transaction
+from django.urls import reverse
 
 
 import os
@@ -84,20 +86,30 @@ class CustomerSerializer(serializers.ModelSerializer):
     class Meta:
         model = Customer
         fields = '__all__'
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Modo por lotes para listados: une calle, zona, tarifa, servicio, categoría
+        y el resumen de deuda (CustomerDebt) en la misma consulta, de modo que
+        serializar una página no dispara consultas por fila.
+        """
+        return queryset.select_related(
+            'calle__zona', 'tariff__service', 'tariff__category', 'debt'
+        )
+
+    def _debt_status(self, instance):
+        # Del resumen de deuda (CustomerDebt), a la fecha de hoy aunque no haya corrido debt_rollover
+        try:
+            return instance.debt.current_status(now().date())
+        except CustomerDebt.DoesNotExist:
+            return CustomerDebt.CLEAR  # Sin lecturas
     
     def to_representation(self, instance):
         data = super().to_representation(instance)
 
-        # Estado de deuda del cliente
-        has_pending = instance.readings.filter(is_paid=False, due_date__gte=now().date()).exists()
-        has_overdue = instance.readings.filter(is_paid=False, due_date__lt=now().date()).exists()
-
-        if has_overdue:
-            data["debt_status"] = "overdue"  # Deuda vencida
-        elif has_pending:
-            data["debt_status"] = "pending"  # Deuda aún no vencida
-        else:
-            data["debt_status"] = "clear"  # Sin deuda
+        # Estado de deuda del cliente: overdue, pending o clear
+        data["debt_status"] = self._debt_status(instance)
 
         if instance.calle:
             data['calle'] = {
@@ -161,7 +173,7 @@ class ReadingReadSerializer(serializers.ModelSerializer):
             'meter_code': obj.customer.meter_code,
             # Puedes añadir más campos si los necesitas
             'address': obj.customer.address,
-            'tariff_id': obj.customer.tariff.id if obj.customer.tariff else None
+            'tariff_id': obj.customer.tariff_id
         }
 
 class ReadingWriteSerializer(serializers.ModelSerializer):
@@ -169,6 +181,8 @@ class ReadingWriteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Reading
         fields = '__all__'
+        # Se derivan de los pagos (InvoiceReading)
+        read_only_fields = ['amount_paid', 'is_paid']
     
     def validate(self, data):
         
@@ -231,11 +245,21 @@ class ReadingWriteSerializer(serializers.ModelSerializer):
 
         return data
 
+class ReadingBulkItemSerializer(serializers.Serializer):
+
+    """Fila de una carga masiva de lecturas (ReadingViewSet.bulk)."""
+
+    customer = serializers.IntegerField()
+    reading_date = serializers.DateField()
+    current_reading = serializers.IntegerField()
+
 class InvoiceSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Invoice
         fields = '__all__'
+        # Lo asigna la vista desde Sequence; sin esto la restricción única lo vuelve obligatorio
+        read_only_fields = ['correlative']
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
@@ -283,3 +307,25 @@ class CashSerializer(serializers.ModelSerializer):
         
         model = Cash
         fields = '__all__'
+
+class ReportJobSerializer(serializers.ModelSerializer):
+
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReportJob
+        fields = ['id', 'kind', 'params', 'status', 'progress', 'error', 'filename',
+                  'created_at', 'started_at', 'finished_at', 'download_url']
+        read_only_fields = ['status', 'progress', 'error', 'filename', 'created_at', 'started_at', 'finished_at']
+
+    def get_download_url(self, obj):
+        if obj.status != ReportJob.DONE:
+            return None
+        url = reverse('reportjob-download', args=[obj.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def validate_kind(self, value):
+        if value not in REPORTS:
+            raise serializers.ValidationError(f"Reporte desconocido. Opciones: {', '.join(REPORTS)}")
+        return value
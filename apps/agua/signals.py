@@ -1,23 +1,114 @@
-from django.db.models.signals import post_save
+from django.core.signals import request_started
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.db import models
 from django.dispatch import receiver
-from .models import Reading, MonthlyBilling, Service
+from .models import (
+    Tariff, Service, Category, Customer, Reading, Invoice, InvoiceReading, InvoicePayment, Expense, Year, FinancialRollup,
+    Zona, Calle, PaymentMethod, Company,
+)
+from .debts import refresh_customer_debts
+from . import catalogs, pdfcache, tariffs
+
+@receiver(post_save, sender=Tariff)
+@receiver(post_delete, sender=Tariff)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_tariff_table(sender, **kwargs):
+    # Los precios cambiaron: todos los procesos vuelven a compilar la tabla en el próximo cálculo
+    tariffs.changed()
+    # Los recibos muestran los datos de la tarifa
+    pdfcache.invalidate_all()
+
+@receiver(request_started)
+def expire_tariff_version(sender, **kwargs):
+    # Un request ve los cambios de precios de otros procesos con a lo sumo una consulta de versión
+    tariffs.expire()
+
+@receiver(post_save, sender=Zona)
+@receiver(post_delete, sender=Zona)
+@receiver(post_save, sender=Calle)
+@receiver(post_delete, sender=Calle)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=Tariff)
+@receiver(post_delete, sender=Tariff)
+@receiver(post_save, sender=PaymentMethod)
+@receiver(post_delete, sender=PaymentMethod)
+@receiver(post_save, sender=Year)
+@receiver(post_delete, sender=Year)
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def invalidate_catalogs(sender, **kwargs):
+    # Todos los procesos recargan los catálogos (y la empresa de los PDFs) en el próximo pedido
+    catalogs.invalidate()
+
+def _origin_model(origin):
+    # `origin` es la instancia o el QuerySet con el que empezó el borrado
+    return type(origin) if isinstance(origin, models.Model) else getattr(origin, 'model', None)
+
+def _deleting_customer(origin):
+    # Borrado en cascada desde el cliente: su resumen de deuda también se elimina
+    return _origin_model(origin) is Customer
 
 @receiver(post_save, sender=Reading)
-def update_monthly_billing(sender, instance, created, **kwargs):
-    # Extraer mes y año de la lectura
-    month = instance.reading_date.month
-    year = instance.reading_date.year
-
-    # Obtener la política de servicio.
-    # Si tienes varios servicios, ajusta la lógica para seleccionar el adecuado.
-    service = Service.objects.first()  # Asumiendo que hay un único servicio
-
-    # Buscar o crear el registro de facturación mensual correspondiente
-    billing, created_billing = MonthlyBilling.objects.get_or_create(
-        customer=instance.customer,
-        service=service,
-        month=month,
-        year=year
-    )
-    # Se actualiza la facturación recalculando consumo y total_amount
-    billing.save()
\ No newline at end of file
+@receiver(post_delete, sender=Reading)
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+def update_customer_debt(sender, instance, origin=None, **kwargs):
+    pdfcache.invalidate_customer(instance.customer_id)
+    if not _deleting_customer(origin):
+        refresh_customer_debts([instance.customer_id])
+
+@receiver(post_save, sender=InvoiceReading)
+@receiver(post_delete, sender=InvoiceReading)
+def update_customer_debt_from_payment(sender, instance, origin=None, **kwargs):
+    if not _deleting_customer(origin):
+        customer_ids = list(Reading.objects.filter(pk=instance.reading_id).values_list('customer_id', flat=True))
+        for customer_id in customer_ids:
+            pdfcache.invalidate_customer(customer_id)
+        refresh_customer_debts(customer_ids)
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def invalidate_customer_pdfs(sender, instance, **kwargs):
+    # Nombre, dirección o tarifa del cliente aparecen en sus recibos
+    pdfcache.invalidate_customer(instance.id)
+
+@receiver(pre_delete, sender=Invoice)
+def reverse_invoice_readings(sender, instance, **kwargs):
+    # Una factura que se elimina (sola, con QuerySet.delete o en cascada desde el cliente) devuelve a
+    # sus lecturas lo pagado con un solo UPDATE; sus InvoiceReading no lo repiten fila por fila
+    paid = instance.readings.values('reading_id').annotate(total=models.Sum('amount_paid')).order_by()
+    Reading.apply_payments({row['reading_id']: -row['total'] for row in paid})
+
+@receiver(pre_delete, sender=InvoiceReading)
+def reverse_invoice_reading(sender, instance, origin=None, **kwargs):
+    if _origin_model(origin) not in (Invoice, Customer):
+        Reading.apply_payments({instance.reading_id: -instance.amount_paid})
+
+@receiver(pre_delete, sender=InvoicePayment)
+def reverse_payment_totals(sender, instance, **kwargs):
+    # pre_delete también llega en los borrados en cascada (factura, cliente, método de pago) y con
+    # QuerySet.delete(), que no pasan por Model.delete: el pago se resta de su caja y del resumen mensual
+    InvoicePayment.post_totals([(instance.cash_id, instance.payment_method_id, instance.created_at, -instance.total, -1)])
+
+@receiver(pre_delete, sender=Expense)
+def reverse_expense_totals(sender, instance, **kwargs):
+    # Como los pagos: QuerySet.delete() no llama a Expense.delete
+    FinancialRollup.post([(instance.date_of_issue, FinancialRollup.EXPENSE, instance.category, -instance.total, -1)])
+
+@receiver(post_save, sender=Year)
+@receiver(post_delete, sender=Year)
+def freeze_financial_rollup(sender, instance, signal, **kwargs):
+    rows = FinancialRollup.objects.filter(period__year=instance.year)
+
+    if signal is post_save and not instance.state:
+        # Año cerrado: su resumen mensual queda congelado con los valores actuales
+        rows.filter(frozen=False).update(frozen=True)
+    elif rows.filter(frozen=True).update(frozen=False):
+        # Reabierto: los movimientos registrados mientras estuvo cerrado no se sumaron
+        FinancialRollup.rebuild([instance.year])
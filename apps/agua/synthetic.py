@@ -0,0 +1,311 @@
+"""
+Datos sintéticos para medir el rendimiento (manage.py seed_synthetic).
+
+Genera zonas, calles, tarifas, clientes y `months` meses de lecturas con
+sus recibos, pagos por caja y egresos, con proporciones parecidas a las de
+una junta real: la mayoría paga al mes siguiente, algunos acumulan deuda y
+los últimos meses quedan pendientes. Todo se inserta con bulk_create por
+mes, así que las fechas de emisión y de pago (auto_now) se corrigen con un
+UPDATE al final de cada mes. Con la misma semilla se obtienen los mismos datos.
+"""
+import random
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db import transaction
+from django.db.models import F
+from django.utils.timezone import localdate, make_aware
+
+from . import catalogs, tariffs
+from .debts import refresh_in_batches
+from .models import (
+    Calle, Cash, CashLedger, Category, Customer, Expense, FinancialRollup, Invoice, InvoicePayment,
+    InvoiceReading, PaymentMethod, Reading, Sequence, Service, Tariff, Year, Zona,
+)
+
+BATCH_SIZE = 2000
+
+CUSTOMERS_PER_CALLE = 80
+CALLES_PER_ZONA = 12
+
+FIRST_NAMES = [
+    "María", "José", "Juan", "Rosa", "Luis", "Carmen", "Carlos", "Ana", "Jorge", "Elena",
+    "Pedro", "Julia", "Miguel", "Lucía", "César", "Teresa", "Víctor", "Gloria", "Raúl", "Norma",
+]
+LAST_NAMES = [
+    "Quispe", "Flores", "Sánchez", "Rodríguez", "García", "Mamani", "Huamán", "Chávez",
+    "Rojas", "Mendoza", "Torres", "Vásquez", "Ramírez", "Castillo", "Gutiérrez", "Díaz",
+]
+STREETS = ["Jr.", "Av.", "Psje.", "Calle"]
+
+# Categoría -> (peso entre los clientes, consumo mensual mín. y máx. en m3, precio agua, alcantarillado, límite)
+CATEGORIES = {
+    'DOMESTICO': (80, 4, 25, Decimal('1.20'), Decimal('0.60'), 20),
+    'COMERCIAL': (14, 10, 60, Decimal('2.10'), Decimal('1.00'), 40),
+    'SOCIAL': (4, 2, 15, Decimal('0.80'), Decimal('0.40'), 15),
+    tariffs.INDUSTRIAL: (2, 40, 200, Decimal('3.50'), Decimal('1.80'), 100),
+}
+
+# Perfil de pago -> (peso, probabilidad de pagar cada mes)
+PAYERS = {
+    'puntual': (70, 0.98),
+    'irregular': (22, 0.70),
+    'moroso': (8, 0.15),
+}
+
+# Meses más recientes que quedan sin pagar (aún no vencen o se acaban de emitir)
+UNPAID_TAIL = 1
+
+
+def _weighted(rng, table):
+    keys = list(table)
+    return rng.choices(keys, weights=[table[key][0] for key in keys])[0]
+
+
+def _first_or_create(model, defaults=None, **lookup):
+    # Los nombres de los catálogos no son únicos: se usa el primero que coincida
+    return model.objects.filter(**lookup).order_by('id').first() or model.objects.create(**lookup, **(defaults or {}))
+
+
+def _catalogs():
+    """Servicio, categorías con su tarifa y métodos de pago (reutiliza los existentes por nombre)."""
+    service = _first_or_create(Service, {'unit': 'm3', 'price': Decimal('5.00')}, name="Agua potable")
+
+    tariff_by_category = {}
+    for name, (_, _, _, price_water, price_sewer, max_consumption) in CATEGORIES.items():
+        category = _first_or_create(Category, name=name)
+        tariff = Tariff.objects.filter(service=service, category=category).first()
+        if tariff is None:
+            tariff = Tariff.objects.create(
+                service=service,
+                category=category,
+                min_consumption=0,
+                max_consumption=max_consumption,
+                price_water=price_water,
+                price_sewer=price_sewer,
+                extra_rate=price_water,
+            )
+        tariff_by_category[name] = tariff
+
+    methods = [
+        _first_or_create(PaymentMethod, description=description)
+        for description in ("Efectivo", "Transferencia", "Yape")
+    ]
+
+    return tariff_by_category, methods
+
+
+def _calles(rng, count, zonas):
+    zonas = Zona.objects.bulk_create([Zona(name=f"Zona {index + 1}") for index in range(zonas)])
+
+    calles = [
+        Calle(
+            codigo=codigo,
+            name=f"{rng.choice(STREETS)} {rng.choice(LAST_NAMES)} {index + 1}",
+            zona=zonas[index % len(zonas)],
+        )
+        for index, codigo in enumerate(Sequence.correlatives(Sequence.CALLE, count, 4))
+    ]
+    return Calle.objects.bulk_create(calles, batch_size=BATCH_SIZE)
+
+
+def _customers(rng, count, calles, tariff_by_category, start):
+    # Continúa la numeración si ya hay datos sintéticos (number y meter_code son únicos)
+    offset = Customer.objects.count()
+    customers = []
+    profiles = {}
+
+    for index in range(offset, offset + count):
+
+        category = _weighted(rng, CATEGORIES)
+        calle = calles[(index - offset) * len(calles) // count]
+
+        customer = Customer(
+            full_name=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}",
+            address=f"{calle.name} {rng.randint(100, 999)}",
+            number=f"9{index:010d}",
+            phone=f"9{rng.randint(10000000, 99999999)}",
+            has_meter=True,
+            calle=calle,
+            installation_date=start - timedelta(days=rng.randint(30, 3650)),
+            meter_code=f"SYN-{index:07d}",
+            tariff=tariff_by_category[category],
+        )
+        customers.append(customer)
+        profiles[index - offset] = (category, _weighted(rng, PAYERS))
+
+    customers = Customer.objects.bulk_create(customers, batch_size=BATCH_SIZE)
+    return [(customer, *profiles[index]) for index, customer in enumerate(customers)]
+
+
+def _invoices(rng, paid, methods, cashes, last_day):
+    """Un recibo pagado por cada lectura de `paid`, con su pago en la caja del mes del pago."""
+    invoices = []
+    dates = []
+
+    correlatives = Sequence.correlatives(Sequence.invoice_series('receipt'), len(paid), 6)
+
+    for reading, correlative in zip(paid, correlatives):
+        invoices.append(Invoice(
+            correlative=correlative,
+            invoice_type='receipt',
+            customer_id=reading.customer_id,
+            total_amount=reading.total_amount,
+        ))
+        # Se paga entre la emisión y unos días después del vencimiento
+        dates.append(min(reading.reading_date + timedelta(days=rng.randint(1, 38)), last_day))
+
+    invoices = Invoice.objects.bulk_create(invoices, batch_size=BATCH_SIZE)
+
+    InvoiceReading.objects.bulk_create([
+        InvoiceReading(invoice=invoice, reading=reading, amount_paid=reading.total_amount)
+        for invoice, reading in zip(invoices, paid)
+    ], batch_size=BATCH_SIZE)
+
+    InvoicePayment.objects.bulk_create([
+        InvoicePayment(
+            invoice=invoice,
+            payment_method=rng.choices(methods, weights=[75, 15, 10][:len(methods)])[0],
+            cash=cashes[paid_on.replace(day=1)],
+            total=invoice.total_amount,
+            created_at=make_aware(datetime.combine(paid_on, time(rng.randint(8, 16), rng.randint(0, 59)))),
+        )
+        for invoice, paid_on in zip(invoices, dates)
+    ], batch_size=BATCH_SIZE)
+
+    # date_of_issue es auto_now: bulk_create siempre guarda la fecha de hoy
+    by_date = defaultdict(list)
+    for invoice, paid_on in zip(invoices, dates):
+        by_date[paid_on].append(invoice.id)
+
+    for paid_on, invoice_ids in by_date.items():
+        Invoice.objects.filter(id__in=invoice_ids).update(date_of_issue=paid_on)
+
+    return len(invoices)
+
+
+def generate(customers, months, zonas=None, seed=0, end=None, log=None):
+    """
+    Crea `customers` clientes con `months` meses de lecturas que terminan en
+    el mes de `end` (por defecto el actual). Devuelve un Counter con las
+    filas creadas por modelo.
+    """
+    if customers < 1 or months < 1:
+        raise ValueError("customers y months deben ser mayores que cero")
+
+    rng = random.Random(seed)
+    log = log or (lambda message: None)
+    created = Counter()
+
+    today = localdate()
+    end = (end or today).replace(day=1)
+    # Ningún pago queda con fecha futura ni fuera de las cajas creadas
+    last_day = min(today, end + relativedelta(months=1, days=-1))
+    start = end - relativedelta(months=months - 1)
+    periods = [start + relativedelta(months=index) for index in range(months)]
+
+    calle_count = min(max(1, customers // CUSTOMERS_PER_CALLE), 9999)
+    zonas = min(zonas or max(1, calle_count // CALLES_PER_ZONA), calle_count)
+
+    with transaction.atomic():
+
+        tariff_by_category, methods = _catalogs()
+
+        calles = _calles(rng, calle_count, zonas)
+        created['zonas'] = zonas
+        created['calles'] = len(calles)
+
+        rows = _customers(rng, customers, calles, tariff_by_category, start)
+        created['customers'] = len(rows)
+        log(f"{len(rows)} clientes en {len(calles)} calles")
+
+        for period in periods:
+            Year.objects.get_or_create(year=period.year)
+
+        # Una caja por mes; la del mes actual queda abierta
+        cashes = {}
+        for period in periods:
+            cash = Cash.objects.create(beginning_balance=Decimal('200.00'), reference_number=f"SYN-{period:%Y%m}")
+            cashes[period] = cash
+        created['cashes'] = len(cashes)
+
+        meters = {customer.id: 0 for customer, _, _ in rows}
+
+        for number, period in enumerate(periods):
+
+            readings = []
+            will_pay = []
+
+            for customer, category, payer in rows:
+
+                _, low, high, _, _, _ = CATEGORIES[category]
+                reading_date = min(period + timedelta(days=rng.randint(14, 24)), last_day)
+                previous = meters[customer.id]
+                current = previous + rng.randint(low, high)
+                meters[customer.id] = current
+
+                due_date, cut_off_date = Reading.billing_dates(reading_date)
+                readings.append(Reading(
+                    customer=customer,
+                    reading_date=reading_date,
+                    current_reading=current,
+                    previous_reading=previous,
+                    consumption=current - previous,
+                    due_date=due_date,
+                    cut_off_date=cut_off_date,
+                ))
+                will_pay.append(number < months - UNPAID_TAIL and rng.random() < PAYERS[payer][1])
+
+            charges = tariffs.price_batch([(reading.customer.tariff_id, reading.consumption) for reading in readings])
+            correlatives = Sequence.correlatives(Sequence.READING, len(readings), 6)
+
+            for reading, charge, correlative, paid in zip(readings, charges, correlatives, will_pay):
+                reading.total_water, reading.total_sewer, reading.fixed_charge, reading.total_amount = charge
+                reading.correlative = correlative
+                reading.is_paid = paid
+                reading.amount_paid = reading.total_amount if paid else 0
+
+            readings = Reading.objects.bulk_create(readings, batch_size=BATCH_SIZE)
+
+            # issue_date es auto_now_add: se emite el mismo día de la lectura
+            Reading.objects.filter(id__in=[reading.id for reading in readings]).update(issue_date=F('reading_date'))
+
+            paid = [reading for reading, paid in zip(readings, will_pay) if paid]
+            created['readings'] += len(readings)
+            created['invoices'] += _invoices(rng, paid, methods, cashes, last_day)
+
+            Expense.objects.bulk_create([
+                Expense(date_of_issue=period + timedelta(days=27), total=Decimal('1500.00'), category='salary'),
+                Expense(date_of_issue=period + timedelta(days=rng.randint(0, 27)),
+                        total=Decimal(rng.randint(100, 800)), category='maintenance'),
+                Expense(date_of_issue=period + timedelta(days=rng.randint(0, 27)),
+                        total=Decimal(rng.randint(50, 300)), category='supplies'),
+            ])
+            created['expenses'] += 3
+
+            log(f"{period:%Y-%m}: {len(readings)} lecturas, {len(paid)} pagadas")
+
+        # bulk_create no pasa por InvoicePayment.save ni Expense.save: el libro de caja y el
+        # resumen mensual se arman aquí
+        CashLedger.rebuild([cash.id for cash in cashes.values()])
+        FinancialRollup.rebuild({period.year for period in periods})
+
+        # Cierre de las cajas de los meses anteriores
+        for period, cash in cashes.items():
+            if period == end:
+                continue
+            cash.refresh_from_db(fields=['income'])
+            cash.final_balance = cash.beginning_balance + cash.income
+            cash.date_closed = cash.date_opening
+            cash.state = False
+            cash.save()
+
+        # Zonas y calles se insertaron con bulk_create, sin las señales que versionan los catálogos
+        catalogs.invalidate()
+
+        # bulk_create no emite señales: el resumen de deuda se reconstruye aquí
+        refresh_in_batches([customer.id for customer, _, _ in rows])
+
+    return created
@@ -0,0 +1,139 @@
+"""
+Tabla de tarifas compilada en memoria.
+
+Carga en una consulta todas las tarifas junto con el precio del servicio y la
+categoría, y calcula los importes de una lectura (o de un lote completo) sin
+cargar tarifas. Al guardar o eliminar una tarifa, un servicio o una categoría
+signals.py incrementa la serie TARIFFS de Sequence y cada proceso recompila
+su tabla cuando ve una versión nueva.
+
+La versión se compara una vez por lote (price_batch) y, para price(), como
+mucho una vez por request (signals.py la marca vencida en request_started) o
+cada VERSION_TTL segundos fuera de un request; el resto de los cálculos no
+consulta la base de datos.
+"""
+import time
+from collections import namedtuple
+
+from django.apps import apps
+
+INDUSTRIAL = 'INDUSTRIAL'
+
+CompiledTariff = namedtuple(
+    'CompiledTariff',
+    ['price_water', 'price_sewer', 'fixed_charge', 'max_consumption', 'extra_rate', 'is_industrial']
+)
+
+Charges = namedtuple('Charges', ['total_water', 'total_sewer', 'fixed_charge', 'total_amount'])
+
+# Serie de Sequence que versiona la tabla entre procesos (ver changed)
+TARIFFS = 'tariffs'
+
+# Fuera de un request (comandos, workers) la versión se vuelve a comparar pasado este tiempo
+VERSION_TTL = 30
+
+_table = None
+_version = None
+_checked_at = None  # time.monotonic() de la última comparación; None = vencida
+
+
+def _compile():
+    Tariff = apps.get_model('agua', 'Tariff')
+
+    rows = Tariff.objects.values_list(
+        'id', 'price_water', 'price_sewer', 'service__price',
+        'max_consumption', 'extra_rate', 'category__name'
+    )
+
+    return {
+        tariff_id: CompiledTariff(
+            price_water, price_sewer, fixed_charge, max_consumption, extra_rate, category == INDUSTRIAL
+        )
+        for tariff_id, price_water, price_sewer, fixed_charge, max_consumption, extra_rate, category in rows
+    }
+
+
+def current_version():
+    """Versión de la tabla común a todos los procesos (serie TARIFFS de Sequence)."""
+    Sequence = apps.get_model('agua', 'Sequence')
+    return Sequence.objects.filter(name=TARIFFS).values_list('last_value', flat=True).first() or 0
+
+
+def refresh():
+    """Compara la versión común (una consulta) y recompila la tabla si otro proceso la cambió."""
+    global _table, _version, _checked_at
+    version = current_version()
+
+    if _table is None or _version != version:
+        _table = _compile()
+        _version = version
+
+    _checked_at = time.monotonic()
+    return _table
+
+
+def get_table():
+    """
+    Devuelve la tabla {tariff_id: CompiledTariff}; solo consulta la base de
+    datos si la última comparación de versión venció (ver refresh y expire).
+    """
+    if _table is None or _checked_at is None or time.monotonic() - _checked_at > VERSION_TTL:
+        return refresh()
+    return _table
+
+
+def expire():
+    """La próxima lectura de la tabla vuelve a comparar la versión (al empezar cada request)."""
+    global _checked_at
+    _checked_at = None
+
+
+def invalidate():
+    """Descarta la tabla de este proceso."""
+    global _table
+    _table = None
+
+
+def changed():
+    """Los precios cambiaron: nueva versión para que todos los procesos recompilen la tabla."""
+    Sequence = apps.get_model('agua', 'Sequence')
+    Sequence.reserve(TARIFFS)
+    invalidate()
+
+
+def _lookup(table, tariff_id):
+    if tariff_id not in table:
+        # Tarifa creada después de compilar la tabla y antes de cambiar la versión
+        invalidate()
+        table = get_table()
+
+    return table[tariff_id]
+
+
+def get_tariff(tariff_id):
+    return _lookup(get_table(), tariff_id)
+
+
+def calculate(tariff, consumption):
+    """Importes de una lectura con la tarifa compilada `tariff`."""
+    if tariff.is_industrial and tariff.max_consumption is not None:
+        # Hasta el máximo se cobra el precio normal, el exceso con la tarifa extra
+        base = min(consumption, tariff.max_consumption)
+        excess = max(0, consumption - tariff.max_consumption)
+        total_water = (base * tariff.price_water) + (excess * tariff.extra_rate)
+    else:
+        total_water = consumption * tariff.price_water
+
+    total_amount = total_water + tariff.price_sewer + tariff.fixed_charge
+
+    return Charges(total_water, tariff.price_sewer, tariff.fixed_charge, total_amount)
+
+
+def price(tariff_id, consumption):
+    return calculate(get_tariff(tariff_id), consumption)
+
+
+def price_batch(pairs):
+    """Calcula los importes de una lista de pares (tariff_id, consumo), en el mismo orden."""
+    table = refresh()  # La versión se comprueba una vez por lote
+    return [calculate(_lookup(table, tariff_id), consumption) for tariff_id, consumption in pairs]
@@ -1,3 +1,1276 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import threading
+import zipfile
+from importlib import import_module
+from base64 import urlsafe_b64encode
+from datetime import date, timedelta
+from unittest.mock import patch
 
-# Create your tests here.
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils.timezone import localdate, now
+from pypdf import PdfReader
+from rest_framework.authtoken.models import Token
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from . import benchmarks, billing, catalogs, counters, jobs, pdfcache, printing, profiling, receipts, rendering, synthetic, tariffs
+from .debts import refresh_customer_debts
+from .middleware import QueryInstrumentationMiddleware
+from .models import (
+    Zona, Calle, Service, Category, Tariff, Customer, CustomerDebt, Reading,
+    Invoice, InvoiceReading, InvoicePayment, PaymentMethod, Cash, CashLedger, Expense, FinancialRollup, Year,
+    DashboardCounter, Company, Sequence, ReportJob, BillingCheckpoint,
+)
+
+
+def make_tariffs(*categories):
+    """Una tarifa por categoría (DOMESTICO por defecto): agua 1 y alcantarillado 3 por m³, cargo fijo 2."""
+    service = Service.objects.create(name="Agua potable", price=2)
+    return [
+        Tariff.objects.create(
+            service=service,
+            category=Category.objects.create(name=name),
+            max_consumption=20,
+            price_water=1,
+            price_sewer=3,
+        )
+        for name in categories or ("DOMESTICO",)
+    ]
+
+
+def make_calles(count=1):
+    """`count` calles de la zona Centro."""
+    zona = Zona.objects.create(name="Centro")
+    return [Calle.objects.create(name=f"Calle {i + 1}", zona=zona) for i in range(count)]
+
+
+def make_customers(count, calles, tariffs, **fields):
+    """`count` clientes repartidos entre las calles y tarifas dadas."""
+    return [
+        Customer.objects.create(**{
+            'full_name': f"Cliente {i}",
+            'address': "Jr. Lima",
+            'number': f"{i:08d}",
+            'calle': calles[i % len(calles)],
+            'tariff': tariffs[i % len(tariffs)],
+            'installation_date': date(2020, 1, 1),
+            **fields,
+        })
+        for i in range(count)
+    ]
+
+
+class CustomerListQueryCountTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+
+        customers = make_customers(
+            30, make_calles(3), make_tariffs("DOMESTICO", "COMERCIAL"), installation_date=date(2024, 1, 1)
+        )
+        today = date.today()
+
+        for i, customer in enumerate(customers):
+            # Un tercio vencidos, un tercio pendientes, un tercio al día
+            if i % 3 != 2:
+                Reading.objects.create(
+                    customer=customer,
+                    reading_date=today - timedelta(days=40 if i % 3 == 0 else 10),
+                    due_date=today - timedelta(days=1) if i % 3 == 0 else today + timedelta(days=20),
+                    current_reading=10,
+                )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_constant_query_count_for_any_page_size(self):
+        # COUNT(*) de la paginación + una sola consulta para la página, sin importar su tamaño
+        for page_size in (5, 30):
+            with self.assertNumQueries(2):
+                response = self.client.get('/api/customer/', {'page_size': page_size})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), page_size)
+
+    def test_debt_status_from_debt_summary(self):
+        response = self.client.get('/api/customer/', {'page_size': 30})
+        statuses = {row['full_name']: row['debt_status'] for row in response.data['results']}
+
+        self.assertEqual(statuses["Cliente 0"], "overdue")
+        self.assertEqual(statuses["Cliente 1"], "pending")
+        self.assertEqual(statuses["Cliente 2"], "clear")
+        self.assertEqual(response.data['results'][0]['calle']['zona']['name'], "Centro")
+
+    def test_list_does_not_read_readings(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/customer/', {'page_size': 30, 'debt_status': CustomerDebt.OVERDUE})
+        self.assertFalse([q['sql'] for q in queries.captured_queries if 'agua_reading' in q['sql']])
+
+    def test_debt_status_filter_does_not_wait_for_rollover(self):
+        # Resumen sin pasar por debt_rollover: guardado como pendiente, pero el vencimiento ya pasó
+        CustomerDebt.objects.filter(status=CustomerDebt.OVERDUE).update(status=CustomerDebt.PENDING)
+
+        for status, names in [
+            (CustomerDebt.OVERDUE, {f"Cliente {i}" for i in range(0, 30, 3)}),
+            (CustomerDebt.PENDING, {f"Cliente {i}" for i in range(1, 30, 3)}),
+            (CustomerDebt.CLEAR, {f"Cliente {i}" for i in range(2, 30, 3)}),
+        ]:
+            response = self.client.get('/api/customer/', {'page_size': 30, 'debt_status': status})
+            self.assertEqual({row['full_name'] for row in response.data['results']}, names)
+            self.assertEqual({row['debt_status'] for row in response.data['results']}, {status})
+
+
+@override_settings(PDF_CACHE_DIR=tempfile.mkdtemp())
+class ReadingIndexPlanTests(TestCase):
+
+    """
+    Las consultas de los endpoints principales no deben recorrer toda la tabla
+    de lecturas. Con enable_seqscan = off PostgreSQL solo usa un Seq Scan cuando
+    ningún índice sirve para la consulta.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+
+        cls.calles = make_calles(4)
+
+        today = date.today()
+        months = [date(today.year - 1, month, 1) for month in range(1, 13)]
+        readings = []
+
+        for i, customer in enumerate(make_customers(40, cls.calles, make_tariffs())):
+            for index, reading_date in enumerate(months):
+                readings.append(Reading(
+                    customer=customer,
+                    reading_date=reading_date,
+                    due_date=reading_date + timedelta(days=30),
+                    current_reading=index * 10,
+                    consumption=10,
+                    total_amount=15,
+                    is_paid=index < 9 or i % 2 == 0,
+                ))
+
+        Reading.objects.bulk_create(readings)
+        refresh_customer_debts(Customer.objects.values_list('id', flat=True))
+
+        cls.customer = Customer.objects.order_by('id').first()
+        cls.reading = Reading.objects.filter(customer=cls.customer).order_by('-reading_date').first()
+        cls.period = cls.reading.issue_date.strftime('%Y-%m')
+
+    def setUp(self):
+        self.client = APIClient()
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE agua_reading")
+            cursor.execute("SET enable_seqscan = off")
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            cursor.execute("RESET enable_seqscan")
+
+    def _seq_scans(self, plan):
+        if plan.get('Node Type') == 'Seq Scan' and plan.get('Relation Name') == 'agua_reading':
+            yield plan
+        for child in plan.get('Plans', []):
+            yield from self._seq_scans(child)
+
+    def assertNoReadingSeqScan(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200, url)
+
+        reading_queries = []
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if sql.startswith('DECLARE'):
+                # .iterator() usa un cursor del servidor: DECLARE ... CURSOR WITH HOLD FOR SELECT ...
+                sql = sql.split(' FOR ', 1)[1]
+            if sql.startswith('SELECT') and 'agua_reading' in sql:
+                reading_queries.append(sql)
+        self.assertTrue(reading_queries, f"{url} no consultó lecturas")
+
+        with connection.cursor() as cursor:
+            for sql in reading_queries:
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+                plan = cursor.fetchone()[0]
+                plan = json.loads(plan) if isinstance(plan, str) else plan
+                scans = list(self._seq_scans(plan[0]['Plan']))
+                self.assertFalse(scans, f"{url}: Seq Scan de agua_reading en\n{sql}")
+
+    def test_readings_by_customer(self):
+        self.assertNoReadingSeqScan('/api/reading/', {'customer': self.customer.id})
+
+    def test_readings_by_year(self):
+        self.assertNoReadingSeqScan('/api/reading/', {'year': date.today().year - 1, 'cursor': ''})
+
+    def test_overdue_readings(self):
+        self.assertNoReadingSeqScan('/api/reading/', {'payment_status': 'overdue', 'cursor': ''})
+
+    def test_readings_keyset_page(self):
+        self.assertNoReadingSeqScan('/api/reading/', {'cursor': '', 'page_size': 20})
+
+    def _index_conds(self, plan):
+        if plan.get('Node Type') in ('Index Scan', 'Index Only Scan') and plan.get('Relation Name') == 'agua_reading':
+            yield plan['Index Name'], plan.get('Index Cond', '')
+        for child in plan.get('Plans', []):
+            yield from self._index_conds(child)
+
+    def test_keyset_page_seeks_on_both_columns(self):
+        response = self.client.get('/api/reading/', {'cursor': '', 'page_size': 20})
+        for _ in range(3):  # Página 4
+            response = self.client.get(response.data['next'])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(response.data['next']).status_code, 200)
+
+        sql = next(query['sql'] for query in queries.captured_queries if 'FROM "agua_reading"' in query['sql'])
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+            plan = cursor.fetchone()[0]
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+
+        conds = dict(self._index_conds(plan[0]['Plan']))
+        self.assertIn('reading_date_id_idx', conds, plan)
+        self.assertIn('reading_date', conds['reading_date_id_idx'])
+        self.assertIn('id', conds['reading_date_id_idx'].replace('reading_date', ''))
+
+    def test_debt_report(self):
+        self.assertNoReadingSeqScan('/api/debt-reports/', {'output': 'json', 'months': 24})
+
+    def test_receipt(self):
+        self.assertNoReadingSeqScan(f'/api/recibo/pdf/{self.reading.id}')
+
+    def test_calle_receipts(self):
+        self.assertNoReadingSeqScan(f'/api/receipts/by-address/{self.calles[0].id}/{self.period}')
+
+
+class EndpointQueryBudgetTests(TestCase):
+
+    """
+    Los escenarios de `manage.py benchmark` sobre datos de seed_synthetic no
+    deben superar su presupuesto de consultas. Los tiempos solo se controlan
+    con el comando, sobre una base de datos de tamaño real.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.created = synthetic.generate(customers=40, months=4, seed=1)
+        cls.user = get_user_model().objects.create_user(email="benchmark@example.com", password="x")
+
+    def test_seed_is_consistent(self):
+        self.assertEqual(Reading.objects.count(), 40 * 4)
+        self.assertEqual(CustomerDebt.objects.count(), 40)
+        # Cada lectura pagada tiene su recibo y el último mes queda pendiente
+        self.assertEqual(Reading.objects.filter(is_paid=True).count(), self.created['invoices'])
+        self.assertEqual(InvoiceReading.objects.count(), self.created['invoices'])
+        self.assertFalse(Reading.objects.filter(is_paid=True, reading_date__gte=date.today().replace(day=1)).exists())
+
+    def test_endpoints_within_query_budgets(self):
+        results = benchmarks.run(self.user, repeat=1)
+        query_budgets = {name: (max_queries, None) for name, (max_queries, _) in benchmarks.BUDGETS.items()}
+
+        self.assertEqual({result.name for result in results}, set(benchmarks.BUDGETS))
+        self.assertEqual(benchmarks.check(results, query_budgets), [])
+
+
+@override_settings(SQL_INSTRUMENTATION=True, SQL_REPEATED_QUERY_THRESHOLD=3)
+class QueryInstrumentationTests(TestCase):
+
+    def _middleware(self, view):
+        return QueryInstrumentationMiddleware(lambda request: view())
+
+    def test_server_timing_header(self):
+        def view():
+            Zona.objects.count()
+            Calle.objects.count()
+            return HttpResponse()
+
+        response = self._middleware(view)(RequestFactory().get('/api/zona/'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="2 consultas", app;dur=[\d.]+$')
+
+    def test_repeated_query_warning_with_call_site(self):
+        zonas = [Zona.objects.create(name=f"Zona {i}") for i in range(5)]
+
+        def view():
+            for zona in zonas:
+                list(Calle.objects.filter(zona=zona))  # N+1
+            return HttpResponse()
+
+        with self.assertLogs('apps.agua.middleware', level='WARNING') as logs:
+            self._middleware(view)(RequestFactory().get('/api/calle/'))
+
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("repetida 5 veces en GET /api/calle/", logs.output[0])
+        self.assertIn("apps/agua/tests.py", logs.output[0])
+
+    def test_disabled_by_default(self):
+        with override_settings(SQL_INSTRUMENTATION=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                QueryInstrumentationMiddleware(lambda request: HttpResponse())
+
+
+@override_settings(PROFILE_DIR=tempfile.mkdtemp())
+class ProfilingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_user(email="admin@example.com", password="x", is_staff=True)
+        cls.user = get_user_model().objects.create_user(email="cajero@example.com", password="x")
+
+    def _client(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=user).key}")
+        return client
+
+    def test_admin_profile_with_memory(self):
+        client = self._client(self.admin)
+        response = client.get('/api/zona/', HTTP_X_PROFILE='memory')
+
+        profile_id = response['X-Profile-Id']
+        self.assertIn('zona-list', profile_id)
+        self.assertTrue(os.path.exists(profiling.path(profile_id, 'prof')))
+        self.assertTrue(os.path.exists(profiling.path(profile_id, 'memory')))
+
+        listing = client.get('/api/profiles/')
+        self.assertEqual(listing.data[0]['id'], profile_id)
+        self.assertEqual(listing.data[0]['user'], "admin@example.com")
+
+        download = client.get(reverse('profile-download', args=[profile_id, 'prof']))
+        self.assertEqual(download.status_code, 200)
+
+    def test_ignored_for_non_admin(self):
+        client = self._client(self.user)
+        response = client.get('/api/zona/', {'_profile': '1'})
+
+        self.assertFalse(response.has_header('X-Profile-Id'))
+        self.assertEqual(client.get('/api/profiles/').status_code, 403)
+
+    def test_invalid_profile_id(self):
+        self.assertIsNone(profiling.path('../../settings', 'prof'))
+
+
+class SequenceTests(TestCase):
+
+    def test_reserve_returns_consecutive_blocks(self):
+        self.assertEqual(Sequence.reserve('prueba', 3), range(1, 4))
+        self.assertEqual(Sequence.reserve('prueba', 2), range(4, 6))
+        self.assertEqual(Sequence.correlatives('prueba', 2, 6), ['000006', '000007'])
+        self.assertEqual(Sequence.objects.get(name='prueba').last_value, 7)
+
+    def test_untyped_invoices_cannot_share_a_correlative(self):
+        customer, = make_customers(1, make_calles(), make_tariffs())
+        Invoice.objects.create(customer=customer, correlative='000001')
+        # Sin correlativo no se comparan
+        Invoice.objects.create(customer=customer)
+        Invoice.objects.create(customer=customer)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Invoice.objects.create(customer=customer, correlative='000001')
+
+    def test_seeding_continues_each_invoice_type_from_the_global_maximum(self):
+        customer, = make_customers(1, make_calles(), make_tariffs())
+        Invoice.objects.bulk_create([
+            Invoice(customer=customer, invoice_type=invoice_type, correlative=correlative)
+            for invoice_type, correlative in ((None, '000007'), ('', '000003'), ('receipt', '000012'), ('receipt', 'A-1'))
+        ])
+        Reading.objects.create(customer=customer, reading_date=date(2024, 1, 1), current_reading=10, correlative='000004')
+        Sequence.objects.all().delete()
+
+        with connection.schema_editor() as schema_editor:
+            import_module('apps.agua.migrations.0015_sequence').seed_sequences(apps, schema_editor)
+
+        self.assertEqual(
+            dict(Sequence.objects.values_list('name', 'last_value')),
+            {'reading': 4, 'calle': 1, 'invoice:': 12, 'invoice:receipt': 12},
+        )
+
+
+class SequenceConcurrencyTests(TransactionTestCase):
+
+    def test_concurrent_reservations_never_overlap(self):
+        blocks = []
+        barrier = threading.Barrier(8)
+
+        def reserve():
+            try:
+                barrier.wait()
+                with transaction.atomic():
+                    blocks.append(Sequence.reserve('prueba', 5))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=reserve) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        numbers = sorted(number for block in blocks for number in block)
+        self.assertEqual(numbers, list(range(1, 41)))
+        self.assertTrue(all(len(block) == 5 and block.step == 1 for block in blocks))
+
+
+class InvoicePostingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+
+        cls.customer, = make_customers(1, make_calles(), make_tariffs())
+        cls.readings = Reading.objects.bulk_create([
+            Reading(
+                customer=cls.customer,
+                reading_date=date(2024, month, 1),
+                due_date=date(2024, month, 28),
+                current_reading=month * 10,
+                consumption=10,
+                total_amount=15,
+            )
+            for month in range(1, 13)
+        ])
+        cls.method = PaymentMethod.objects.create(description="Efectivo")
+        cls.cash = Cash.objects.create(beginning_balance=0)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def _post(self, readings):
+        return self.client.post('/api/invoice/', {
+            'customer': self.customer.id,
+            'invoice_type': 'receipt',
+            'readings': readings,
+            'invoice_payment': {'payment_method': self.method.id, 'cash': self.cash.id, 'total': '15.00'},
+        }, format='json')
+
+    def _queries(self, readings):
+        with CaptureQueriesContext(connection) as captured:
+            response = self._post([{'reading': reading.id, 'amount_paid': '15.00'} for reading in readings])
+        self.assertEqual(response.status_code, 201)
+        return len(captured)
+
+    def test_query_count_does_not_depend_on_paid_months(self):
+        self.assertEqual(self._queries(self.readings[:1]), self._queries(self.readings[1:]))
+
+        self.assertFalse(Reading.objects.filter(customer=self.customer, is_paid=False).exists())
+        self.assertEqual(CustomerDebt.objects.get(customer=self.customer).unpaid_months, 0)
+        self.assertEqual(Invoice.objects.order_by('-id').first().total_amount, 11 * 15)
+
+    def test_readings_are_locked_in_id_order(self):
+        # Mismo orden que la facturación de la calle: dos transacciones no se bloquean en orden cruzado
+        with CaptureQueriesContext(connection) as captured:
+            self._post([{'reading': reading.id, 'amount_paid': '15.00'} for reading in reversed(self.readings[:3])])
+
+        locked, = [query['sql'] for query in captured if query['sql'].endswith('FOR UPDATE')]
+        self.assertIn('ORDER BY "agua_reading"."id" ASC', locked)
+
+    def test_partial_payment_keeps_reading_unpaid(self):
+        response = self._post([{'reading': self.readings[0].id, 'amount_paid': '10.00'}])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(Reading.objects.get(pk=self.readings[0].id).is_paid)
+
+    def test_invalid_row_writes_nothing(self):
+        response = self._post([
+            {'reading': self.readings[0].id, 'amount_paid': '15.00'},
+            {'reading': self.readings[1].id, 'amount_paid': '20.00'},  # Excede el total
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'][0]['index'], 1)
+        self.assertFalse(Invoice.objects.exists())
+        self.assertFalse(InvoicePayment.objects.exists())
+        self.assertFalse(Reading.objects.filter(is_paid=True).exists())
+
+    def test_invalid_payment_method_and_cash(self):
+        response = self.client.post('/api/invoice/', {
+            'customer': self.customer.id,
+            'invoice_type': 'receipt',
+            'readings': [{'reading': self.readings[0].id, 'amount_paid': '15.00'}],
+            'invoice_payment': {'payment_method': 9999, 'cash': 'x', 'total': '15.00'},
+        }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'], [{'index': 'invoice_payment', 'errors': [
+            "El método de pago 9999 no existe.", "La caja x no existe.",
+        ]}])
+        self.assertFalse(Invoice.objects.exists())
+
+    def test_amount_paid_accumulates(self):
+        reading = self.readings[0]
+        self._post([{'reading': reading.id, 'amount_paid': '10.00'}])
+        self._post([{'reading': reading.id, 'amount_paid': '5.00'}])
+
+        reading.refresh_from_db()
+        self.assertEqual(reading.amount_paid, 15)
+        self.assertTrue(reading.is_paid)
+
+    def test_invoice_delete_reverses_readings_in_one_update(self):
+        self._post([{'reading': reading.id, 'amount_paid': '15.00'} for reading in self.readings])
+        invoice = Invoice.objects.get()
+        InvoicePayment.objects.filter(invoice=invoice).delete()
+
+        with CaptureQueriesContext(connection) as captured:
+            invoice.delete()
+
+        updates = [query for query in captured if query['sql'].startswith('UPDATE "agua_reading"')]
+        self.assertEqual(len(updates), 1)
+        self.assertFalse(Reading.objects.filter(Q(is_paid=True) | Q(amount_paid__gt=0)).exists())
+
+    def test_single_payment_row_save_and_delete(self):
+        invoice = Invoice.objects.create(customer=self.customer, invoice_type='receipt')
+        payment = InvoiceReading.objects.create(invoice=invoice, reading=self.readings[0], amount_paid=15)
+        self.assertTrue(Reading.objects.get(pk=self.readings[0].id).is_paid)
+
+        payment.amount_paid = 5
+        payment.save()
+        self.assertEqual(Reading.objects.get(pk=self.readings[0].id).amount_paid, 5)
+
+        payment.delete()
+        reading = Reading.objects.get(pk=self.readings[0].id)
+        self.assertEqual((reading.amount_paid, reading.is_paid), (0, False))
+
+    def test_cash_ledger_follows_payments(self):
+        self._post([{'reading': self.readings[0].id, 'amount_paid': '15.00'}])
+        self._post([{'reading': self.readings[1].id, 'amount_paid': '15.00'}])
+
+        ledger = CashLedger.objects.get(cash=self.cash, payment_method=self.method)
+        self.assertEqual((ledger.total, ledger.payments), (30, 2))
+        self.assertEqual(Cash.objects.get(pk=self.cash.id).income, 30)
+
+        Invoice.objects.order_by('id').first().delete()
+
+        ledger.refresh_from_db()
+        self.assertEqual((ledger.total, ledger.payments), (15, 1))
+        self.assertEqual(Cash.objects.get(pk=self.cash.id).income, 15)
+
+    def test_cascade_and_queryset_deletes_reverse_the_ledger(self):
+        self._post([{'reading': self.readings[0].id, 'amount_paid': '15.00'}])
+        self._post([{'reading': self.readings[1].id, 'amount_paid': '15.00'}])
+
+        InvoicePayment.objects.filter(invoice=Invoice.objects.order_by('id').first()).delete()
+
+        ledger = CashLedger.objects.get(cash=self.cash, payment_method=self.method)
+        self.assertEqual((ledger.total, ledger.payments), (15, 1))
+        self.assertEqual(Cash.objects.get(pk=self.cash.id).income, 15)
+
+        # Cliente -> facturas -> pagos, todo en cascada
+        Customer.objects.get(pk=self.customer.id).delete()
+
+        ledger.refresh_from_db()
+        self.assertEqual((ledger.total, ledger.payments), (0, 0))
+        self.assertEqual(Cash.objects.get(pk=self.cash.id).income, 0)
+
+    def test_cash_close_does_not_read_payments(self):
+        self._post([{'reading': reading.id, 'amount_paid': '15.00'} for reading in self.readings[:3]])
+
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(f'/api/cash/{self.cash.id}/close/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in captured if 'agua_invoicepayment' in query['sql']])
+        self.assertEqual(Cash.objects.get(pk=self.cash.id).final_balance, 15)
+        self.assertEqual(self.client.get(f'/api/cash/{self.cash.id}/close/').status_code, 400)
+
+    def test_cash_report_uses_payment_timestamp(self):
+        self._post([{'reading': self.readings[0].id, 'amount_paid': '15.00'}])
+        self._post([{'reading': self.readings[1].id, 'amount_paid': '15.00'}])
+        InvoicePayment.objects.filter(pk=InvoicePayment.objects.order_by('id').first().pk).update(
+            created_at=now() - timedelta(days=1)
+        )
+
+        response = self.client.get(f'/api/cash/{self.cash.id}/report/', {
+            'type': 'daily', 'date': localdate().isoformat(), 'output': 'csv',
+        })
+
+        rows = b''.join(response.streaming_content).decode('utf-8-sig').strip().splitlines()
+        self.assertEqual(len(rows), 2)  # Encabezado y el pago de hoy
+
+    def test_payments_update_financial_rollup(self):
+        self._post([{'reading': self.readings[0].id, 'amount_paid': '15.00'}])
+        self._post([{'reading': self.readings[1].id, 'amount_paid': '15.00'}])
+
+        row = FinancialRollup.objects.get(kind=FinancialRollup.INCOME)
+        self.assertEqual((row.period, row.concept, row.total, row.movements), (
+            localdate().replace(day=1), str(self.method.id), 30, 2,
+        ))
+
+        Invoice.objects.order_by('id').first().delete()
+        self.assertEqual(FinancialRollup.objects.get(kind=FinancialRollup.INCOME).total, 15)
+
+    def test_cascade_and_queryset_deletes_reverse_the_rollup(self):
+        for reading in self.readings[:3]:
+            self._post([{'reading': reading.id, 'amount_paid': '15.00'}])
+
+        # Los pagos se eliminan en cascada desde un QuerySet de facturas, sin Invoice.delete
+        Invoice.objects.filter(pk=Invoice.objects.order_by('id').first().pk).delete()
+        row = FinancialRollup.objects.get(kind=FinancialRollup.INCOME)
+        self.assertEqual((row.total, row.movements), (30, 2))
+
+        # ... y también lo pagado en sus lecturas
+        readings = Reading.objects.filter(pk__in=[reading.id for reading in self.readings[:3]]).order_by('reading_date')
+        self.assertEqual(list(readings.values_list('amount_paid', 'is_paid')), [(0, False), (15, True), (15, True)])
+
+        InvoiceReading.objects.filter(reading=self.readings[1]).delete()
+        self.assertEqual(list(readings.values_list('amount_paid', 'is_paid')), [(0, False), (0, False), (15, True)])
+
+        Customer.objects.get(pk=self.customer.id).delete()
+        row.refresh_from_db()
+        self.assertEqual((row.total, row.movements), (0, 0))
+
+
+class FinancialRollupTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(email="caja@example.com", password="x"))
+
+    def _expense(self, day, total, category='supplies'):
+        return Expense.objects.create(date_of_issue=day, total=total, category=category)
+
+    def _totals(self, year):
+        return {row['name']: row['value'] for row in self.client.get('/api/financial-summary/', {'year': year}).data}
+
+    def test_expenses_update_rollup_incrementally(self):
+        expense = self._expense(date(2024, 3, 5), 100)
+        self._expense(date(2024, 3, 20), 50)
+
+        expense.total = 70
+        expense.save()
+        self.assertEqual(FinancialRollup.objects.get(period=date(2024, 3, 1)).total, 120)
+
+        expense.delete()
+        self.assertEqual(FinancialRollup.objects.get(period=date(2024, 3, 1)).movements, 1)
+        self.assertEqual(self._totals(2024), {'ingresos': 0, 'egresos': 50, 'utilidad': -50})
+
+    def test_queryset_delete_reverses_expenses(self):
+        self._expense(date(2024, 3, 5), 100)
+        self._expense(date(2024, 3, 20), 50, 'salary')
+        self._expense(date(2024, 4, 1), 25)
+
+        Expense.objects.filter(date_of_issue__month=3).delete()
+
+        self.assertEqual(
+            set(FinancialRollup.objects.values_list('period', 'concept', 'total', 'movements')),
+            {(date(2024, 3, 1), 'supplies', 0, 0), (date(2024, 3, 1), 'salary', 0, 0), (date(2024, 4, 1), 'supplies', 25, 1)},
+        )
+
+    def test_rebuild_matches_incremental_totals(self):
+        self._expense(date(2024, 1, 10), 30)
+        self._expense(date(2024, 2, 10), 40, 'salary')
+        expected = set(FinancialRollup.objects.values_list('period', 'kind', 'concept', 'total', 'movements'))
+
+        FinancialRollup.objects.update(total=0)
+        self.assertEqual(FinancialRollup.rebuild(), [2024])
+        self.assertEqual(set(FinancialRollup.objects.values_list('period', 'kind', 'concept', 'total', 'movements')), expected)
+
+    def test_closed_year_is_frozen(self):
+        self._expense(date(2023, 6, 1), 80)
+        year = Year.objects.create(year=2023, state=False)
+
+        self._expense(date(2023, 6, 2), 20)
+        self._expense(date(2023, 7, 2), 20)
+        self.assertEqual(FinancialRollup.rebuild([2023]), [])
+        self.assertEqual(list(FinancialRollup.objects.values_list('total', 'frozen')), [(80, True)])
+
+        response = self.client.get('/api/financial-series/', {'year': 2023})
+        self.assertEqual(len(response.data['series']), 12)
+        self.assertEqual(response.data['series'][5]['expenses'], 80)
+        self.assertTrue(response.data['series'][5]['frozen'])
+
+        # Al reabrirlo se recalcula con los movimientos registrados mientras estuvo cerrado
+        year.state = True
+        year.save()
+        self.assertEqual(self._totals(2023)['egresos'], 120)
+
+    def test_series_by_year(self):
+        self._expense(date(2022, 5, 1), 10)
+        self._expense(date(2024, 5, 1), 30)
+
+        response = self.client.get('/api/financial-series/', {'start_year': 2022, 'end_year': 2024, 'group': 'year'})
+
+        self.assertEqual([item['expenses'] for item in response.data['series']], [10, 0, 30])
+        self.assertEqual(response.data['series'][0]['expenses_by_category'], {'Suministros': 10})
+        self.assertEqual(self.client.get('/api/financial-series/', {'start_year': 2024, 'end_year': 2022}).status_code, 400)
+
+
+class DashboardCounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+
+        cls.customers = make_customers(3, make_calles(), make_tariffs())
+        Reading.objects.bulk_create([
+            Reading(customer=customer, reading_date=date(2024, 1, 1), due_date=date(2024, 1, 28),
+                    current_reading=10, consumption=10, total_amount=15)
+            for customer in cls.customers
+        ])
+        Invoice.objects.bulk_create([
+            Invoice(customer=customer, invoice_type='receipt', total_amount=15) for customer in cls.customers
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def _dashboard(self, **params):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get('/api/invoices/summary/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(captured)
+
+    def test_counters_follow_bulk_writes_and_cascades(self):
+        Invoice.objects.filter(customer=self.customers[0]).update(total_amount=20)
+        self.customers[1].delete()  # Borra en cascada su lectura y su factura
+
+        data, queries = self._dashboard()
+
+        self.assertEqual(queries, 1)
+        self.assertEqual(
+            (data['total_invoices'], data['total_sum'], data['total_customers'], data['total_readings']),
+            (2, 35.0, 2, 2),
+        )
+        self.assertTrue(all(data['exact'].values()))
+
+    def test_missing_counter_is_estimated_only_when_allowed(self):
+        DashboardCounter.objects.filter(name='readings').delete()
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE agua_reading")
+
+        data, _ = self._dashboard(approximate=1)
+        self.assertFalse(data['exact']['total_readings'])
+        self.assertTrue(data['exact']['total_invoices'])
+
+        data, _ = self._dashboard()
+        self.assertEqual((data['total_readings'], data['exact']['total_readings']), (3, True))
+
+        counters.refresh()
+        self.assertEqual(counters.read(['readings'])['readings'], counters.Figure(3, True))
+        self.assertEqual(DashboardCounter.objects.filter(name='readings').count(), counters.SHARDS)
+
+    def test_each_session_writes_its_own_shard(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_backend_pid() %% %s", [counters.SHARDS])
+            shard, = cursor.fetchone()
+
+        before = dict(DashboardCounter.objects.filter(name='readings').values_list('shard', 'value'))
+        Reading.objects.create(customer=self.customers[0], reading_date=date(2024, 2, 1), current_reading=20)
+        after = dict(DashboardCounter.objects.filter(name='readings').values_list('shard', 'value'))
+
+        self.assertEqual(after, {**before, shard: before[shard] + 1})
+        self.assertEqual(counters.read(['readings'])['readings'], counters.Figure(4, True))
+
+    def test_counter_missing_a_shard_is_recomputed(self):
+        DashboardCounter.objects.filter(name='invoices', shard=3).delete()
+
+        data, _ = self._dashboard()
+        self.assertEqual((data['total_invoices'], data['exact']['total_invoices']), (3, True))
+
+
+class CatalogCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email="catalogos@example.com", password="x")
+        cls.zona = Zona.objects.create(name="Centro")
+        Calle.objects.create(name="Calle 1", zona=cls.zona)
+        PaymentMethod.objects.create(description="Efectivo")
+        Company.objects.create(name="Junta", ruc="20123456789")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _bootstrap(self, **headers):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get('/api/bootstrap/', headers=headers)
+        return response, len(captured)
+
+    def test_payload_is_cached_until_a_catalog_changes(self):
+        response, _ = self._bootstrap()
+        data = json.loads(response.content)
+        self.assertEqual(data['calles'][0]['zona']['name'], "Centro")
+        self.assertEqual(data['company']['name'], "Junta")
+
+        again, queries = self._bootstrap()
+        self.assertEqual(queries, 1)  # Solo la versión
+        self.assertEqual(again['ETag'], response['ETag'])
+
+        not_modified, _ = self._bootstrap(**{'If-None-Match': response['ETag']})
+        self.assertEqual(not_modified.status_code, 304)
+
+        self.zona.name = "Norte"
+        self.zona.save()
+
+        changed, _ = self._bootstrap(**{'If-None-Match': response['ETag']})
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(json.loads(changed.content)['zonas'][0]['name'], "Norte")
+
+    def test_version_bumped_by_another_process_reloads(self):
+        catalogs.snapshot()
+        # Otro proceso guardó un catálogo: solo cambia la versión común, no la caché de este proceso
+        PaymentMethod.objects.filter(description="Efectivo").update(description="Yape")
+        Sequence.reserve(catalogs.CATALOGS)
+
+        self.assertEqual(catalogs.snapshot().version, catalogs.current_version())
+        self.assertIn("Yape", catalogs.snapshot().payload.decode('utf-8'))
+        self.assertEqual(catalogs.company().ruc, "20123456789")
+
+    def test_company_is_cached_without_loading_the_catalogs(self):
+        catalogs.invalidate()
+
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(catalogs.company().ruc, "20123456789")
+        self.assertEqual(len(captured), 2)  # La versión y la empresa
+
+        with self.assertNumQueries(1):
+            self.assertEqual(catalogs.company().name, "Junta")
+
+        Company.objects.update(name="Junta de agua")
+        Sequence.reserve(catalogs.CATALOGS)
+        self.assertEqual(catalogs.company().name, "Junta de agua")
+
+
+class ReadingBulkTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+
+        cls.customers = make_customers(2, make_calles(), make_tariffs())
+        Reading.objects.create(customer=cls.customers[0], reading_date=date(2024, 1, 10), current_reading=100)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def _post(self, rows):
+        return self.client.post('/api/reading/bulk/', [
+            {'customer': customer, 'reading_date': day.isoformat(), 'current_reading': value}
+            for customer, day, value in rows
+        ], format='json')
+
+    def test_route_is_created_in_order(self):
+        first, second = self.customers
+        response = self._post([
+            (first.id, date(2024, 3, 10), 130),  # Fuera de orden: se procesa después de febrero
+            (first.id, date(2024, 2, 10), 112),
+            (second.id, date(2024, 2, 10), 8),
+        ])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 3)
+
+        march = Reading.objects.get(customer=first, reading_date=date(2024, 3, 10))
+        self.assertEqual((march.previous_reading, march.consumption), (112, 18))
+        self.assertEqual(Reading.objects.filter(customer=second).get().consumption, 8)
+        self.assertEqual(CustomerDebt.objects.get(customer=first).unpaid_months, 3)
+
+    def test_invalid_rows_reject_the_whole_batch(self):
+        first, second = self.customers
+        response = self._post([
+            (second.id, date(2024, 2, 10), 8),  # Válida
+            (first.id, date(2024, 1, 20), 105),  # Mes duplicado
+            (first.id, date(2024, 2, 10), 112),  # Depende de la rechazada: no se informa
+            (second.id, date(2024, 4, 10), 20),  # Salta marzo
+            (9999, date(2024, 2, 10), 5),  # Cliente inexistente
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['created'], 0)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 3, 4])
+        self.assertIn("mismo mes", response.data['errors'][0]['errors'][0])
+        self.assertIn("mes consecutivo", response.data['errors'][1]['errors'][0])
+        self.assertEqual(response.data['errors'][2]['errors'], ["El cliente no existe."])
+        self.assertEqual(Reading.objects.count(), 1)
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+
+        customers = make_customers(3, make_calles(), make_tariffs())
+        # Varias lecturas por fecha: el id desempata en los bordes de página
+        for month in range(1, 4):
+            for customer in customers:
+                Reading.objects.create(customer=customer, reading_date=date(2024, month, 10), current_reading=month * 10)
+
+        cls.expected = list(Reading.objects.order_by('reading_date', 'id').values_list('id', flat=True))
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def _walk(self, url, params, link):
+        ids = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids.append([row['id'] for row in response.data['results']])
+            if not response.data[link]:
+                return ids, response
+            response = self.client.get(response.data[link])
+
+    def test_forward_and_back(self):
+        pages, last = self._walk('/api/reading/', {'cursor': '', 'page_size': 2}, 'next')
+
+        self.assertEqual([row for page in pages for row in page], self.expected)
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 2, 1])
+        self.assertIsNone(last.data['next'])
+
+        back, first = self._walk(last.data['previous'], {}, 'previous')
+        self.assertEqual(back, pages[-2::-1])
+        self.assertIsNone(first.data['previous'])
+
+    def test_tampered_cursor_is_not_found(self):
+        for cursor in [
+            {'v': ['x'], 'r': False},  # Falta el id
+            {'v': ['x', 1], 'r': False},  # Fecha inválida
+            {'v': ['2024-01-10', 'x'], 'r': False},  # Id inválido
+            {'v': [None, 1], 'r': True},
+            {'v': '2024-01-10', 'r': False},
+            {'r': False},
+        ]:
+            token = urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+            response = self.client.get('/api/reading/', {'cursor': token})
+            self.assertEqual(response.status_code, 404, cursor)
+
+        self.assertEqual(self.client.get('/api/reading/', {'cursor': '%%%'}).status_code, 404)
+
+
+class MassPrintTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+
+        cls.calle, = make_calles()
+        for customer in make_customers(3, [cls.calle], make_tariffs()):
+            Reading.objects.create(customer=customer, reading_date=date.today(), current_reading=10)
+
+        cls.period = date.today()
+
+    def test_single_pdf(self):
+        with tempfile.TemporaryDirectory() as directory:
+            target = os.path.join(directory, "recibos.pdf")
+            printed = printing.mass_print(self.period, target, workers=1, chunk_size=1)
+
+            self.assertEqual(printed, printing.Printed(3, 'pdf'))
+            self.assertEqual(len(PdfReader(target).pages), 3)
+
+    def test_large_run_goes_to_zip_in_parts(self):
+        with tempfile.TemporaryDirectory() as directory:
+            target = os.path.join(directory, "recibos.pdf")
+            printed = printing.mass_print(self.period, target, workers=1, chunk_size=1, max_merged=2)
+
+            self.assertEqual(printed, printing.Printed(3, 'zip'))
+            with zipfile.ZipFile(target) as archive:
+                names = archive.namelist()
+                pages = [len(PdfReader(io.BytesIO(archive.read(name))).pages) for name in names]
+
+        prefix = f"recibos_{self.calle.codigo}_{self.calle.name}"
+        self.assertEqual(names, [f"{prefix}_parte1.pdf", f"{prefix}_parte2.pdf"])
+        self.assertEqual(pages, [2, 1])
+
+
+@override_settings(REPORT_JOBS_DIR=tempfile.mkdtemp())
+class ReportJobTests(TestCase):
+
+    def _build(self, content):
+        def build(kind, params, target, progress):
+            progress(50)
+            with open(target, 'w') as file:
+                file.write(content)
+            return f"{content}.pdf"
+        return build
+
+    def test_stale_owner_does_not_overwrite_the_new_claim(self):
+        jobs.enqueue('debts', {'months': 1})
+        first = jobs.claim()
+
+        def reclaimed(kind, params, target, progress):
+            # El primer proceso se demora más que STALE_AFTER sin latido y otro lo toma
+            ReportJob.objects.filter(pk=first.pk).update(updated_at=now() - jobs.STALE_AFTER * 2)
+            self.second = jobs.claim()
+            return self._build("primero")(kind, params, target, progress)
+
+        with patch.object(jobs, 'build', reclaimed):
+            jobs.run(first)
+
+        job = ReportJob.objects.get()
+        self.assertEqual(self.second.pk, first.pk)
+        self.assertEqual((job.status, job.progress, job.file_path), (ReportJob.RUNNING, 0, None))
+        self.assertEqual(os.listdir(settings.REPORT_JOBS_DIR), [])  # Se descartó su archivo
+
+        with patch.object(jobs, 'build', self._build("segundo")):
+            jobs.run(self.second)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress, job.filename), (ReportJob.DONE, 100, "segundo.pdf"))
+
+    def test_heartbeat_touches_the_job_while_it_runs(self):
+        jobs.enqueue('debts', {'months': 1})
+        job = jobs.claim()
+        ReportJob.objects.filter(pk=job.pk).update(updated_at=now() - timedelta(minutes=10))
+
+        stopped = threading.Event()
+        calls = []
+
+        def wait(timeout):
+            calls.append(timeout)
+            return len(calls) > 1  # Un latido y termina
+
+        stopped.wait = wait
+        with patch.object(jobs.connection, 'close'):  # Mismo hilo: no cerrar la conexión del test
+            jobs._heartbeat(job, stopped)
+
+        self.assertEqual(calls, [jobs.HEARTBEAT_EVERY.total_seconds()] * 2)
+        self.assertGreater(ReportJob.objects.get().updated_at, now() - timedelta(minutes=1))
+
+
+@override_settings(PDF_CACHE_DIR=tempfile.mkdtemp())
+class PdfCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tariff, = make_tariffs()
+        cls.customer, = make_customers(1, make_calles(), [cls.tariff])
+        cls.reading = Reading.objects.create(customer=cls.customer, reading_date=date(2024, 1, 10), current_reading=10)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def _etag(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        response = self.client.get(f'/api/recibo/pdf/{self.reading.id}', **headers)
+        return response.status_code, response['ETag']
+
+    def test_key_follows_customer_and_tariff_changes(self):
+        _, etag = self._etag()
+        self.assertEqual(self._etag(etag), (304, etag))
+
+        # Sin pasar por las señales (otro proceso, QuerySet.update): la clave cambia igual
+        Customer.objects.filter(pk=self.customer.id).update(full_name="Otro nombre")
+        status, renamed = self._etag(etag)
+        self.assertEqual(status, 200)
+        self.assertNotEqual(renamed, etag)
+
+        Tariff.objects.filter(pk=self.tariff.id).update(price_water=5)
+        catalogs.invalidate()
+        status, repriced = self._etag(renamed)
+        self.assertEqual(status, 200)
+        self.assertNotEqual(repriced, renamed)
+
+    def test_evict_runs_after_enough_bytes(self):
+        with patch.object(pdfcache, 'evict') as evict, patch.object(pdfcache, '_written', 0):
+            with override_settings(PDF_CACHE_EVICT_EVERY=10 ** 9):
+                self._etag()
+                Customer.objects.filter(pk=self.customer.id).update(full_name="Otro nombre")
+                self._etag()
+            evict.assert_not_called()
+
+            with override_settings(PDF_CACHE_EVICT_EVERY=1):
+                Customer.objects.filter(pk=self.customer.id).update(full_name="Tercer nombre")
+                self._etag()
+            evict.assert_called_once_with()
+
+
+class UrlFetcherTests(TestCase):
+
+    def test_only_static_media_and_data_urls(self):
+        stylesheet = rendering.url_fetcher('file:///static/css/invoice_style.css')
+        self.assertEqual(stylesheet['mime_type'], 'text/css')
+        rendering.url_fetcher('data:text/plain;base64,eA==')
+
+        for url in [
+            'file:///etc/passwd',
+            '/etc/passwd',
+            'file:///media/../../../etc/passwd',
+            '/static/../../../etc/passwd',
+            'http://example.com/logo.png',
+        ]:
+            with self.assertRaises(ValueError, msg=url):
+                rendering.url_fetcher(url)
+
+
+class ReceiptContextTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.calle, = make_calles()
+        cls.customers = make_customers(3, [cls.calle], make_tariffs())
+        cls.readings = {
+            (customer.id, month): Reading.objects.create(
+                customer=customer, reading_date=date(2024, month, 1), current_reading=month * 10
+            )
+            for customer in cls.customers
+            for month in (1, 2, 3)
+        }
+
+    def contexts(self, customers):
+        readings = Reading.objects.filter(customer__in=customers, reading_date=date(2024, 3, 1)).order_by('customer_id')
+        with CaptureQueriesContext(connection) as captured:
+            contexts = receipts.receipt_contexts(readings, None, None)
+        return contexts, len(captured)
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        _, one = self.contexts(self.customers[:1])
+        contexts, three = self.contexts(self.customers)
+
+        self.assertEqual(len(contexts), 3)
+        self.assertEqual(one, three)
+
+    def test_previous_reading_and_arrears_per_customer(self):
+        contexts, _ = self.contexts(self.customers)
+
+        for customer, context in zip(self.customers, contexts):
+            january, february = self.readings[customer.id, 1], self.readings[customer.id, 2]
+            self.assertEqual(context['previous_reading'], february)
+            # Solo enero vence (1 de febrero) antes de la lectura de marzo
+            self.assertEqual(context['unpaid_readings'], [january])
+            self.assertEqual(context['total_due'], january.total_amount)
+
+
+class RenderingCacheTests(TestCase):
+
+    def setUp(self):
+        rendering.clear()
+        self.addCleanup(rendering.clear)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, content, mtime):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        os.utime(path, ns=(mtime, mtime))
+        return path
+
+    def test_stylesheet_is_parsed_again_only_when_the_file_changes(self):
+        path = self.write('recibo.css', 'body { color: black }', 10 ** 18)
+
+        with patch.object(rendering, 'CSS') as css:
+            self.assertIs(rendering.stylesheet(path), rendering.stylesheet(path))
+            self.assertEqual(css.call_count, 1)
+
+            self.write('recibo.css', 'body { color: red }', 2 * 10 ** 18)
+            rendering.stylesheet(path)
+            self.assertEqual(css.call_count, 2)
+
+    def test_template_is_compiled_again_only_when_the_file_changes(self):
+        self.write('recibo.html', 'Hola {{ nombre }}', 10 ** 18)
+        templates = [{**settings.TEMPLATES[0], 'DIRS': [self.directory]}]
+
+        with override_settings(TEMPLATES=templates):
+            compiled = rendering.template('recibo.html')
+            self.assertIs(rendering.template('recibo.html'), compiled)
+            self.assertEqual(rendering.render_template('recibo.html', {'nombre': 'Ana'}), 'Hola Ana')
+
+            self.write('recibo.html', 'Adiós {{ nombre }}', 2 * 10 ** 18)
+            self.assertEqual(rendering.render_template('recibo.html', {'nombre': 'Ana'}), 'Adiós Ana')
+
+
+class TariffTableTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tariff, = make_tariffs()
+
+    def setUp(self):
+        self.client = APIClient()
+        # El rollback de cada test devuelve la serie TARIFFS a un número que la tabla ya vio
+        tariffs.invalidate()
+
+    def test_table_follows_changes_from_other_processes(self):
+        self.assertEqual(tariffs.price(self.tariff.id, 10).total_water, 10)
+
+        # Otro proceso cambió el precio: solo se entera por la versión común
+        Tariff.objects.filter(pk=self.tariff.id).update(price_water=2)
+        Sequence.reserve(tariffs.TARIFFS)
+
+        with CaptureQueriesContext(connection) as captured:
+            charges = tariffs.price_batch([(self.tariff.id, 10)] * 50)
+
+        self.assertEqual(charges[0].total_water, 20)
+        self.assertEqual(len(captured), 2)  # La versión una vez por lote y la tabla recompilada
+
+    def test_price_does_not_query_until_the_version_expires(self):
+        tariffs.refresh()
+
+        with CaptureQueriesContext(connection) as captured:
+            for consumption in range(10):
+                tariffs.price(self.tariff.id, consumption)
+        self.assertEqual(len(captured), 0)
+
+        # Otro proceso cambió el precio: se ve en el próximo request (o pasado VERSION_TTL)
+        Tariff.objects.filter(pk=self.tariff.id).update(price_water=2)
+        Sequence.reserve(tariffs.TARIFFS)
+        self.assertEqual(tariffs.price(self.tariff.id, 10).total_water, 10)
+
+        self.client.get('/api/zona/')  # request_started
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(tariffs.price(self.tariff.id, 10).total_water, 20)
+            self.assertEqual(tariffs.price(self.tariff.id, 5).total_water, 10)
+        self.assertEqual(len(captured), 2)  # La versión y la tabla recompilada, una vez
+
+
+class BillingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.calle, = make_calles()
+        cls.tariff, = make_tariffs()
+        cls.customers = make_customers(2, [cls.calle], [cls.tariff])
+
+    def test_billing_marks_readings_covered_by_the_new_total(self):
+        period = date(2024, 3, 1)
+        for customer, paid in zip(self.customers, (10, 1)):
+            reading = Reading.objects.create(customer=customer, reading_date=period.replace(day=10), current_reading=10)
+            Reading.objects.filter(pk=reading.pk).update(amount_paid=paid)
+
+        # La tarifa baja: el pago parcial del primero ya cubre el recibo recalculado
+        self.tariff.price_water = 0
+        self.tariff.price_sewer = 0
+        self.tariff.save()
+
+        self.assertEqual(billing.bill_calle(self.calle.id, period)['updated'], 2)
+        self.assertEqual(
+            list(Reading.objects.order_by('customer_id').values_list('total_amount', 'is_paid')),
+            [(2, True), (2, False)],
+        )
+
+    def test_billing_locks_the_period_readings(self):
+        # Un pago concurrente (Reading.apply_payments) espera al final de la facturación de la calle
+        period = date(2024, 3, 1)
+        for customer in self.customers:
+            Reading.objects.create(customer=customer, reading_date=period.replace(day=10), current_reading=10)
+
+        with CaptureQueriesContext(connection) as captured:
+            billing.bill_calle(self.calle.id, period)
+
+        selects = [query['sql'] for query in captured if query['sql'].startswith('SELECT "agua_reading"')]
+        self.assertTrue(selects[0].endswith('FOR UPDATE OF "agua_reading"'), selects[0])
+
+    def test_interrupted_calle_is_rolled_back_and_resumed(self):
+        period = date(2024, 3, 1)
+
+        # La corrida muere a mitad de la calle: no queda ni la lectura ni el punto de control
+        with patch.object(billing, 'refresh_customer_debts', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                billing.bill_calle(self.calle.id, period)
+
+        self.assertFalse(Reading.objects.exists())
+        self.assertFalse(BillingCheckpoint.objects.exists())
+
+        # Al reanudar la calle se factura completa, y una vez
+        self.assertEqual(billing.bill_calle(self.calle.id, period)['created'], 2)
+        self.assertIsNone(billing.bill_calle(self.calle.id, period))
+        self.assertEqual(Reading.objects.filter(reading_date=period).count(), 2)
+        self.assertEqual(
+            BillingCheckpoint.objects.values_list('calle_id', 'readings_created').get(period=period),
+            (self.calle.id, 2),
+        )
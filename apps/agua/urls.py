@@ -1,6 +1,6 @@
 from rest_framework import routers
 from django.urls import path
-from .views import CompanyViewSet, YearViewSet, TotalDashboard, FinancialSummaryAPIView, PDFRecibosPorCalleApiView, DebtReportViewSet, CashViewSet, PaymentMethodViewSet, CustomerViewSet, ReadingViewSet, InvoiceViewSet, CategoryViewSet, ZonaViewSet, CalleViewSet, PDFGeneratorAPIView, PDFReciboApiView, CustomerUnpaidInvoicesView, ServiceViewSet, TariffViewSet
+from .views import CompanyViewSet, YearViewSet, TotalDashboard, FinancialSummaryAPIView, FinancialSeriesAPIView, PDFRecibosPorCalleApiView, DebtReportViewSet, CashViewSet, PaymentMethodViewSet, CustomerViewSet, ReadingViewSet, InvoiceViewSet, CategoryViewSet, ZonaViewSet, CalleViewSet, PDFGeneratorAPIView, PDFReciboApiView, CustomerUnpaidInvoicesView, ServiceViewSet, TariffViewSet, ReportJobViewSet, ProfileListView, ProfileDownloadView, BootstrapView
 
 router = routers.DefaultRouter()
 
@@ -16,6 +16,7 @@ router.register("service", ServiceViewSet)
 router.register("tariff", TariffViewSet)
 router.register("cash", CashViewSet)
 router.register("payment-method", PaymentMethodViewSet)
+router.register("jobs", ReportJobViewSet)
 
 urlpatterns = [
  path('customer/<str:dni>/unpaid-invoices/', CustomerUnpaidInvoicesView.as_view(), name='customer-unpaid-invoices'),
@@ -24,6 +25,10 @@ urlpatterns = [
  path('debt-reports/', DebtReportViewSet.as_view()),
  path('receipts/by-address/<int:pk>/<str:periodo>', PDFRecibosPorCalleApiView.as_view()),
  path("financial-summary/", FinancialSummaryAPIView.as_view(), name="financial-summary"),
+ path("financial-series/", FinancialSeriesAPIView.as_view(), name="financial-series"),
  path("invoices/summary/", TotalDashboard.as_view(), name="invoices-summary"),
+ path("bootstrap/", BootstrapView.as_view(), name="bootstrap"),
+ path("profiles/", ProfileListView.as_view(), name="profiles"),
+ path("profiles/<str:profile_id>/<str:kind>", ProfileDownloadView.as_view(), name="profile-download"),
 
 ] + router.urls
\ No newline at end of file
@@ -9,3 +9,11 @@ def next_month_date(date_obj):
         year += 1
     # Si tus lecturas siempre se guardan con day=1, puedes forzarlo a 1:
     return datetime.date(year, month, 1)
+
+def init_worker():
+    """Inicializador de los procesos de un pool (billing_run, impresión masiva): configura Django si hace falta."""
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
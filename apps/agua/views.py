@@ -1,25 +1,36 @@
 from django.shortcuts import render, get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from django.template.loader import render_to_string, get_template
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseNotModified, FileResponse, StreamingHttpResponse
 from django.conf import settings
+from django.urls import reverse
 from django.utils.timezone import now
-from django.db.models import Sum, Q, Count
+from django.db.models import Sum, Count, F, Value, DecimalField
+from django.db.models.functions import Coalesce
 from dateutil.relativedelta import relativedelta
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
-from rest_framework import filters, status
+from rest_framework import filters, mixins, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.exceptions import ValidationError
 
-from .models import Year, Category, Zona, Calle, Expense, Reading, Cash, Invoice, PaymentMethod, Customer, InvoicePayment, Company, InvoiceReading, Service, Tariff, InvoiceService
-
-from .serializers import CompanySerializer, YearSerializer, CashSerializer, PaymentMethodSerializer, CustomerSerializer, ReadingWriteSerializer, ReadingReadSerializer, InvoiceSerializer, CategorySerializer, ZonaSerializer, CalleSerializer, ServiceSerializer, TariffSerializer
-from datetime import datetime
-from weasyprint import HTML, CSS
+from .models import Year, Category, Zona, Calle, Expense, Reading, Cash, Invoice, PaymentMethod, Customer, InvoicePayment, Company, InvoiceReading, Service, Tariff, CustomerDebt, ReportJob, FinancialRollup
+
+from .serializers import CompanySerializer, YearSerializer, CashSerializer, PaymentMethodSerializer, CustomerSerializer, ReadingWriteSerializer, ReadingReadSerializer, ReadingBulkItemSerializer, InvoiceSerializer, CategorySerializer, ZonaSerializer, CalleSerializer, ServiceSerializer, TariffSerializer, ReportJobSerializer
+from .pagination import CustomPagination, KeysetPagination, PageOrKeysetPagination
+from .readings import bulk_create_readings
+from .payments import post_invoice
+from .utils import next_month_date
+from .receipts import receipt_context, receipt_contexts
+from .datasets import DATASETS, ReportError, debts as debts_dataset
+from .reports import build as build_report
+from . import exports
+from .jobs import enqueue
+from . import catalogs, counters, pdfcache, profiling, rendering
+from collections import defaultdict
+from datetime import date, datetime
 from io import BytesIO
 from decimal import Decimal
 
@@ -27,17 +38,58 @@ from decimal import Decimal
 import os
 import tempfile
 
+def report_params(request):
+    """Parámetros del reporte: el query string sin `async`."""
+    return {key: value for key, value in request.query_params.items() if key != 'async'}
+
+def report_response(request, kind, params):
+    """
+    Genera el reporte `kind` dentro del request o, con ?async=1, lo encola
+    y devuelve el trabajo para consultar su estado en /api/jobs/<id>/.
+    Con ?output=csv o ?output=xlsx exporta las filas en lugar del PDF.
+    """
+    output = params.get('output', 'pdf')
+
+    if output not in ('pdf',) + exports.FORMATS:
+        return Response({'error': 'output debe ser pdf, csv o xlsx'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if request.query_params.get('async') in ('1', 'true'):
+        job, created = enqueue(kind, params)
+        serializer = ReportJobSerializer(job, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK)
+
+    try:
+
+        if output == 'csv':
+            # Se envía fila por fila mientras se lee la consulta
+            dataset = DATASETS[kind](params)
+            response = StreamingHttpResponse(exports.csv_lines(dataset), content_type=exports.CONTENT_TYPES['csv'])
+            response['Content-Disposition'] = f'attachment; filename="{exports.filename(dataset, output)}"'
+            return response
+
+        if output == 'xlsx':
+            dataset = DATASETS[kind](params)
+            xlsx_file = tempfile.TemporaryFile()
+            exports.write_xlsx(dataset, xlsx_file)
+            xlsx_file.seek(0)
+            return FileResponse(xlsx_file, as_attachment=True, filename=exports.filename(dataset, output),
+                                content_type=exports.CONTENT_TYPES['xlsx'])
+
+        pdf_buffer = BytesIO()
+        filename = build_report(kind, params, pdf_buffer)
+
+    except ReportError as exc:
+        return Response({'error': exc.args[0]}, status=status.HTTP_400_BAD_REQUEST)
+
+    response = HttpResponse(pdf_buffer.getvalue(), content_type='application/pdf')
+    response['Content-Disposition'] = f'inline; filename="{filename}"'
+    return response
+
 class CompanyViewSet(ModelViewSet):
 
     queryset = Company.objects.all()
     serializer_class = CompanySerializer
 
-class CustomPagination(PageNumberPagination):
-
-    page_size = 5  # Número de registros por página
-    page_size_query_param = 'page_size'  # Permite cambiar el tamaño desde la URL
-    max_page_size = 100  # Tamaño máximo permitido
-
 class YearViewSet(ModelViewSet):
 
     queryset = Year.objects.all().order_by('-id')
@@ -52,7 +104,8 @@ class CustomerViewSet(ModelViewSet):
 
     queryset = Customer.objects.all().order_by('-id')
     serializer_class = CustomerSerializer
-    pagination_class = CustomPagination
+    pagination_class = PageOrKeysetPagination
+    keyset_ordering = ('-id',)
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
 
     # Búsqueda exacta para DNI y Meter Code
@@ -66,22 +119,14 @@ class CustomerViewSet(ModelViewSet):
         queryset = super().get_queryset()  # Usa el queryset definido arriba
         debt_status = self.request.query_params.get('debt_status')
 
-        if debt_status == "overdue":  # 📌 Deuda vencida
-            queryset = queryset.filter(
-                readings__due_date__lt=now().date(),
-                readings__is_paid=False
-            ).distinct()
-
-        elif debt_status == "pending":  # 📌 Deuda pendiente pero no vencida
-            queryset = queryset.filter(
-                readings__due_date__gte=now().date(),
-                readings__is_paid=False
-            ).distinct()
-
-        elif debt_status == "clear":  # 📌 Sin deuda
-            queryset = queryset.exclude(
-                readings__is_paid=False  # Filtra solo los que tienen todas sus lecturas pagadas
-            )
+        if self.action in ('list', 'retrieve'):
+            # Modo por lotes: joins y estado de deuda anotado, sin consultas por cliente
+            queryset = CustomerSerializer.setup_eager_loading(queryset)
+
+        # Del resumen por cliente (CustomerDebt), sin recorrer lecturas, con el mismo criterio que
+        # el debt_status mostrado: un vencimiento pasado cuenta aunque aún no haya corrido debt_rollover
+        if debt_status in (CustomerDebt.OVERDUE, CustomerDebt.PENDING, CustomerDebt.CLEAR):
+            queryset = queryset.filter(CustomerDebt.status_filter(debt_status, now().date(), 'debt__'))
 
         return queryset
 
@@ -90,70 +135,7 @@ class CustomerViewSet(ModelViewSet):
         """
         Nuevo reporte de saldos (pagado/adeudado) por cliente
         """
-        today = now().date()
-        
-        # 1. Obtener todos los clientes con lecturas
-        customers = Customer.objects.annotate(
-            total_paid=Sum('readings__total_amount', 
-                          filter=Q(readings__is_paid=True)),
-            total_pending=Sum('readings__total_amount',
-                            filter=Q(readings__is_paid=False) & 
-                                   Q(readings__due_date__gte=today)),
-            total_overdue=Sum('readings__total_amount',
-                            filter=Q(readings__is_paid=False) & 
-                                   Q(readings__due_date__lt=today))
-        ).exclude(
-            total_paid__isnull=True,
-            total_pending__isnull=True,
-            total_overdue__isnull=True
-        ).order_by('full_name')
-        
-        # 2. Preparar datos para el reporte
-        report_data = []
-        for customer in customers:
-            report_data.append({
-                'id': customer.id,
-                'full_name': customer.full_name,
-                'number': customer.number,
-                'meter_code': customer.meter_code,
-                'address': customer.address,
-                'paid': customer.total_paid or 0,
-                'pending': customer.total_pending or 0,
-                'overdue': customer.total_overdue or 0,
-                'total_debt': (customer.total_pending or 0) + 
-                              (customer.total_overdue or 0)
-            })
-        
-        # 3. Totales generales
-        totals = {
-            'paid': sum(c['paid'] for c in report_data),
-            'pending': sum(c['pending'] for c in report_data),
-            'overdue': sum(c['overdue'] for c in report_data),
-            'total_debt': sum(c['total_debt'] for c in report_data),
-            'customer_count': len(report_data)
-        }
-        
-        # 4. Contexto para el template
-        context = {
-            'customers': report_data,
-            'totals': totals,
-            'report_date': today.strftime("%d/%m/%Y"),
-            'title': "Reporte de Saldos de Clientes con Lecturas"
-        }
-        
-        # 5. Generar PDF (similar a tu implementación actual)
-        template = get_template('reports/customer_balances.html')
-        html_string = template.render(context)
-        
-        pdf_buffer = BytesIO()
-        HTML(string=html_string).write_pdf(pdf_buffer)
-        
-        pdf_buffer.seek(0)
-        response = HttpResponse(pdf_buffer, content_type='application/pdf')
-        filename = f"reporte_saldos_clientes_{today.strftime('%Y%m%d')}.pdf"
-        response['Content-Disposition'] = f'inline; filename="{filename}"'
-        
-        return response
+        return report_response(request, 'balance', report_params(request))
 
     @action(detail=True, methods=['get'])
     def statement(self, request, pk=None):
@@ -168,53 +150,66 @@ class CustomerViewSet(ModelViewSet):
         end_date = datetime.now()
         start_date = end_date - relativedelta(months=months)
 
-        # 2. Obtener todos los pagos del cliente
-        # Primero obtenemos las facturas del cliente
-        invoices = Invoice.objects.filter(
-            customer=customer,
-            date_of_issue__range=[start_date, end_date]
-        )
+        def render(target):
 
-        # Luego obtenemos los pagos de esas facturas
-        payments = InvoicePayment.objects.filter(
-            invoice__in=invoices,
-            invoice__date_of_issue__range=[start_date, end_date]
-        ).order_by('invoice__date_of_issue')
+            # 2. Obtener todos los pagos del cliente
+            # Primero obtenemos las facturas del cliente
+            invoices = Invoice.objects.filter(
+                customer=customer,
+                date_of_issue__range=[start_date, end_date]
+            )
 
-        # 3. Generar historial combinado
-        total_paid = payments.aggregate(total=Sum('total'))['total'] or 0
-        
-        # 5. Generar PDF
-        context = {
-            'customer': customer,
-            'payments' : payments,
-            'period': f"{start_date.strftime('%d/%m/%Y')} - {end_date.strftime('%d/%m/%Y')}",
-            'title': f"Estado de Cuenta - {customer.full_name}",
-            'total_paid': total_paid,
-        }
-        
-        html_string = render_to_string('reports/account_statement.html', context)
-        pdf = HTML(string=html_string).write_pdf()
-        
-        response = HttpResponse(pdf, content_type='application/pdf')
-        filename = f"estado_cuenta_{customer.number}_{datetime.now().strftime('%Y%m%d')}.pdf"
-        response['Content-Disposition'] = f'inline; filename="{filename}"'
-        return response
+            # Luego obtenemos los pagos de esas facturas
+            payments = InvoicePayment.objects.filter(
+                invoice__in=invoices,
+                invoice__date_of_issue__range=[start_date, end_date]
+            ).order_by('invoice__date_of_issue')
+
+            # 3. Generar historial combinado
+            total_paid = payments.aggregate(total=Sum('total'))['total'] or 0
+            
+            # 5. Generar PDF
+            context = {
+                'customer': customer,
+                'payments' : payments,
+                'period': f"{start_date.strftime('%d/%m/%Y')} - {end_date.strftime('%d/%m/%Y')}",
+                'title': f"Estado de Cuenta - {customer.full_name}",
+                'total_paid': total_paid,
+            }
+            
+            html_string = rendering.render_template('reports/account_statement.html', context)
+            rendering.render_pdf(html_string, target)
+
+        # Se reutiliza el PDF del día mientras no cambien los pagos del cliente
+        return pdfcache.cached_pdf_response(
+            request,
+            customer.id,
+            'estado-cuenta',
+            [customer.id, months, end_date.date(), pdfcache.customer_version(customer)],
+            render,
+            f"estado_cuenta_{customer.number}_{end_date.strftime('%Y%m%d')}.pdf",
+            templates=['reports/account_statement.html'],
+        )
    
 class ReadingViewSet(ModelViewSet):
 
     queryset = Reading.objects.all().order_by('reading_date')
+    pagination_class = KeysetPagination  # Solo pagina si se envía ?cursor=
+    keyset_ordering = ('reading_date', 'id')
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['customer','is_paid','customer__meter_code']
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return ReadingWriteSerializer
+        if self.action == 'bulk':
+            return ReadingBulkItemSerializer
         return ReadingReadSerializer
 
     def get_queryset(self):
 
-        queryset = super().get_queryset()
+        # El cliente va en cada fila de ReadingReadSerializer
+        queryset = super().get_queryset().select_related('customer')
         year = self.request.query_params.get('year')
 
         if year:
@@ -241,6 +236,33 @@ class ReadingViewSet(ModelViewSet):
 
         return queryset
     
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Carga masiva de lecturas (por ejemplo, una calle completa).
+        Si alguna fila no es válida no se guarda ninguna y se devuelve el detalle por fila.
+        """
+        serializer = self.get_serializer(data=request.data, many=True)
+
+        if not serializer.is_valid():
+
+            if isinstance(serializer.errors, dict):  # No se envió una lista
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+            errors = [
+                {'index': index, 'errors': row_errors}
+                for index, row_errors in enumerate(serializer.errors) if row_errors
+            ]
+            return Response({'created': 0, 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        readings, errors = bulk_create_readings(serializer.validated_data)
+
+        if errors:
+
+            return Response({'created': 0, 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'created': len(readings), 'errors': []}, status=status.HTTP_201_CREATED)
+
     @action(detail=False, methods=['get'], url_path='dni/(?P<dni>\w+)')
     def get_by_dni(self, request, dni=None):
         
@@ -275,69 +297,8 @@ class ReadingViewSet(ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def pdf(self, request):
-        # Obtener queryset base
-        queryset = self.filter_queryset(self.get_queryset())
-        
-        # Aplicar filtro por año si existe
-        year = request.query_params.get('year')
-        if year:
-            queryset = queryset.filter(reading_date__year=year)
-
-        # Manejar el filtro por estado de pago
-        payment_status = request.query_params.get('payment_status')
-        payment_status_text = 'Todos'
-        today = now().date()
-        
-        if payment_status:
-            if payment_status == 'paid':
-                payment_status_text = 'Pagado'
-                queryset = queryset.filter(is_paid=True)  
-            elif payment_status == 'pending':
-                payment_status_text = 'Pendiente'
-                queryset = queryset.filter(is_paid=False, due_date__gte=today)
-            elif payment_status == 'overdue':
-                payment_status_text = 'Vencida'
-                queryset = queryset.filter(is_paid=False, due_date__lt=today) 
-        
-        # Optimizar la consulta
-        queryset = queryset.select_related('customer').order_by('reading_date')
-        
-        # Serializar los datos
-        serializer = self.get_serializer(queryset, many=True)
-        serialized_data = serializer.data
-        
-        # Calcular totales
-        total_amount = queryset.aggregate(total=Sum('total_amount'))['total'] or 0
-        total_consumption = queryset.aggregate(total=Sum('consumption'))['total'] or 0
-
-        # Preparar el contexto
-        context = {
-            'readings': serialized_data,  # Usamos los datos serializados
-            'payment_status': payment_status_text,
-            'total_amount': total_amount,
-            'total_consumption': total_consumption,
-            'report_date': datetime.now().strftime("%d/%m/%Y %H:%M"),
-            'title': f"Reporte de Lecturas - Estado: {payment_status_text}",
-        }
-
-        # Generar el PDF
-        template = get_template('reports/reading.html')
-        html_string = template.render(context)
-        
-        pdf_buffer = BytesIO()
-        css_path = os.path.join(settings.BASE_DIR, "static/css/reports/reading.css")
-
-        HTML(string=html_string, base_url=request.build_absolute_uri()).write_pdf(
-            pdf_buffer, 
-            stylesheets=[CSS(css_path)]
-        )
-
-        pdf_buffer.seek(0)
-        response = HttpResponse(pdf_buffer.read(), content_type="application/pdf")
-        filename = f"reporte_lecturas_{payment_status or 'todos'}_{datetime.now().strftime('%Y%m%d')}.pdf"
-        response["Content-Disposition"] = f'inline; filename="{filename}"'
-
-        return response
+        # Mismos filtros que el listado: cliente, estado de pago, medidor, año
+        return report_response(request, 'readings', report_params(request))
     
     def destroy(self, request, *args, **kwargs):
 
@@ -361,92 +322,28 @@ class InvoiceViewSet(ModelViewSet):
 
     queryset = Invoice.objects.all().order_by('-id')
     serializer_class = InvoiceSerializer
-    pagination_class = CustomPagination
+    pagination_class = PageOrKeysetPagination
+    keyset_ordering = ('-id',)
 
     def create(self, request, *args, **kwargs):
 
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        
-  
-        payments_data = request.data.pop('readings', [])  # Extraer los pagos
-        services_data = request.data.pop('services', [])  # Extraer los pagos
-        invoice_payment_data = request.data.pop('invoice_payment', None)
-
-  
-        last_invoice = Invoice.objects.order_by('-id').first()
-        next_correlative = f"{(int(last_invoice.correlative) + 1):06d}" if last_invoice and last_invoice.correlative else "000001"
-
-        invoice = Invoice.objects.create(**serializer.validated_data, correlative = next_correlative)  # Crear la factura
-        
-
-        total_invoice_amount = 0  # Variable para acumular el total de la factura
-
-        if request.data['invoice_type'] == 'receipt':
-
-            for payment in payments_data:
-                reading_id = payment.get('reading')
-                amount_paid = Decimal(payment.get('amount_paid'))
-
-                reading = get_object_or_404(Reading, id=reading_id)  # Obtener la lectura
-
-                # Validar que el pago no exceda el monto total de la lectura
-                total_paid = sum(p.amount_paid for p in reading.invoices.all()) + amount_paid
-    
-                if total_paid > reading.total_amount:
-                    return Response(
-                        {"error": f"El total pagado para el Reading {reading.id} excede el monto permitido."}, 
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-
-                # Crear InvoicePayment
-                InvoiceReading.objects.create(
-                    invoice=invoice,
-                    reading=reading,
-                    amount_paid=amount_paid
-                )
-
-                total_invoice_amount += amount_paid  # Sumar el pago al total de la factura
-
-                # Actualizar estado de la lectura
-                reading.is_paid = total_paid >= reading.total_amount
-                reading.save()
-
-        if request.data['invoice_type'] == 'other_charges':
-
-            for service in services_data:
-
-                service_id = service.get('service')
-                quantity = service.get('quantity')
-                price = Decimal(service.get('price'))
-              
-                service = get_object_or_404(Service, id=service_id)
-
-                InvoiceService.objects.create(
-                    invoice=invoice,
-                    quantity=quantity,
-                    service=service,
-                    amount_paid=price
-                )
 
-                total_invoice_amount += price
-
-        # Guardar el total de la factura
-        invoice.total_amount = total_invoice_amount
-        invoice.save()
-
-        if invoice_payment_data:
+        # Factura, líneas, estado de las lecturas y pago en una sola transacción
+        invoice, errors = post_invoice(
+            serializer.validated_data,
+            readings=request.data.get('readings') or [],
+            services=request.data.get('services') or [],
+            payment=request.data.get('invoice_payment'),
+        )
 
-           payment_method_id = invoice_payment_data.get('payment_method')
-           cash_id = invoice_payment_data.get('cash')
-           total = Decimal(invoice_payment_data.get('total'))
+        if errors:
 
-           InvoicePayment.objects.create(
-               invoice=invoice,
-               payment_method_id=payment_method_id,
-               cash_id=cash_id,
-               total=total
-           )
+            return Response(
+                {'error': errors[0]['errors'][0], 'errors': errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
         return Response(InvoiceSerializer(invoice).data, status=status.HTTP_201_CREATED)
 
@@ -480,17 +377,17 @@ class CashViewSet(ModelViewSet):
 
         cash = self.get_object()
 
-        if cash.date_closed:
-           
-           return Respones({'error':'La caja ya esta cerrada'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        total = InvoicePayment.objects.filter(cash=cash).aggregate(total=Sum('total'))['total'] or 0
+        # Cash.income ya lleva el total cobrado (CashLedger): se cierra con un UPDATE, sin recorrer los pagos.
+        # El filtro por date_closed evita cerrar dos veces y que un pago concurrente quede fuera del saldo.
+        closed = Cash.objects.filter(pk=cash.pk, date_closed=None).update(
+            final_balance=F('beginning_balance') + Coalesce(F('income'), Value(0), output_field=DecimalField()),
+            date_closed=now(),
+            state=False,
+        )
 
-        cash.income = total
-        cash.final_balance = cash.beginning_balance + total
-        cash.date_closed = now()
-        cash.state = False
-        cash.save()
+        if not closed:
+           
+           return Response({'error':'La caja ya esta cerrada'}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response({'message':'Caja cerrada'})
 
@@ -499,103 +396,8 @@ class CashViewSet(ModelViewSet):
         
         cash = self.get_object()
 
-        report_type = request.GET.get('type', 'daily')  # daily, monthly, custom
-
-        if report_type == 'daily':
-
-            report_date = request.GET.get('date')
-
-            date_obj = datetime.strptime(report_date, '%Y-%m-%d').date()
-            payments = InvoicePayment.objects.filter(
-                cash=cash,
-                invoice__date_of_issue = report_date
-
-            ).select_related('invoice', 'payment_method')
-
-            # Agrupar ingresos por concepto (tipo de pago)
-            income_by_concept = payments.values(
-                'payment_method__description'
-            ).annotate(
-                total=Sum('total')
-            ).order_by('payment_method__description')
-
-            # Calcular totales
-            total_income = payments.aggregate(total=Sum('total'))['total'] or 0
-            calculated_balance = cash.beginning_balance + total_income
-            
-            context = {
-                'payments' : payments,
-                'date': date_obj,
-                'opening_balance': float(cash.beginning_balance),
-                'income_by_concept': list(income_by_concept),
-                'total_income': float(total_income),
-                'calculated_balance': float(calculated_balance),
-                'final_balance': float(cash.final_balance) if cash.final_balance else None,
-                # 'is_closed': cash.state,
-                'reference_number': cash.reference_number,
-            }
-    
-            
-            html_string = render_to_string('reports/daily_balance.html', context)
-            pdf = HTML(string=html_string).write_pdf()
-            
-            response = HttpResponse(pdf, content_type='application/pdf')
-            filename = f"deudas_clientes_{datetime.now().strftime('%Y%m%d')}.pdf"
-            response['Content-Disposition'] = f'inline; filename="{filename}"'
-            return response
-
-        elif report_type == 'range':
-            start_date = request.GET.get('start_date')
-            end_date = request.GET.get('end_date')
-
-         
-            # Validar que ambas fechas existan
-            if not start_date or not end_date:
-                return Response({'error': 'Debe proporcionar start_date y end_date'}, status=400)
-
-            # Convertir a objetos fecha
-            start_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
-            end_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
-
-            # Filtrar los pagos dentro del rango
-            payments = InvoicePayment.objects.filter(
-                cash=cash,
-                invoice__date_of_issue__range=(start_obj, end_obj)
-            ).select_related('invoice', 'payment_method')
-
-            # Agrupar por método de pago
-            income_by_concept = payments.values(
-                'payment_method__description'
-            ).annotate(
-                total=Sum('total')
-            ).order_by('payment_method__description')
-
-            total_income = payments.aggregate(total=Sum('total'))['total'] or 0
-            calculated_balance = cash.beginning_balance + total_income
-
-            # Formateo bonito del rango
-
-            context = {
-                'report_type' : report_type,
-                'payments': payments,
-                'date': start_obj,
-                'end_date': end_obj,
-                'opening_balance': float(cash.beginning_balance),
-                'income_by_concept': list(income_by_concept),
-                'total_income': float(total_income),
-                'calculated_balance': float(calculated_balance),
-                'final_balance': float(cash.final_balance) if cash.final_balance else None,
-                'is_closed': cash.date_closed is not None,
-                'reference_number': cash.reference_number,
-            }
-
-            html_string = render_to_string('reports/daily_balance.html', context)
-            pdf = HTML(string=html_string, base_url=request.build_absolute_uri('/')).write_pdf()
-
-            response = HttpResponse(pdf, content_type='application/pdf')
-            filename = f"reporte_caja_{datetime.now().strftime('%Y%m%d')}.pdf"
-            response['Content-Disposition'] = f'inline; filename="{filename}"'
-            return response
+        # type: daily (date) o range (start_date, end_date)
+        return report_response(request, 'cash', {**report_params(request), 'cash': cash.pk})
 
 class ZonaViewSet(ModelViewSet):
     
@@ -656,60 +458,27 @@ class PDFRecibosPorCalleApiView(APIView):
 
     def get(self, request, pk, periodo, *args, **kwargs):
 
-        company = Company.objects.first()
-        css_path = os.path.join(settings.BASE_DIR, "static/css/invoice_style.css")
-
+        company = catalogs.company()
         calle = Calle.objects.get(pk = pk)
-        periodo_date = datetime.strptime(periodo, "%Y-%m")
-        mes = periodo_date.month
-        anio = periodo_date.year
-        readings = Reading.objects.filter(customer__calle=calle,issue_date__month=mes,issue_date__year=anio)
+        periodo_date = datetime.strptime(periodo, "%Y-%m").date()
+        # Mes de emisión como rango de fechas (usa el índice de issue_date)
+        readings = Reading.objects.filter(customer__calle=calle, issue_date__gte=periodo_date, issue_date__lt=next_month_date(periodo_date))
       
         combined_html = ""
-        template = get_template("agua/invoice_template.html")
-
-        for reading in readings:
-          
-            previous_reading = Reading.objects.filter(
-                customer=reading.customer,
-                reading_date__lt=reading.reading_date
-            ).order_by('-reading_date').first()
-
-            unpaid_readings = Reading.objects.filter(
-                customer=reading.customer,
-                is_paid=False,
-                due_date__lt=reading.reading_date
-            ).exclude(id=reading.id)
-            
-            consumption_excess = max(0, reading.consumption - reading.customer.tariff.max_consumption)
-            total_excess_charge = consumption_excess * reading.customer.tariff.extra_rate
-            total_due = sum(r.total_amount for r in unpaid_readings)
-            total = reading.total_amount + total_due
+        template = rendering.template("agua/invoice_template.html")
 
-            context = {
-                "company": company,
-                "customer": reading.customer,
-                "reading": reading,
-                "previous_reading": previous_reading,
-                "consumption_excess": consumption_excess,
-                "total_excess_charge": total_excess_charge,
-                "unpaid_readings": unpaid_readings,
-                "total_due": total_due,
-                "total" : total,
-                "company_logo": request.build_absolute_uri(company.logo.url) if company and company.logo else None
-            }
+        company_logo = company.logo.url if company and company.logo else None
+
+        # Contextos de toda la calle con un número fijo de consultas
+        for context in receipt_contexts(readings, company, company_logo):
 
             html_string = template.render(context)
             combined_html += html_string + '<p style="page-break-after: always;"></p>'  # salto de página
 
         # Generar PDF combinado
-        pdf_buffer = BytesIO()
-        HTML(string=combined_html, base_url=request.build_absolute_uri()).write_pdf(
-            pdf_buffer, stylesheets=[CSS(css_path)]
-        )
-        pdf_buffer.seek(0)
+        pdf = rendering.render_pdf(combined_html, stylesheets=[rendering.INVOICE_CSS])
 
-        response = HttpResponse(pdf_buffer.read(), content_type="application/pdf")
+        response = HttpResponse(pdf, content_type="application/pdf")
         response["Content-Disposition"] = f'inline; filename="recibos_{calle.name}.pdf"'
         return response
 
@@ -717,148 +486,93 @@ class PDFGeneratorAPIView(APIView):
 
     def get(self, request, invoice_id, *args, **kwargs):
         
-        invoice = get_object_or_404(Invoice, id=invoice_id)
-        company = Company.objects.first()
+        invoice = get_object_or_404(Invoice.objects.select_related('customer__debt'), id=invoice_id)
+        company = catalogs.company()
         customer = invoice.customer
-        payments = InvoiceReading.objects.filter(invoice=invoice).order_by('reading__reading_date')
-
-        context = {
-            "invoice": invoice,
-            "customer": customer,
-            "payments": payments,
-            "total_paid": sum((p.amount_paid for p in payments), 0),
-            "company_name": company.name if company else "Empresa",
-            "company_ruc": company.ruc if company else "99999999999",
-            "company_logo": request.build_absolute_uri(company.logo.url) if company and company.logo else None
-        }
 
-        template = get_template('agua/hola.html')
-        html_string = template.render(context)
+        def render(target):
 
-        pdf_buffer = BytesIO()
-        css_path = os.path.join(settings.BASE_DIR, "static/css/ticket.css")
+            payments = InvoiceReading.objects.filter(invoice=invoice).select_related('reading').order_by('reading__reading_date')
 
-        HTML(string=html_string, base_url=request.build_absolute_uri()).write_pdf(pdf_buffer, stylesheets=[CSS(css_path)])
+            context = {
+                "invoice": invoice,
+                "customer": customer,
+                "payments": payments,
+                "total_paid": sum((p.amount_paid for p in payments), 0),
+                "company_name": company.name if company else "Empresa",
+                "company_ruc": company.ruc if company else "99999999999",
+                "company_logo": company.logo.url if company and company.logo else None
+            }
 
-        pdf_buffer.seek(0)
-        response = HttpResponse(pdf_buffer.read(), content_type="application/pdf")
-        response["Content-Disposition"] = 'inline; filename="invoice_ticket.pdf"'
-        return response
+            html_string = rendering.render_template('agua/hola.html', context)
+            rendering.render_pdf(html_string, target, stylesheets=[rendering.TICKET_CSS])
+
+        return pdfcache.cached_pdf_response(
+            request,
+            customer.id,
+            'ticket',
+            [invoice.id, invoice.correlative, invoice.total_amount, pdfcache.customer_version(customer), pdfcache.company_version(company)],
+            render,
+            "invoice_ticket.pdf",
+            templates=['agua/hola.html'],
+            stylesheets=[rendering.TICKET_CSS],
+        )
 
 class PDFReciboApiView(APIView):
 
     def get(self, request, reading_id, *args, **kwargs):   
 
-        reading = Reading.objects.get(id=reading_id)
-        company = Company.objects.first()  # Suponiendo que hay una sola empresa
-
-        # Obtener la lectura anterior de este cliente
-        previous_reading = Reading.objects.filter(
-            customer=reading.customer,
-            reading_date__lt=reading.reading_date
-        ).order_by('-reading_date').first()
-
-        # Cálculo del consumo excedente
-        consumption_excess = max(0, reading.consumption - reading.customer.tariff.max_consumption)
-        total_excess_charge = consumption_excess * reading.customer.tariff.extra_rate
-
-        # Buscar lecturas impagas anteriores del cliente
-        unpaid_readings = Reading.objects.filter(
-            customer=reading.customer,
-            is_paid=False,
-            due_date__lt=reading.reading_date
-        ).exclude(id=reading.id)
-        
-        total_due = sum(r.total_amount for r in unpaid_readings)
-
-        total =  reading.total_amount + total_due
-
-        context = {
-            "company": company,
-            "customer": reading.customer,
-            "reading": reading,
-            "previous_reading": previous_reading,
-            "consumption_excess": consumption_excess,
-            "total_excess_charge": total_excess_charge,
-            "unpaid_readings": unpaid_readings,
-            "total_due": total_due,
-            "total" : total,
-            "company_logo": request.build_absolute_uri(company.logo.url) if company and company.logo else None
-        }
-        template = get_template("agua/invoice_template.html")
-        html_string = template.render(context)
+        reading = get_object_or_404(Reading.objects.select_related('customer__debt'), id=reading_id)
+        company = catalogs.company()
 
-        pdf_buffer = BytesIO()
-        css_path = os.path.join(settings.BASE_DIR, "static/css/invoice_style.css")
+        def render(target):
 
-        HTML(string=html_string, base_url=request.build_absolute_uri()).write_pdf(pdf_buffer, stylesheets=[CSS(css_path)])
+            company_logo = company.logo.url if company and company.logo else None
+            context = receipt_context(reading, company, company_logo)
 
-        pdf_buffer.seek(0)
-        response = HttpResponse(pdf_buffer.read(), content_type="application/pdf")
-        response["Content-Disposition"] = 'inline; filename="invoice.pdf"'
-        return response
+            html_string = rendering.render_template("agua/invoice_template.html", context)
+            rendering.render_pdf(html_string, target, stylesheets=[rendering.INVOICE_CSS])
+
+        # Las reimpresiones salen de la caché mientras no cambien las lecturas o pagos del cliente
+        return pdfcache.cached_pdf_response(
+            request,
+            reading.customer_id,
+            'recibo',
+            [reading.id, pdfcache.customer_version(reading.customer), pdfcache.company_version(company)],
+            render,
+            "invoice.pdf",
+            templates=["agua/invoice_template.html"],
+            stylesheets=[rendering.INVOICE_CSS],
+        )
     
 class DebtReportViewSet(APIView):
 
     def get(self, request):
-  
-        # Parámetros de filtrado
-        months = request.query_params.get('months', 6)  # Default: últimos 6 meses
-        zona = request.query_params.get('zona', None)
-        
-        # Calculamos fecha de corte
-        from dateutil.relativedelta import relativedelta
-        cutoff_date = datetime.now() - relativedelta(months=int(months))
-        
-        # Consulta optimizada
-        customers = Customer.objects.annotate(
-            total_debt=Sum('readings__total_amount',
-                          filter=Q(readings__is_paid=False) &
-                                 Q(readings__reading_date__gte=cutoff_date)),
-            debt_months=Count('readings__reading_date__month',
-                             distinct=True,
-                             filter=Q(readings__is_paid=False) &
-                                     Q(readings__reading_date__gte=cutoff_date))
-        ).filter(total_debt__gt=0).order_by('full_name')
-        
-        if zona:
-            customers = customers.filter(calle__zona__id=zona)
-        
-        # Preparar datos para el template
-        report_data = []
-        for customer in customers:
-            # Obtener meses adeudados
-            unpaid_months = Reading.objects.filter(
-                customer=customer,
-                is_paid=False,
-                reading_date__gte=cutoff_date
-            ).dates('reading_date', 'month', order='ASC')
-            
-            report_data.append({
-                'id': customer.id,
-                'name': customer.full_name,
-                'address': customer.address,
-                'zone': customer.calle.zona.name if customer.calle.zona else '',
-                'total_debt': customer.total_debt,
-                'debt_months': customer.debt_months,
-                'months_list': [date.strftime("%b-%Y") for date in unpaid_months]
-            })
-        
-        # Generar PDF
-        context = {
-            'customers': report_data,
-            'report_date': datetime.now().strftime("%d/%m/%Y"),
-            'cutoff_date': cutoff_date.strftime("%d/%m/%Y"),
-            'title': f"Reporte de Deudas (Últimos {months} meses)"
-        }
-        
-        html_string = render_to_string('reports/debt_report.html', context)
-        pdf = HTML(string=html_string).write_pdf()
-        
-        response = HttpResponse(pdf, content_type='application/pdf')
-        filename = f"deudas_clientes_{datetime.now().strftime('%Y%m%d')}.pdf"
-        response['Content-Disposition'] = f'inline; filename="{filename}"'
-        return response
+
+        # Parámetros: months (default 6), zona y calle
+        params = report_params(request)
+
+        if params.get('output') != 'json':
+            return report_response(request, 'debts', params)
+
+        # Mismos datos que el PDF, para la grilla del frontend
+        try:
+            dataset = debts_dataset(params)
+        except ReportError as exc:
+            return Response({'error': exc.args[0]}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = list(dataset.rows)
+
+        for row in rows:
+            row['months_list'] = [date.strftime('%Y-%m') for date in row['months_list']]
+
+        return Response({
+            'cutoff_date': dataset.meta['cutoff_date'],
+            'months': dataset.meta['months'],
+            'count': len(rows),
+            'total_debt': sum(row['total_debt'] for row in rows),
+            'results': rows,
+        })
     
 # GLOBAL API VIEW
 
@@ -866,17 +580,25 @@ class TotalDashboard(APIView):
 
     def get(self, request):
 
-        total_invoices = Invoice.objects.count()
-        total_sum = Invoice.objects.aggregate(total_sum=Sum('total_amount'))['total_sum'] or 0
+        # Desde DashboardCounter (counters.py); con ?approximate=1 un contador faltante se estima
+        figures = counters.read(approximate=request.query_params.get('approximate') in ('1', 'true'))
 
-        total_customers = Customer.objects.count()
-        total_readings = Reading.objects.count()
+        total_invoices = figures['invoices']
+        total_sum = figures['invoice_total']
+        total_customers = figures['customers']
+        total_readings = figures['readings']
 
         return Response({
-            "total_invoices": total_invoices,
-            "total_sum": float(total_sum),
-            "total_customers": total_customers,
-            "total_readings": total_readings,
+            "total_invoices": total_invoices.value,
+            "total_sum": float(total_sum.value),
+            "total_customers": total_customers.value,
+            "total_readings": total_readings.value,
+            "exact": {
+                "total_invoices": total_invoices.exact,
+                "total_sum": total_sum.exact,
+                "total_customers": total_customers.exact,
+                "total_readings": total_readings.exact,
+            },
         })
 
 class FinancialSummaryAPIView(APIView):
@@ -887,8 +609,15 @@ class FinancialSummaryAPIView(APIView):
         
         year = int(request.query_params.get('year', datetime.now().year))
 
-        ingresos = InvoicePayment.objects.filter(invoice__date_of_issue__year=year).aggregate(total=Sum('total'))['total'] or 0
-        egresos = Expense.objects.filter(date_of_issue__year=year).aggregate(total=Sum('total'))['total'] or 0
+        # Desde el resumen mensual (FinancialRollup): a lo sumo 12 filas por método de pago y categoría
+        totals = dict(
+            FinancialRollup.objects.filter(period__year=year).values('kind').annotate(
+                total=Sum('total')
+            ).values_list('kind', 'total').order_by()
+        )
+
+        ingresos = totals.get(FinancialRollup.INCOME) or 0
+        egresos = totals.get(FinancialRollup.EXPENSE) or 0
         utilidad = ingresos - egresos
 
         data = [
@@ -908,4 +637,169 @@ class FinancialSummaryAPIView(APIView):
 
         ]
 
-        return Response(data)
\ No newline at end of file
+        return Response(data)
+
+class FinancialSeriesAPIView(APIView):
+
+    """
+    Serie mensual (o anual con group=year) de ingresos por método de pago,
+    egresos por categoría y utilidad desde FinancialRollup: ?year=2025 para
+    los 12 meses de un año o ?start_year=2023&end_year=2025 para varios.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    MAX_YEARS = 20
+
+    def get(self, request):
+
+        params = request.query_params
+        current = datetime.now().year
+
+        try:
+            start_year = int(params.get('start_year') or params.get('year') or current)
+            end_year = int(params.get('end_year') or params.get('year') or start_year)
+        except ValueError:
+            return Response({'error': 'year, start_year y end_year deben ser números'}, status=status.HTTP_400_BAD_REQUEST)
+
+        group = params.get('group', 'month')
+
+        if group not in ('month', 'year'):
+            return Response({'error': 'group debe ser month o year'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not 0 <= end_year - start_year < self.MAX_YEARS:
+            return Response(
+                {'error': f'El rango debe ser de 1 a {self.MAX_YEARS} años y end_year no puede ser menor que start_year'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        methods = dict(PaymentMethod.objects.values_list('id', 'description'))
+        categories = dict(Expense.CATEGORY_CHOICES)
+        # Los años cerrados se sirven de filas congeladas
+        closed = set(Year.objects.filter(year__range=(start_year, end_year), state=False).values_list('year', flat=True))
+
+        if group == 'month':
+            periods = [date(year, month, 1) for year in range(start_year, end_year + 1) for month in range(1, 13)]
+        else:
+            periods = [date(year, 1, 1) for year in range(start_year, end_year + 1)]
+
+        series = {
+            period: {
+                'period': period.strftime('%Y-%m' if group == 'month' else '%Y'),
+                'income': Decimal(0),
+                'expenses': Decimal(0),
+                'net': Decimal(0),
+                'income_by_method': defaultdict(Decimal),
+                'expenses_by_category': defaultdict(Decimal),
+                'frozen': period.year in closed,
+            }
+            for period in periods
+        }
+
+        rows = FinancialRollup.objects.filter(
+            period__year__gte=start_year, period__year__lte=end_year
+        ).values_list('period', 'kind', 'concept', 'total')
+
+        for period, kind, concept, total in rows:
+
+            item = series[period if group == 'month' else period.replace(month=1)]
+
+            if kind == FinancialRollup.INCOME:
+                item['income'] += total
+                item['income_by_method'][methods.get(int(concept), concept)] += total
+            else:
+                item['expenses'] += total
+                item['expenses_by_category'][categories.get(concept, concept)] += total
+
+        for item in series.values():
+            item['net'] = item['income'] - item['expenses']
+
+        return Response({
+            'start_year': start_year,
+            'end_year': end_year,
+            'group': group,
+            'series': list(series.values()),
+        })
+
+class BootstrapView(APIView):
+
+    """
+    Todos los catálogos (empresa, zonas, calles, categorías, servicios, tarifas,
+    métodos de pago y años) en un solo JSON desde la caché de catalogs.py, con
+    ETag: el frontend lo revalida con If-None-Match y recibe 304 si no cambió.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+
+        snapshot = catalogs.snapshot()
+
+        if request.headers.get('If-None-Match') == snapshot.etag:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(snapshot.payload, content_type='application/json')
+
+        response['ETag'] = snapshot.etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+class ReportJobViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, GenericViewSet):
+
+    """Trabajos de reportes en segundo plano: estado, progreso y descarga."""
+
+    queryset = ReportJob.objects.all()
+    serializer_class = ReportJobSerializer
+    pagination_class = CustomPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['kind', 'status']
+
+    def create(self, request, *args, **kwargs):
+        # POST {"kind": "receipts", "params": {"period": "2025-05", "zona": 1}}
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job, created = enqueue(serializer.validated_data['kind'], serializer.validated_data.get('params', {}))
+        data = self.get_serializer(job).data
+        return Response(data, status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+
+        job = self.get_object()
+
+        if job.status != ReportJob.DONE or not job.file_path or not os.path.exists(job.file_path):
+            return Response({'error': 'El reporte aún no está disponible'}, status=status.HTTP_409_CONFLICT)
+
+        return FileResponse(open(job.file_path, 'rb'), filename=job.filename)
+
+class ProfileListView(APIView):
+
+    """Perfiles recientes de requests (ProfilingMiddleware), con los enlaces de descarga."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+
+        profiles = profiling.recent()
+
+        for profile in profiles:
+            kinds = ['prof', 'memory'] if profile.get('memory') else ['prof']
+            profile['downloads'] = {
+                kind: request.build_absolute_uri(reverse('profile-download', args=[profile['id'], kind]))
+                for kind in kinds
+            }
+
+        return Response(profiles)
+
+class ProfileDownloadView(APIView):
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, profile_id, kind):
+
+        path = profiling.path(profile_id, kind)
+
+        if path is None or not os.path.exists(path):
+            return Response({'error': 'El perfil no existe'}, status=status.HTTP_404_NOT_FOUND)
+
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=os.path.basename(path))